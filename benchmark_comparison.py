@@ -0,0 +1,130 @@
+"""
+Compares the model comparison engines on a synthetic metrics report: the
+original loop that filters the report per (article, pair) against the
+indexed lookup in generate_model_comparison_report.py, and times the
+all-pairs matrices.
+
+    python benchmark_comparison.py
+    python benchmark_comparison.py --models 500 --articles 100 --pairs 1000
+"""
+
+import argparse
+import logging
+import time
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from generate_model_comparison_report import (
+    COMPARED_METRICS,
+    compare_models,
+    comparison_matrices,
+)
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+def synthetic_report(model_count: int, article_count: int, seed: int = 0):
+    """A metrics report with every model's row for every article."""
+    rng = np.random.default_rng(seed)
+    size = model_count * article_count
+    return pd.DataFrame(
+        {
+            "Model Name": np.tile(
+                [f"model_{m:03d}" for m in range(model_count)], article_count
+            ),
+            "Article Key": np.repeat(
+                [f"{a:08x}" for a in range(article_count)], model_count
+            ),
+            "Inference Rate (s)": rng.uniform(1, 20, size).round(2),
+            "Valid JSON Rate": rng.choice([0.8, 0.9, 1.0], size),
+            "Sentiment Variance": rng.uniform(0, 0.1, size).round(2),
+            "Mean Sentiment": rng.uniform(-1, 1, size).round(2),
+            "Mean Confidence": rng.uniform(0.5, 1, size).round(2),
+        }
+    )
+
+
+def synthetic_pairs(model_count: int, pair_count: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    models = rng.integers(0, model_count, (pair_count, 2))
+    return [[f"model_{m1:03d}", f"model_{m2:03d}"] for m1, m2 in models]
+
+
+def loop_compare_models(data: pd.DataFrame, comparison_pairs: list) -> pd.DataFrame:
+    """The original engine: boolean masks per article and per pair."""
+    comparison_data = []
+    for article_key in data["Article Key"].unique():
+        article_data = data[data["Article Key"] == article_key]
+        for model1, model2 in comparison_pairs:
+            model1_data = article_data[article_data["Model Name"] == model1]
+            model2_data = article_data[article_data["Model Name"] == model2]
+            row = {"Article Key": article_key, "Model 1": model1, "Model 2": model2}
+            for label, column in COMPARED_METRICS.items():
+                row[f"Model 1 {label}"] = model1_data[column].mean()
+                row[f"Model 2 {label}"] = model2_data[column].mean()
+            row["Sentiment Drift"] = (
+                model2_data["Mean Sentiment"].mean()
+                - model1_data["Mean Sentiment"].mean()
+            )
+            comparison_data.append(row)
+    return pd.DataFrame(comparison_data)
+
+
+def timed(function, *args) -> tuple:
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", type=int, default=300)
+    parser.add_argument("--articles", type=int, default=50)
+    parser.add_argument("--pairs", type=int, default=300)
+    parser.add_argument(
+        "--skip-loop",
+        action="store_true",
+        help="Only time the indexed engine, for sizes the loop takes minutes on",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    data = synthetic_report(args.models, args.articles, args.seed)
+    comparison_pairs = synthetic_pairs(args.models, args.pairs, args.seed)
+    logging.info(
+        "Synthetic report: %d model(s) x %d article(s), %d pair(s)",
+        args.models,
+        args.articles,
+        args.pairs,
+    )
+
+    comparison_df, indexed_time = timed(compare_models, data, comparison_pairs)
+    logging.info("indexed  %9.3fs  %d row(s)", indexed_time, len(comparison_df))
+    if not args.skip_loop:
+        reference, loop_time = timed(loop_compare_models, data, comparison_pairs)
+        logging.info(
+            "loop     %9.3fs  %.1fx slower", loop_time, loop_time / indexed_time
+        )
+        identical = reference.equals(comparison_df[reference.columns])
+        logging.info("Outputs identical: %s", identical)
+
+    matrices, matrix_time = timed(comparison_matrices, data)
+    logging.info(
+        "all pairs %8.3fs  %d %dx%d matrices (%d pairs each)",
+        matrix_time,
+        len(matrices),
+        args.models,
+        args.models,
+        args.models * (args.models - 1),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Compares the web_scraper extractors on a corpus of saved article pages: time
+per page and whether each extractor's output matches the html.parser baseline.
+
+    python benchmark_extractors.py --save-from-cache
+    python benchmark_extractors.py --corpus fixtures/pages --repeat 5
+"""
+
+import argparse
+import hashlib
+import os
+import time
+from typing import Dict, List, Optional
+
+from utils.cache import configure_cache, get_cache
+from utils.context import logger
+from utils.fake_ollama import build_fixture, render_pages
+from utils.file_utils import load_config
+from utils.web_scraper import EXTRACTORS, extract_content
+
+CONFIG_FILE = "config.yaml"
+BASELINE = "html.parser"
+# Navigation, scripts and ads around synthetic articles, so they weigh about
+# as much as a real finance page
+PAGE_CHROME = (
+    '<div class="nav"><ul>'
+    + "".join(f'<li><a href="/quote/{k}">Quote {k}</a></li>' for k in range(300))
+    + "</ul></div><script>window.__DATA__ = {};</script>"
+)
+
+
+def save_cached_pages(corpus_folder: str) -> int:
+    """Copies the article pages in the cache's pages namespace into the corpus."""
+    os.makedirs(corpus_folder, exist_ok=True)
+    pages = get_cache("pages")
+    count = 0
+    for link in pages.keys():
+        html = pages.get(link)
+        if not html:
+            continue
+        name = hashlib.md5(link.encode()).hexdigest()[0:8] + ".html"
+        with open(os.path.join(corpus_folder, name), "w", encoding="utf-8") as file:
+            file.write(html)
+        count += 1
+    logger.info(f"Saved {count} cached page(s) to {corpus_folder}")
+    return count
+
+
+def load_corpus(corpus_folder: str) -> Dict[str, str]:
+    if not os.path.isdir(corpus_folder):
+        return {}
+    corpus = {}
+    for file_name in sorted(os.listdir(corpus_folder)):
+        if file_name.endswith((".html", ".htm")):
+            path = os.path.join(corpus_folder, file_name)
+            with open(path, encoding="utf-8", errors="replace") as file:
+                corpus[file_name] = file.read()
+    return corpus
+
+
+def synthetic_corpus(article_count: int) -> Dict[str, str]:
+    pages = render_pages(build_fixture(article_count))
+    return {
+        path: html.replace("<body>", "<body>" + PAGE_CHROME)
+        for path, html in pages.items()
+    }
+
+
+def benchmark(
+    corpus: Dict[str, str], company_name: str, ticker_symbol: str, repeat: int
+) -> List[Dict[str, float]]:
+    baseline = {
+        name: extract_content(html, company_name, ticker_symbol, BASELINE)
+        for name, html in corpus.items()
+    }
+    results = []
+    for extractor in EXTRACTORS:
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            outputs = {
+                name: extract_content(html, company_name, ticker_symbol, extractor)
+                for name, html in corpus.items()
+            }
+        elapsed = time.perf_counter() - start_time
+        mismatches = [name for name in corpus if outputs[name] != baseline[name]]
+        for name in mismatches:
+            logger.warning(f"{extractor} differs from {BASELINE} on {name}")
+        results.append(
+            {
+                "extractor": extractor,
+                "ms_per_page": elapsed * 1000 / (repeat * len(corpus)),
+                "mismatches": len(mismatches),
+            }
+        )
+    return results
+
+
+def log_results(results: List[Dict[str, float]], page_count: int) -> None:
+    baseline = next(r["ms_per_page"] for r in results if r["extractor"] == BASELINE)
+    logger.info(f"{'Extractor':<12} {'ms/page':>9} {'speedup':>8}  identical")
+    for result in results:
+        logger.info(
+            f"{result['extractor']:<12} {result['ms_per_page']:>9.2f} "
+            f"{baseline / result['ms_per_page']:>7.2f}x  "
+            f"{page_count - result['mismatches']}/{page_count}"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default="fixtures/pages")
+    parser.add_argument(
+        "--save-from-cache",
+        action="store_true",
+        help="Add the pages in the cache to the corpus first",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=20,
+        help="Number of generated pages to use when the corpus is empty",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--company", help="Company name (default: the ticker)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    config = load_config(CONFIG_FILE)
+    configure_cache(config.get("cache") or {})
+    ticker_symbol = config.get("ticker_symbol", "MSFT")
+    company_name = (args.company or ticker_symbol).lower()
+
+    if args.save_from_cache:
+        save_cached_pages(args.corpus)
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        logger.info(f"No pages in {args.corpus}; using {args.synthetic} synthetic")
+        corpus = synthetic_corpus(args.synthetic)
+        ticker_symbol = "MSFT"
+
+    size = sum(len(html) for html in corpus.values())
+    logger.info(f"Corpus: {len(corpus)} page(s), {size / 1024:.0f} KiB")
+    results = benchmark(corpus, company_name, ticker_symbol, max(1, args.repeat))
+    log_results(results, len(corpus))
+
+
+if __name__ == "__main__":
+    main()
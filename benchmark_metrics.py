@@ -0,0 +1,218 @@
+"""
+Compares the per-article metrics engines on a synthetic results table: the
+original loop over result dicts against the single groupby pass in
+generate_model_metrics.py, checking that both report the same values.
+
+    python benchmark_metrics.py
+    python benchmark_metrics.py --models 20 --articles 500 --iterations 5
+"""
+
+import argparse
+import logging
+import time
+from collections import defaultdict
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from generate_model_metrics import (
+    ARTICLE_METRICS,
+    DECIMAL_PLACES,
+    METRIC_COLUMNS,
+    STREAM_METRIC_KEYS,
+    compute_article_metrics,
+)
+from utils.backends import BACKEND_METRIC_KEYS, NANOSECONDS
+from utils.results_store import COLUMNS, row_to_result
+
+# Loop metrics compared with the groupby pass; the latency spread is new
+METRIC_NAMES = list(ARTICLE_METRICS)
+SHARED_METRICS = METRIC_NAMES[: METRIC_NAMES.index("prompt_tokens") + 1]
+# Means of the same values summed in a different order can round apart
+TOLERANCE = 10**-DECIMAL_PLACES + 1e-9
+
+
+def synthetic_results(
+    model_count: int, article_count: int, iterations: int, seed: int = 0
+) -> pd.DataFrame:
+    """Long-format results as ResultsStore.read returns them, one row per call."""
+    rng = np.random.default_rng(seed)
+    size = model_count * article_count * iterations
+    valid = rng.random(size) > 0.1
+    eval_count = rng.integers(20, 120, size)
+    prompt_eval_count = rng.integers(300, 1200, size)
+    eval_duration = eval_count * rng.uniform(2e7, 6e7, size)
+    prompt_eval_duration = prompt_eval_count * rng.uniform(1e5, 5e5, size)
+    load_duration = rng.uniform(1e6, 1e8, size)
+    # Half the models stream, which measures time to first token on the client
+    streamed = np.repeat(np.arange(model_count) % 2 == 0, article_count * iterations)
+    time_to_first_token = (load_duration + prompt_eval_duration) / NANOSECONDS
+    total_duration = load_duration + prompt_eval_duration + eval_duration
+    columns = {
+        "model": np.repeat(
+            [f"model-{m:03d}" for m in range(model_count)], article_count * iterations
+        ),
+        "key": np.tile(
+            np.repeat([f"{a:08x}" for a in range(article_count)], iterations),
+            model_count,
+        ),
+        "valid": valid,
+        "batch_fallback": np.zeros(size, dtype=bool),
+        "time_taken": time_to_first_token + eval_duration / NANOSECONDS,
+        "sentiment": np.where(valid, rng.uniform(-1, 1, size).round(2), np.nan),
+        "confidence": np.where(valid, rng.uniform(0, 1, size).round(2), np.nan),
+        "total_duration": total_duration.astype(int),
+        "load_duration": load_duration.astype(int),
+        "prompt_eval_count": prompt_eval_count,
+        "prompt_eval_duration": prompt_eval_duration.astype(int),
+        "eval_count": eval_count,
+        "eval_duration": eval_duration.astype(int),
+        "batch_size": np.ones(size, dtype=int),
+        "prompt_tokens": prompt_eval_count,
+        "time_to_first_token": np.where(streamed, time_to_first_token, np.nan),
+        "time_to_json": np.where(
+            streamed, time_to_first_token + rng.uniform(0.5, 3, size), np.nan
+        ),
+        "host": rng.choice(["http://gpu-a:11434", "http://gpu-b:11434"], size),
+        "duplicate_of": None,
+    }
+    frame = pd.DataFrame(columns)
+    return frame.astype({column: COLUMNS[column] for column in METRIC_COLUMNS})
+
+
+def loop_tokens_per_second(counts: list, durations: list) -> float:
+    total_duration = sum(durations)
+    if total_duration <= 0:
+        return 0
+    return round(sum(counts) / (total_duration / NANOSECONDS), DECIMAL_PLACES)
+
+
+def loop_article_metrics(results: pd.DataFrame) -> pd.DataFrame:
+    """The original engine: result dicts grouped by article, one mean at a time."""
+    rows = []
+    for model, model_results in results.groupby("model", sort=False):
+        aggregated_sentiments = defaultdict(list)
+        for row in model_results.to_dict("records"):
+            aggregated_sentiments[row["key"]].append(row_to_result(row))
+
+        metrics = defaultdict(lambda: defaultdict(list))
+        for key, sentiments in aggregated_sentiments.items():
+            for sentiment in sentiments:
+                if sentiment["valid"]:
+                    metrics[key]["time_taken"].append(sentiment["time_taken"])
+                    metrics[key]["sentiment"].append(sentiment["sentiment"])
+                    metrics[key]["confidence"].append(sentiment["confidence"])
+                metrics[key]["valid"].append(sentiment["valid"])
+                if "eval_duration" in sentiment:
+                    for metric_key in BACKEND_METRIC_KEYS:
+                        metrics[key][metric_key].append(sentiment.get(metric_key, 0))
+                if "prompt_tokens" in sentiment:
+                    metrics[key]["prompt_tokens"].append(sentiment["prompt_tokens"])
+                for metric_key in STREAM_METRIC_KEYS:
+                    if metric_key in sentiment:
+                        metrics[key][metric_key].append(sentiment[metric_key])
+
+        for key, values in metrics.items():
+            if values["time_to_first_token"]:
+                time_to_first_token = np.mean(values["time_to_first_token"])
+            elif values["eval_duration"]:
+                time_to_first_token = (
+                    np.mean(
+                        np.add(values["load_duration"], values["prompt_eval_duration"])
+                    )
+                    / NANOSECONDS
+                )
+            else:
+                time_to_first_token = 0
+            rows.append(
+                {
+                    "model": model,
+                    "key": key,
+                    "inference_rate": np.mean(values["time_taken"] or [0]),
+                    "valid_json_rate": sum(values["valid"]) / len(values["valid"]),
+                    "sample_count": len(values["valid"]),
+                    "sentiment_variance": np.var(values["sentiment"] or [0]),
+                    "mean_sentiment": np.mean(values["sentiment"] or [0]),
+                    "mean_confidence": np.mean(values["confidence"] or [0]),
+                    "prompt_tokens_per_second": loop_tokens_per_second(
+                        values["prompt_eval_count"], values["prompt_eval_duration"]
+                    ),
+                    "generation_tokens_per_second": loop_tokens_per_second(
+                        values["eval_count"], values["eval_duration"]
+                    ),
+                    "time_to_first_token": time_to_first_token,
+                    "time_to_json": np.mean(values["time_to_json"] or [0]),
+                    "prompt_tokens": round(np.mean(values["prompt_tokens"] or [0])),
+                }
+            )
+    return pd.DataFrame(rows).round(DECIMAL_PLACES)
+
+
+def count_mismatches(reference: pd.DataFrame, metrics: pd.DataFrame) -> int:
+    merged = reference.merge(metrics, on=["model", "key"], suffixes=("", "_new"))
+    if len(merged) != len(reference) or len(merged) != len(metrics):
+        logging.warning(
+            f"Article counts differ: {len(reference)} in the loop, "
+            f"{len(metrics)} in the groupby"
+        )
+    mismatches = np.zeros(len(merged), dtype=bool)
+    for column in SHARED_METRICS:
+        differs = (merged[column] - merged[f"{column}_new"]).abs() > TOLERANCE
+        if differs.any():
+            logging.warning(f"{column} differs for {differs.sum()} article(s)")
+        mismatches |= differs.to_numpy()
+    return int(mismatches.sum())
+
+
+def benchmark(results: pd.DataFrame, repeat: int) -> dict:
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        reference = loop_article_metrics(results)
+    loop_time = (time.perf_counter() - start_time) / repeat
+
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        metrics = compute_article_metrics(results, ["model", "key"])
+    groupby_time = (time.perf_counter() - start_time) / repeat
+
+    return {
+        "loop_time": loop_time,
+        "groupby_time": groupby_time,
+        "articles": len(metrics),
+        "mismatches": count_mismatches(reference, metrics),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--models", type=int, default=100)
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    results = synthetic_results(args.models, args.articles, args.iterations, args.seed)
+    logging.info(
+        f"Synthetic results: {args.models} model(s) x {args.articles} article(s) "
+        f"x {args.iterations} iteration(s) = {len(results)} row(s)"
+    )
+    result = benchmark(results, max(1, args.repeat))
+    logging.info(f"{'Engine':<8} {'seconds':>9} {'speedup':>8}")
+    for engine in ["loop", "groupby"]:
+        seconds = result[f"{engine}_time"]
+        logging.info(
+            f"{engine:<8} {seconds:>9.3f} {result['loop_time'] / seconds:>7.1f}x"
+        )
+    logging.info(
+        f"{result['articles'] - result['mismatches']}/{result['articles']} "
+        f"article(s) match within {10**-DECIMAL_PLACES}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,25 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 
+from utils.context import logger
 from utils.file_utils import load_config
 
 CONFIG_FILE = "config.yaml"
 
+# (report column, colour map, output file)
+HEATMAPS = [
+    ("Inference Rate (s)", "coolwarm", "inference_rate_heatmap.png"),
+    ("Valid JSON Rate", "coolwarm_r", "valid_json_rate_heatmap.png"),
+    ("Sample Count", "coolwarm", "sample_count_heatmap.png"),
+    ("Sentiment Variance", "coolwarm", "sentiment_variance_heatmap.png"),
+    ("Mean Sentiment", "coolwarm", "mean_sentiment_heatmap.png"),
+    ("Mean Confidence", "coolwarm", "mean_confidence_heatmap.png"),
+    ("Prompt Tokens/s", "coolwarm_r", "prompt_tokens_per_second_heatmap.png"),
+    ("Generation Tokens/s", "coolwarm_r", "generation_tokens_per_second_heatmap.png"),
+    ("Time To First Token (s)", "coolwarm", "time_to_first_token_heatmap.png"),
+    ("Time To JSON (s)", "coolwarm", "time_to_json_heatmap.png"),
+]
+
 
 # Function to plot and save heatmap
 def plot_heatmap(data, title, value_label, cmap, padding, filename):
@@ -49,75 +64,20 @@ def main():
     # Load the CSV/ report output file
     df = pd.read_csv(report_output_csv_file)
 
-    # Inference Rate (s)
-    inference_rate_pivot = df.pivot(
-        index="Article Key", columns="Model Name", values="Inference Rate (s)"
-    )
-    inference_rate_pivot.loc["Mean"] = inference_rate_pivot.mean()
-    plot_heatmap(
-        inference_rate_pivot,
-        "Inference Rate (s) Heatmap",
-        "Inference Rate (s)",
-        "coolwarm",
-        5,
-        os.path.join(heatmaps_folder, "inference_rate_heatmap.png"),
-    )
-
-    # Valid JSON Rate
-    valid_json_pivot = df.pivot(
-        index="Article Key", columns="Model Name", values="Valid JSON Rate"
-    )
-    valid_json_pivot.loc["Mean"] = valid_json_pivot.mean()
-    plot_heatmap(
-        valid_json_pivot,
-        "Valid JSON Rate Heatmap",
-        "Valid JSON Rate",
-        "coolwarm_r",
-        5,
-        os.path.join(heatmaps_folder, "valid_json_rate_heatmap.png"),
-    )
-
-    # Sentiment Variance
-    sentiment_variance_pivot = df.pivot(
-        index="Article Key", columns="Model Name", values="Sentiment Variance"
-    )
-    sentiment_variance_pivot.loc["Mean"] = sentiment_variance_pivot.mean()
-    plot_heatmap(
-        sentiment_variance_pivot,
-        "Sentiment Variance Heatmap",
-        "Sentiment Variance",
-        "coolwarm",
-        5,
-        os.path.join(heatmaps_folder, "sentiment_variance_heatmap.png"),
-    )
-
-    # Mean Sentiment
-    mean_sentiment_pivot = df.pivot(
-        index="Article Key", columns="Model Name", values="Mean Sentiment"
-    )
-    mean_sentiment_pivot.loc["Mean"] = mean_sentiment_pivot.mean()
-    plot_heatmap(
-        mean_sentiment_pivot,
-        "Mean Sentiment Heatmap",
-        "Mean Sentiment",
-        "coolwarm",
-        5,
-        os.path.join(heatmaps_folder, "mean_sentiment_heatmap.png"),
-    )
-
-    # Mean Confidence
-    mean_confidence_pivot = df.pivot(
-        index="Article Key", columns="Model Name", values="Mean Confidence"
-    )
-    mean_confidence_pivot.loc["Mean"] = mean_confidence_pivot.mean()
-    plot_heatmap(
-        mean_confidence_pivot,
-        "Mean Confidence Heatmap",
-        "Mean Confidence",
-        "coolwarm",
-        5,
-        os.path.join(heatmaps_folder, "mean_confidence_heatmap.png"),
-    )
+    for column, cmap, file_name in HEATMAPS:
+        if column not in df.columns:
+            logger.warning(f"Skipping {column} heatmap, column not in report.")
+            continue
+        pivot = df.pivot(index="Article Key", columns="Model Name", values=column)
+        pivot.loc["Mean"] = pivot.mean()
+        plot_heatmap(
+            pivot,
+            f"{column} Heatmap",
+            column,
+            cmap,
+            5,
+            os.path.join(heatmaps_folder, file_name),
+        )
 
 
 if __name__ == "__main__":
@@ -1,8 +1,39 @@
+import argparse
 import os
+import re
+import time
+from typing import List, Optional
 
+import numpy as np
 import pandas as pd
 import yaml
 
+from utils.results_store import open_results_store
+from utils.significance import bootstrap_mean_difference, permutation_pvalues
+
+# Normalized name of a run variant folder, e.g. "llama3_8b_instruct_q4_k_m_batch4"
+# or "llama3_8b_instruct_q4_k_m_batch4_constrained_stream"
+VARIANT_NAME_PATTERN = re.compile(
+    r"^(?P<base>.+?)(?P<variant>(_batch\d+|_constrained|_stream)+)$"
+)
+# The same name without its last variant, e.g. the unconstrained batched run
+PARENT_VARIANT_PATTERN = re.compile(r"^(?P<parent>.+)(_batch\d+|_constrained|_stream)$")
+
+# Report columns compared between the models of each pair, by comparison label
+COMPARED_METRICS = {
+    "Mean Sentiment": "Mean Sentiment",
+    "Variance": "Sentiment Variance",
+    "Mean Confidence": "Mean Confidence",
+    "Time Taken": "Inference Rate (s)",
+    "Valid JSON Rate": "Valid JSON Rate",
+}
+
+# Per-iteration values tested for each pair, by the name of their difference
+TESTED_DIFFERENCES = {
+    "Sentiment Drift": "sentiment",
+    "Time Taken Difference": "time_taken",
+}
+
 
 def load_csv_data(csv_file: str) -> pd.DataFrame:
     data = pd.read_csv(csv_file)
@@ -21,51 +52,197 @@ def load_config(config_file: str) -> dict:
     return config
 
 
+def add_variant_pairs(data: pd.DataFrame, comparison_pairs: list) -> list:
+    """
+    Pairs every run variant (e.g. batched or constrained mode) with its
+    plain-mode model and with the run that only lacks its last variant.
+    """
+    model_names = set(data["Model Name"].unique())
+    pairs = [list(pair) for pair in comparison_pairs]
+    for model_name in sorted(model_names):
+        match = VARIANT_NAME_PATTERN.match(model_name)
+        if not match:
+            continue
+        parent = PARENT_VARIANT_PATTERN.match(model_name).group("parent")
+        for counterpart in dict.fromkeys([match.group("base"), parent]):
+            pair = [counterpart, model_name]
+            if counterpart in model_names and pair not in pairs:
+                pairs.append(pair)
+    return pairs
+
+
 def compare_models(data: pd.DataFrame, comparison_pairs: list) -> pd.DataFrame:
-    comparison_data = []
-    article_keys = data["Article Key"].unique()
-
-    for article_key in article_keys:
-        article_data = data[data["Article Key"] == article_key]
-        for model1, model2 in comparison_pairs:
-            model1_data = article_data[article_data["Model Name"] == model1]
-            model2_data = article_data[article_data["Model Name"] == model2]
-
-            # Debugging statements
-            print(f"Comparing {model1} and {model2} for Article Key {article_key}")
-
-            comparison_data.append(
-                {
-                    "Article Key": article_key,
-                    "Model 1": model1,
-                    "Model 2": model2,
-                    "Model 1 Mean Sentiment": model1_data["Mean Sentiment"].mean(),
-                    "Model 2 Mean Sentiment": model2_data["Mean Sentiment"].mean(),
-                    "Model 1 Variance": model1_data["Sentiment Variance"].mean(),
-                    "Model 2 Variance": model2_data["Sentiment Variance"].mean(),
-                    "Model 1 Mean Confidence": model1_data["Mean Confidence"].mean(),
-                    "Model 2 Mean Confidence": model2_data["Mean Confidence"].mean(),
-                    "Model 1 Time Taken": model1_data["Inference Rate (s)"].mean(),
-                    "Model 2 Time Taken": model2_data["Inference Rate (s)"].mean(),
-                }
+    """
+    One row per (article, pair) with both models' metrics, looked up in a
+    table of every model's metrics per article instead of filtered per pair.
+    """
+    table = article_table(data)
+    articles = table.index.to_numpy()
+    first = [model1 for model1, _ in comparison_pairs]
+    second = [model2 for _, model2 in comparison_pairs]
+    comparison_data = {
+        "Article Key": np.repeat(articles, len(comparison_pairs)),
+        "Model 1": np.tile(first, len(articles)),
+        "Model 2": np.tile(second, len(articles)),
+    }
+    for label, column in COMPARED_METRICS.items():
+        metric = table[column]
+        for position, models in [("Model 1", first), ("Model 2", second)]:
+            comparison_data[f"{position} {label}"] = (
+                metric.reindex(columns=models).to_numpy().ravel()
             )
+    comparison_df = pd.DataFrame(comparison_data)
+    comparison_df["Sentiment Drift"] = (
+        comparison_df["Model 2 Mean Sentiment"]
+        - comparison_df["Model 1 Mean Sentiment"]
+    )
+    return comparison_df
+
+
+def article_table(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    The compared metrics with one row per article and a (metric, model)
+    column for every model, averaging duplicate rows. Articles keep the
+    order of the report.
+    """
+    columns = list(COMPARED_METRICS.values())
+    table = (
+        data.groupby(["Article Key", "Model Name"])[columns]
+        .mean()
+        .unstack("Model Name")
+    )
+    return table.reindex(data["Article Key"].unique())
+
+
+def comparison_matrices(data: pd.DataFrame) -> dict:
+    """
+    For each compared metric, a model x model matrix of the mean difference
+    (column model minus row model) over the articles both models have.
+    """
+    table = article_table(data)
+    models = sorted(data["Model Name"].unique())
+    matrices = {}
+    for label, column in COMPARED_METRICS.items():
+        values = table[column].reindex(columns=models).to_numpy()
+        present = (~np.isnan(values)).astype(float)
+        values = np.nan_to_num(values)
+        # Sums of the column model's values over articles both models have,
+        # and of the row model's, with one matrix product each
+        column_sums = present.T @ values
+        with np.errstate(divide="ignore", invalid="ignore"):
+            deltas = (column_sums - column_sums.T) / (present.T @ present)
+        matrices[label] = pd.DataFrame(deltas, index=models, columns=models)
+    return matrices
 
-    return pd.DataFrame(comparison_data)
+
+def load_raw_results(config: dict) -> pd.DataFrame:
+    """
+    Valid per-iteration results from the results store, with model names and
+    article keys normalized like the metrics report's.
+    """
+    results_store = open_results_store(config.get("results_store") or {})
+    raw = results_store.read(["valid", *TESTED_DIFFERENCES.values()])
+    raw = raw[raw["valid"].fillna(False)]
+    article_keys = raw["key"]
+    if config.get("tickers"):
+        article_keys = raw["ticker"] + ":" + raw["key"]
+    return raw.assign(
+        **{
+            "Model Name": raw["model"]
+            .str.replace(":", "_")
+            .str.replace("-", "_")
+            .str.lower(),
+            "Article Key": article_keys,
+        }
+    )
+
+
+def add_significance(
+    comparison_df: pd.DataFrame, raw: pd.DataFrame, stats_config: dict
+) -> pd.DataFrame:
+    """
+    Adds a bootstrap confidence interval and a permutation-test p-value for
+    each row's per-article differences, from the raw per-iteration values.
+    """
+    resamples = stats_config.get("resamples", 5000)
+    confidence = stats_config.get("confidence", 0.95)
+    rng = np.random.default_rng(stats_config.get("seed", 0))
+    empty = np.array([])
+    start_time = time.perf_counter()
+    comparison_df = comparison_df.copy()
+    for label, column in TESTED_DIFFERENCES.items():
+        samples = {
+            group: values.dropna().to_numpy(dtype=float)
+            for group, values in raw.groupby(["Model Name", "Article Key"])[column]
+        }
+        first, second = [
+            [
+                samples.get((model_name, article_key), empty)
+                for model_name, article_key in zip(
+                    comparison_df[model_column], comparison_df["Article Key"]
+                )
+            ]
+            for model_column in ["Model 1", "Model 2"]
+        ]
+        difference, low, high = bootstrap_mean_difference(
+            first, second, resamples, confidence, rng
+        )
+        # The reported difference is the tested one; rows without raw results
+        # keep the difference of the report's article means
+        tested = pd.Series(difference, index=comparison_df.index)
+        if label in comparison_df:
+            tested = tested.fillna(comparison_df[label])
+        comparison_df[label] = tested.round(3)
+        comparison_df[f"{label} CI Low"] = low.round(3)
+        comparison_df[f"{label} CI High"] = high.round(3)
+        comparison_df[f"{label} p-value"] = permutation_pvalues(
+            first, second, resamples, rng
+        ).round(4)
+    print(
+        f"Tested {len(comparison_df)} comparison(s) with {resamples} resamples "
+        f"in {time.perf_counter() - start_time:.2f}s"
+    )
+    return comparison_df
 
 
 def create_comparison_report(
-    comparison_df: pd.DataFrame, output_xlsx: str, output_csv: str
+    comparison_df: pd.DataFrame,
+    output_xlsx: str,
+    output_csv: str,
+    matrices: Optional[dict] = None,
 ):
     os.makedirs(os.path.dirname(output_xlsx), exist_ok=True)
     writer = pd.ExcelWriter(output_xlsx, engine="xlsxwriter")
 
     comparison_df.to_excel(writer, sheet_name="Model Comparison", index=False)
+    for label, matrix in (matrices or {}).items():
+        matrix.to_excel(writer, sheet_name=f"{label} Matrix")
     writer.close()
 
     comparison_df.to_csv(output_csv, index=False)
+    for label, matrix in (matrices or {}).items():
+        matrix.to_csv(
+            os.path.join(
+                os.path.dirname(output_csv),
+                f"model_comparison_{label.lower().replace(' ', '_')}_matrix.csv",
+            )
+        )
 
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare the configured model pairs article by article."
+    )
+    parser.add_argument(
+        "--all-pairs",
+        action="store_true",
+        help="Also write a model x model matrix of the differences per metric",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
     config_file = "config.yaml"
     config = load_config(config_file)
 
@@ -76,8 +253,17 @@ def main():
     )
 
     data = load_csv_data(input_csv_file)
-    comparison_df = compare_models(data, config["comparison_pairs"])
-    create_comparison_report(comparison_df, output_xlsx_file, output_csv_file)
+    comparison_pairs = add_variant_pairs(data, config["comparison_pairs"])
+    comparison_df = compare_models(data, comparison_pairs)
+    print(
+        f"Compared {len(comparison_pairs)} pair(s) over "
+        f"{comparison_df['Article Key'].nunique()} article(s)"
+    )
+    comparison_df = add_significance(
+        comparison_df, load_raw_results(config), config.get("comparison_stats") or {}
+    )
+    matrices = comparison_matrices(data) if args.all_pairs else None
+    create_comparison_report(comparison_df, output_xlsx_file, output_csv_file, matrices)
 
 
 if __name__ == "__main__":
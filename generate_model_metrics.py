@@ -1,112 +1,455 @@
-import json
+import argparse
 import logging
 import os
-from collections import defaultdict
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
 
 import numpy as np
 import pandas as pd
 
-from utils.file_utils import load_config
+from utils.backends import BACKEND_METRIC_KEYS, NANOSECONDS
+from utils.cache import configure_cache, get_cache
+from utils.file_utils import load_config, model_folder_name
+from utils.results_store import (
+    ResultsStore,
+    migrate,
+    open_results_store,
+    select_models,
+)
 
 CONFIG_FILE = "config.yaml"
 INCLUDE_REASONING_SAMPLES = False
 DECIMAL_PLACES = 2
+# Part of the metrics cache key; bump it when the aggregation changes
+METRICS_VERSION = 3
+
+# Client-side stream timings in seconds (stream_early_stop)
+STREAM_METRIC_KEYS = ["time_to_first_token", "time_to_json"]
+
+# Results store columns the metrics read
+METRIC_COLUMNS = [
+    "model",
+    "key",
+    "valid",
+    "batch_fallback",
+    "time_taken",
+    "sentiment",
+    "confidence",
+    *BACKEND_METRIC_KEYS,
+    "batch_size",
+    "prompt_tokens",
+    *STREAM_METRIC_KEYS,
+    "host",
+    "duplicate_of",
+]
+
+# Latency percentiles of time_taken reported per article, for capacity planning
+LATENCY_PERCENTILES = [0.5, 0.9, 0.99]
+
+# Per-article metrics and their report columns, in report order
+ARTICLE_METRICS = {
+    "inference_rate": "Inference Rate (s)",
+    "valid_json_rate": "Valid JSON Rate",
+    "sample_count": "Sample Count",
+    "sentiment_variance": "Sentiment Variance",
+    "mean_sentiment": "Mean Sentiment",
+    "mean_confidence": "Mean Confidence",
+    "prompt_tokens_per_second": "Prompt Tokens/s",
+    "generation_tokens_per_second": "Generation Tokens/s",
+    "time_to_first_token": "Time To First Token (s)",
+    "time_to_json": "Time To JSON (s)",
+    "prompt_tokens": "Prompt Tokens",
+    **{
+        f"p{round(percentile * 100)}_time_taken": (
+            f"P{round(percentile * 100)} Time (s)"
+        )
+        for percentile in LATENCY_PERCENTILES
+    },
+    "time_taken_std": "Time Std Dev (s)",
+    "min_time_taken": "Min Time (s)",
+    "max_time_taken": "Max Time (s)",
+    "total_tokens": "Total Tokens",
+    "batch_valid_json_rate": "Batch Valid JSON Rate",
+}
+REPORT_COLUMNS = {
+    "ticker": "Ticker",
+    "model": "Model Name",
+    "key": "Article Key",
+    **ARTICLE_METRICS,
+}
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
 
-def load_model_json_files(model_path: str) -> list:
-    json_data = []
-    for file_name in os.listdir(model_path):
-        if file_name.endswith(".json"):
-            with open(os.path.join(model_path, file_name), "r") as file:
-                data = json.load(file)
-                json_data.append(data)
-    return json_data
-
-
 def extract_model_name(path: str) -> str:
     return os.path.basename(path).replace(":", "_")
 
 
-def aggregate_sentiments(json_data: list) -> dict:
-    aggregated_data = defaultdict(list)
-    for data in json_data:
-        for key, sentiment in data["sentiments"].items():
-            aggregated_data[key].append(sentiment)
-    return aggregated_data
-
-
-def compute_metrics_per_article(aggregated_sentiments: dict) -> dict:
-    metrics = defaultdict(lambda: defaultdict(list))
-    for key, sentiments in aggregated_sentiments.items():
-        for sentiment in sentiments:
-            if sentiment["valid"]:
-                metrics[key]["time_taken"].append(sentiment["time_taken"])
-                metrics[key]["sentiment"].append(sentiment["sentiment"])
-                metrics[key]["confidence"].append(sentiment["confidence"])
-            metrics[key]["valid"].append(sentiment["valid"])
-
-    aggregated_metrics = {}
-    for key, values in metrics.items():
-        valid_count = sum(values["valid"])
-        total_count = len(values["valid"])
-
-        aggregated_metrics[key] = {
-            "inference_rate": round(np.mean(values["time_taken"]), DECIMAL_PLACES)
-            if values["time_taken"]
-            else 0,
-            "valid_json_rate": round(valid_count / total_count, DECIMAL_PLACES)
-            if total_count > 0
-            else 0,
-            "sentiment_variance": round(np.var(values["sentiment"]), DECIMAL_PLACES)
-            if values["sentiment"]
-            else 0,
-            "mean_sentiment": round(np.mean(values["sentiment"]), DECIMAL_PLACES)
-            if values["sentiment"]
-            else 0,
-            "mean_confidence": round(np.mean(values["confidence"]), DECIMAL_PLACES)
-            if values["confidence"]
-            else 0,
+def numeric(column: pd.Series) -> np.ndarray:
+    """A nullable store column as float64, with NaN for missing values."""
+    return column.astype("Float64").to_numpy(dtype=float, na_value=np.nan)
+
+
+def per_article_counter(results: pd.DataFrame, key: str) -> np.ndarray:
+    """
+    A backend counter's share for each article. A batched call reports one
+    set of counters for the whole batch, stored with every article in it.
+    """
+    batch_size = np.nan_to_num(numeric(results["batch_size"]), nan=1.0)
+    return np.nan_to_num(numeric(results[key])) / batch_size
+
+
+def compute_article_metrics(results: pd.DataFrame, by: list) -> pd.DataFrame:
+    """
+    Computes every (model, article) aggregate in one groupby pass over the
+    long-format results. Timing, sentiment and confidence means only count valid
+    results. Token throughput counts every call that reported eval_duration.
+    The latency spread counts every call, valid or not. The batch valid JSON
+    rate leaves out results only made valid by retrying the article alone.
+    Duplicates fanned out from another article's call (duplicate_of) count
+    towards the rates and sentiment, but not towards timing or tokens.
+    """
+    inferred = results["duplicate_of"].isna().to_numpy()
+    valid = results["valid"].fillna(False).to_numpy(dtype=bool)
+    batch_fallback = results["batch_fallback"].fillna(False).to_numpy(dtype=bool)
+    time_taken = np.where(inferred, numeric(results["time_taken"]), np.nan)
+    timed = results["eval_duration"].notna().to_numpy() & inferred
+    counters = {key: per_article_counter(results, key) for key in BACKEND_METRIC_KEYS}
+    frame = pd.DataFrame(
+        {
+            **{column: results[column].to_numpy() for column in by},
+            "valid": valid,
+            "batch_valid": valid & ~batch_fallback,
+            "valid_time": np.where(valid, time_taken, np.nan),
+            "sentiment": np.where(valid, numeric(results["sentiment"]), np.nan),
+            "confidence": np.where(valid, numeric(results["confidence"]), np.nan),
+            "time_taken": time_taken,
+            **{
+                key: np.where(timed, values, np.nan) for key, values in counters.items()
+            },
+            # Backend estimate of the time to first token, in nanoseconds
+            "backend_first_token": np.where(
+                timed,
+                counters["load_duration"] + counters["prompt_eval_duration"],
+                np.nan,
+            ),
+            **{
+                key: np.where(inferred, numeric(results[key]), np.nan)
+                for key in STREAM_METRIC_KEYS
+            },
+            "prompt_tokens": numeric(results["prompt_tokens"]),
+            "total_tokens": np.where(
+                inferred, counters["prompt_eval_count"] + counters["eval_count"], 0
+            ),
+        }
+    )
+    grouped = frame.groupby(by, sort=False)
+    metrics = grouped.agg(
+        sample_count=("valid", "size"),
+        valid_count=("valid", "sum"),
+        batch_valid_count=("batch_valid", "sum"),
+        inference_rate=("valid_time", "mean"),
+        mean_sentiment=("sentiment", "mean"),
+        mean_confidence=("confidence", "mean"),
+        prompt_eval_count=("prompt_eval_count", "sum"),
+        prompt_eval_duration=("prompt_eval_duration", "sum"),
+        eval_count=("eval_count", "sum"),
+        eval_duration=("eval_duration", "sum"),
+        client_first_token=("time_to_first_token", "mean"),
+        backend_first_token=("backend_first_token", "mean"),
+        time_to_json=("time_to_json", "mean"),
+        prompt_tokens=("prompt_tokens", "mean"),
+        min_time_taken=("time_taken", "min"),
+        max_time_taken=("time_taken", "max"),
+        total_tokens=("total_tokens", "sum"),
+    )
+    metrics["sentiment_variance"] = grouped["sentiment"].var(ddof=0)
+    metrics["time_taken_std"] = grouped["time_taken"].std(ddof=0)
+    # Reindexed, as a model without stored rows unstacks to no columns at all
+    percentiles = (
+        grouped["time_taken"]
+        .quantile(LATENCY_PERCENTILES)
+        .unstack()
+        .reindex(columns=LATENCY_PERCENTILES)
+    )
+    for percentile in LATENCY_PERCENTILES:
+        metrics[f"p{round(percentile * 100)}_time_taken"] = percentiles[percentile]
+
+    metrics["valid_json_rate"] = metrics["valid_count"] / metrics["sample_count"]
+    metrics["batch_valid_json_rate"] = (
+        metrics["batch_valid_count"] / metrics["sample_count"]
+    )
+    metrics["prompt_tokens_per_second"] = tokens_per_second(
+        metrics["prompt_eval_count"], metrics["prompt_eval_duration"]
+    )
+    metrics["generation_tokens_per_second"] = tokens_per_second(
+        metrics["eval_count"], metrics["eval_duration"]
+    )
+    # Streamed calls measure it on the client; otherwise the backend's counters
+    metrics["time_to_first_token"] = metrics["client_first_token"].fillna(
+        metrics["backend_first_token"] / NANOSECONDS
+    )
+    metrics = metrics[list(ARTICLE_METRICS)].fillna(0)
+    # Whole tokens, rounded before the other metrics so they round only once
+    for column in ["prompt_tokens", "sample_count", "total_tokens"]:
+        metrics[column] = metrics[column].round().astype(int)
+    return metrics.round(DECIMAL_PLACES).reset_index()
+
+
+def host_totals(results: pd.DataFrame) -> pd.DataFrame:
+    """Per-host sums, merged across workers before compute_host_metrics."""
+    hosted = results[results["host"].notna() & results["duplicate_of"].isna()]
+    return (
+        pd.DataFrame(
+            {
+                "host": hosted["host"].to_numpy(),
+                "samples": 1,
+                "time_taken": np.nan_to_num(numeric(hosted["time_taken"])),
+                "eval_count": per_article_counter(hosted, "eval_count"),
+                "eval_duration": per_article_counter(hosted, "eval_duration"),
+            }
+        )
+        .groupby("host")
+        .sum()
+    )
+
+
+def compute_host_metrics(worker_totals: list) -> list:
+    """Per-host timings, so results produced on different machines stay comparable."""
+    if not worker_totals:
+        return []
+    totals = pd.concat(worker_totals).groupby(level=0).sum().sort_index()
+    return [
+        {
+            "Host": host,
+            "Samples": int(row["samples"]),
+            "Inference Rate (s)": round(
+                row["time_taken"] / row["samples"], DECIMAL_PLACES
+            ),
+            "Generation Tokens/s": float(
+                tokens_per_second(row["eval_count"], row["eval_duration"])
+            ),
+        }
+        for host, row in totals.iterrows()
+    ]
+
+
+def compute_ticker_metrics(model_metrics: pd.DataFrame) -> list:
+    """Per (ticker, model) summary of the article metrics in universe mode."""
+    if "ticker" not in model_metrics:
+        return []
+    summary = (
+        model_metrics.groupby(["ticker", "model"])
+        .agg(
+            articles=("key", "size"),
+            mean_sentiment=("mean_sentiment", "mean"),
+            valid_json_rate=("valid_json_rate", "mean"),
+            inference_rate=("inference_rate", "mean"),
+        )
+        .round(DECIMAL_PLACES)
+        .reset_index()
+    )
+    return [
+        {
+            "Ticker": row.ticker,
+            "Model Name": row.model,
+            "Articles": row.articles,
+            "Mean Sentiment": row.mean_sentiment,
+            "Valid JSON Rate": row.valid_json_rate,
+            "Inference Rate (s)": row.inference_rate,
+        }
+        for row in summary.itertuples()
+    ]
+
+
+def load_model_metrics(
+    results_dir: str, model_name: str, tickers: Optional[list] = None
+) -> dict:
+    """
+    Reads and aggregates one model's results, including its run variants, in
+    a worker process. Only the numeric columns of the model's rows are loaded,
+    and only the aggregated metrics are sent back. With tickers (universe
+    mode), articles are aggregated per ticker.
+    """
+    start_time = time.perf_counter()
+    results = select_models(
+        ResultsStore(results_dir).read(
+            METRIC_COLUMNS, model_prefix=model_folder_name(model_name)
+        ),
+        [model_name],
+    )
+    load_time = time.perf_counter() - start_time
+
+    by = ["model", "key"]
+    if tickers:
+        results = results[results["ticker"].isin(tickers)]
+        by = ["model", "ticker", "key"]
+    model_metrics = compute_article_metrics(results, by)
+    model_metrics["model"] = model_metrics["model"].map(extract_model_name)
+    if tickers:
+        # Article keys only identify a URL, which several tickers can share
+        model_metrics["key"] = model_metrics["ticker"] + ":" + model_metrics["key"]
+        model_metrics["ticker_order"] = model_metrics["ticker"].map(tickers.index)
+        model_metrics = model_metrics.sort_values(
+            ["model", "ticker_order"], kind="stable"
+        ).drop(columns="ticker_order")
+    return {
+        "model_name": model_name,
+        "model_metrics": model_metrics,
+        "hosts": host_totals(results),
+        "rows": len(results),
+        "load_time": load_time,
+        "aggregate_time": time.perf_counter() - start_time - load_time,
+    }
+
+
+def metrics_cache_key(
+    results_dir: str, model_name: str, tickers: Optional[list]
+) -> tuple:
+    return (
+        "metrics",
+        METRICS_VERSION,
+        results_dir,
+        model_name,
+        tuple(tickers or ()),
+        *ARTICLE_METRICS,
+    )
+
+
+def find_cached_metrics(
+    results_store: ResultsStore,
+    models_to_test: list,
+    tickers: Optional[list],
+    force: bool = False,
+) -> tuple:
+    """
+    Splits the models into those whose cached aggregates are still current
+    and those to rebuild, with the fingerprint of each model's stored results.
+    """
+    fingerprints = results_store.fingerprints(
+        [model_folder_name(model_name) for model_name in models_to_test]
+    )
+    metrics_cache = get_cache("metrics")
+    reused, stale, model_fingerprints = {}, [], {}
+    for model_name in models_to_test:
+        fingerprint = fingerprints[model_folder_name(model_name)]
+        model_fingerprints[model_name] = fingerprint
+        entry = metrics_cache.get(
+            metrics_cache_key(results_store.directory, model_name, tickers)
+        )
+        if force:
+            reason = "--force"
+        elif entry is None:
+            reason = "no cached metrics"
+        elif entry["fingerprint"] != fingerprint:
+            reason = "results changed"
+        else:
+            logging.info("Reusing the metrics of %s: results unchanged", model_name)
+            reused[model_name] = {**entry["model_result"], "reused": True}
+            continue
+        logging.info("Rebuilding the metrics of %s: %s", model_name, reason)
+        stale.append(model_name)
+    return reused, stale, model_fingerprints
+
+
+def log_load_times(loaded: list, wall_time: float, max_workers: int) -> list:
+    load_times = [
+        {
+            "Model Name": model_result["model_name"],
+            "Rows": model_result["rows"],
+            "Load Time (s)": round(model_result["load_time"], 3),
+            "Aggregate Time (s)": round(model_result["aggregate_time"], 3),
+            "Reused": model_result.get("reused", False),
         }
+        for model_result in loaded
+    ]
+    for row in load_times:
+        if row["Reused"]:
+            continue
+        logging.info(
+            "Loaded %s: %d row(s) in %.3fs, aggregated in %.3fs",
+            row["Model Name"],
+            row["Rows"],
+            row["Load Time (s)"],
+            row["Aggregate Time (s)"],
+        )
+    rebuilt = [
+        model_result for model_result in loaded if not model_result.get("reused")
+    ]
+    summed_time = sum(
+        model_result["load_time"] + model_result["aggregate_time"]
+        for model_result in rebuilt
+    )
+    logging.info(
+        "Loaded %d model(s) in %.2fs wall time (%.2fs summed) with %d worker(s), "
+        "reused %d from the cache",
+        len(rebuilt),
+        wall_time,
+        summed_time,
+        max_workers,
+        len(loaded) - len(rebuilt),
+    )
+    return load_times
 
-    return aggregated_metrics
+
+def tokens_per_second(counts, durations):
+    """Token rates for summed counts and nanosecond durations, 0 without time."""
+    counts = np.asarray(counts, dtype=float)
+    seconds = np.asarray(durations, dtype=float) / NANOSECONDS
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(seconds > 0, counts / seconds, 0.0)
+    return np.round(rates, DECIMAL_PLACES)
 
 
 def create_xlsx_and_csvs(
-    model_metrics: dict,
+    model_metrics: pd.DataFrame,
     output_file: str,
     output_csv_file: str,
+    host_metrics: Optional[list] = None,
+    ticker_metrics: Optional[list] = None,
+    load_times: Optional[list] = None,
 ):
     os.makedirs(os.path.dirname(output_csv_file), exist_ok=True)
     writer = pd.ExcelWriter(output_file, engine="xlsxwriter")
 
     # Model Details Sheet
-    model_details_data = [
-        {
-            "Model Name": model,
-            "Article Key": key,
-            "Inference Rate (s)": metrics["inference_rate"],
-            "Valid JSON Rate": metrics["valid_json_rate"],
-            "Sentiment Variance": metrics["sentiment_variance"],
-            "Mean Sentiment": metrics["mean_sentiment"],
-            "Mean Confidence": metrics["mean_confidence"],
-        }
-        for model, model_data in model_metrics.items()
-        for key, metrics in model_data.items()
-    ]
-    model_details_df = pd.DataFrame(model_details_data)
+    model_details_df = model_metrics[
+        [column for column in REPORT_COLUMNS if column in model_metrics]
+    ].rename(columns=REPORT_COLUMNS)
     model_details_df.to_excel(writer, sheet_name="Model Details", index=False)
 
+    if host_metrics:
+        pd.DataFrame(host_metrics).to_excel(writer, sheet_name="Hosts", index=False)
+
+    if ticker_metrics:
+        pd.DataFrame(ticker_metrics).to_excel(writer, sheet_name="Tickers", index=False)
+
+    if load_times:
+        pd.DataFrame(load_times).to_excel(writer, sheet_name="Load Times", index=False)
+
     writer.close()
 
     # Save all model data to a single CSV file
     model_details_df.to_csv(output_csv_file, index=False)
 
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Aggregate the stored results into the metrics report."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild every model's metrics instead of reusing cached ones",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
     config = load_config(CONFIG_FILE)
     models_to_test = config.get("models_to_test", [])
     sentiment_save_folder = config.get("sentiment_save_folder", "sentiments")
@@ -116,25 +459,73 @@ def main():
     if not report_output_csv_file:
         raise ValueError("No report output CSV file specified in the config.")
 
-    model_paths = [
-        os.path.join(sentiment_save_folder, model.replace(":", "_"))
-        for model in models_to_test
-    ]
+    configure_cache(config.get("cache") or {})
+    results_store = open_results_store(config.get("results_store") or {})
+    max_workers = (config.get("metrics") or {}).get("max_workers") or os.cpu_count()
+    tickers = config.get("tickers")
 
-    all_data = {
-        extract_model_name(path): aggregate_sentiments(load_model_json_files(path))
-        for path in model_paths
-    }
+    if results_store.is_empty() and os.path.isdir(sentiment_save_folder):
+        logging.info(
+            "No results in %s; importing %s",
+            results_store.directory,
+            sentiment_save_folder,
+        )
+        migrate(sentiment_save_folder, results_store)
 
-    logging.info("Loaded model data keys: %s", all_data.keys())
+    # Fingerprinted before loading, so rows stored meanwhile are rebuilt next time
+    reused, stale, fingerprints = find_cached_metrics(
+        results_store, models_to_test, tickers, args.force
+    )
+    start_time = time.perf_counter()
+    rebuilt = []
+    if stale:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(stale))) as executor:
+            rebuilt = list(
+                executor.map(
+                    load_model_metrics,
+                    [results_store.directory] * len(stale),
+                    stale,
+                    [tickers] * len(stale),
+                )
+            )
+    wall_time = time.perf_counter() - start_time
 
-    model_metrics = {
-        model: compute_metrics_per_article(sentiments)
-        for model, sentiments in all_data.items()
+    metrics_cache = get_cache("metrics")
+    for model_result in rebuilt:
+        model_name = model_result["model_name"]
+        metrics_cache.set(
+            metrics_cache_key(results_store.directory, model_name, tickers),
+            {"fingerprint": fingerprints[model_name], "model_result": model_result},
+        )
+    model_results = {
+        **reused,
+        **{model_result["model_name"]: model_result for model_result in rebuilt},
     }
+    loaded = [model_results[model_name] for model_name in models_to_test]
+
+    model_metrics = pd.DataFrame(columns=["model", "key", *ARTICLE_METRICS])
+    if loaded:
+        model_metrics = pd.concat(
+            [model_result["model_metrics"] for model_result in loaded],
+            ignore_index=True,
+        )
+    load_times = log_load_times(loaded, wall_time, max_workers)
+    if model_metrics.empty:
+        logging.warning(
+            "No results for the configured models in %s", results_store.directory
+        )
+
+    logging.info("Loaded model data keys: %s", list(model_metrics["model"].unique()))
 
     # Save the comparison results to an Excel file and a single CSV file
-    create_xlsx_and_csvs(model_metrics, report_output_file, report_output_csv_file)
+    create_xlsx_and_csvs(
+        model_metrics,
+        report_output_file,
+        report_output_csv_file,
+        compute_host_metrics([model_result["hosts"] for model_result in loaded]),
+        compute_ticker_metrics(model_metrics),
+        load_times,
+    )
 
 
 if __name__ == "__main__":
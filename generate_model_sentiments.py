@@ -1,70 +1,193 @@
-from functools import lru_cache
+import os
+from dataclasses import replace
+from typing import Dict, List, Optional
 
-import diskcache as dc
 import FinNews as fn
 import yfinance as yf
 
 from utils.analysis_utils import (
     clean_company_name,
+    count_missing_results,
     filter_recent_news,
     test_models,
+    test_universe,
 )
+from utils.article_store import ArticleStore, open_article_store
+from utils.cache import configure_cache, get_cache, log_cache_stats
 from utils.context import AnalysisContext, logger
+from utils.dedup import find_duplicates, log_duplicate_clusters
+from utils.distributed import test_models_distributed
 from utils.error_decorator import handle_errors
 from utils.file_utils import (
     load_config,
+    load_json_file,
 )
-from utils.web_scraper import get_content
+from utils.model_info import model_family
+from utils.results_store import open_results_store
+from utils.token_budget import apply_token_budget
+from utils.web_scraper import configure_session, extract_content, fetch_pages
 
 CONFIG_FILE = "config.yaml"
-CACHE_DIR = "cache"
-CACHE_TIMEOUT = 24 * 60 * 60  # 24 hours in seconds
 
 logger.debug("Logging is configured.")
 
 
-cache = dc.Cache(CACHE_DIR)
-
-
-@lru_cache(maxsize=None)
 @handle_errors()
 def get_company_name(ticker_symbol: str) -> str:
+    # Company names rarely change; caching them keeps large universes from
+    # making one quote lookup per symbol on every run
+    companies = get_cache("companies")
+    cached_name = companies.get(ticker_symbol)
+    if cached_name:
+        return cached_name
     ticker = yf.Ticker(ticker_symbol)
     if "shortName" not in ticker.info:
         raise ValueError(f"Invalid security symbol: {ticker_symbol}")
-    return clean_company_name(ticker.info["longName"])
+    company_name = clean_company_name(ticker.info["longName"])
+    companies.set(ticker_symbol, company_name)
+    return company_name
 
 
 @handle_errors([])
 def get_news(ticker_symbol: str, max_news_age: int, max_news_items: int) -> list:
+    # The raw feed is cached and filtered on every run, so the age and item
+    # limits always apply to the current time and configuration
+    feeds = get_cache("feeds")
     cache_key = f"news_{ticker_symbol}"
-    cached_news = cache.get(cache_key)
-    if cached_news:
+    news_object = feeds.get(cache_key)
+    if news_object is not None:
         logger.info("Returning cached news data.")
-        # Ensure the cached data is a list
-        if isinstance(cached_news, list):
-            return cached_news
-        else:
-            logger.error("Cached news data is not a list.")
-            return []
+    else:
+        yahoo_feed = fn.Yahoo(topics=["$" + ticker_symbol])
+        logger.info("Getting news from Yahoo Finance...")
+        news_object = yahoo_feed.get_news()
+        feeds.set(cache_key, news_object)
+    if not isinstance(news_object, list):
+        logger.error("News data is not a list.")
+        return []
+    return filter_recent_news(news_object, max_news_age, max_news_items)
+
+
+@handle_errors({})
+def get_extracted_contents(
+    news_by_ticker: Dict[str, list], company_names: Dict[str, str], fetch_config: dict
+) -> Dict[str, Dict[str, str]]:
+    """
+    Fetches every article page once, however many tickers' feeds list it, and
+    extracts each ticker's content from the shared HTML. Extracted text is
+    cached, so pages are only fetched and parsed again for new articles.
+    Returns the text per ticker and link; links whose page failed are left out.
+    """
+    logger.info("Getting content from the news articles...")
+    extractor = fetch_config.get("extractor", "html.parser")
+    content_cache = get_cache("content")
+    extracted: Dict[tuple, str] = {}
+    missing = []
+    for ticker_symbol, news_object in news_by_ticker.items():
+        for news in news_object:
+            key = (news["link"], company_names[ticker_symbol], ticker_symbol, extractor)
+            cached_content = content_cache.get(key)
+            if cached_content is None:
+                missing.append(key)
+            else:
+                extracted[key] = cached_content
 
-    yahoo_feed = fn.Yahoo(topics=["$" + ticker_symbol])
-    logger.info("Getting news from Yahoo Finance...")
-    news_object = yahoo_feed.get_news()
-    filtered_news = filter_recent_news(news_object, max_news_age, max_news_items)
+    links = list(dict.fromkeys(link for link, *_ in missing))
+    pages = dict(
+        zip(
+            links,
+            fetch_pages(
+                links,
+                fetch_config.get("max_workers", 8),
+                fetch_config.get("per_host_limit", 2),
+                fetch_config.get("timeout", 10),
+            ),
+        )
+    )
+    for key in missing:
+        link, company_name, ticker_symbol, _ = key
+        if pages[link]:
+            extracted[key] = extract_content(
+                pages[link], company_name, ticker_symbol, extractor
+            )
+            content_cache.set(key, extracted[key])
 
-    cache.set(cache_key, filtered_news, expire=CACHE_TIMEOUT)
-    return filtered_news
+    feed_items = sum(len(news_object) for news_object in news_by_ticker.values())
+    logger.info(
+        f"{feed_items} feed item(s) across {len(news_by_ticker)} ticker(s): "
+        f"{feed_items - len(missing)} extracted text(s) cached, "
+        f"{len(links)} page(s) to fetch"
+    )
+    return {
+        ticker_symbol: {
+            link: text
+            for (link, _, ticker, _), text in extracted.items()
+            if ticker == ticker_symbol
+        }
+        for ticker_symbol in news_by_ticker
+    }
 
 
-@handle_errors({})
-def get_content_map(news_object: list, company_name: str, ticker_symbol: str) -> dict:
+def get_content_maps(
+    news_by_ticker: Dict[str, list],
+    company_names: Dict[str, str],
+    fetch_config: dict,
+    article_store: Optional[ArticleStore] = None,
+) -> Dict[str, dict]:
+    """
+    Builds each ticker's content map. With the article store, only feed items
+    it does not hold yet are fetched, and they are added to it.
+    """
+    known = {
+        ticker_symbol: (
+            article_store.known_urls(
+                ticker_symbol, [news["link"] for news in news_object]
+            )
+            if article_store
+            else {}
+        )
+        for ticker_symbol, news_object in news_by_ticker.items()
+    }
+    new_news = {
+        ticker_symbol: [
+            news for news in news_object if news["link"] not in known[ticker_symbol]
+        ]
+        for ticker_symbol, news_object in news_by_ticker.items()
+    }
+    to_fetch = {
+        ticker_symbol: news_object
+        for ticker_symbol, news_object in new_news.items()
+        if news_object
+    }
+    fetched = (
+        get_extracted_contents(to_fetch, company_names, fetch_config)
+        if to_fetch
+        else {}
+    )
+    if article_store:
+        for ticker_symbol, news_object in new_news.items():
+            article_store.add_articles(
+                ticker_symbol, news_object, fetched.get(ticker_symbol, {})
+            )
+            logger.info(
+                f"{ticker_symbol}: {len(news_object)} new of "
+                f"{len(news_by_ticker[ticker_symbol])} feed item(s)"
+            )
+    return {
+        ticker_symbol: get_content_map(
+            news_object,
+            {**known[ticker_symbol], **fetched.get(ticker_symbol, {})},
+        )
+        for ticker_symbol, news_object in news_by_ticker.items()
+    }
+
+
+def get_content_map(news_object: list, extra_contents: Dict[str, str]) -> dict:
     content_map = {}
-    logger.info("Getting content from the news articles...")
     for news in news_object:
         url = news["link"]
         content = news["summary"] if news["summary"][-1] != "?" else ""
-        extra_content = get_content(url, company_name, ticker_symbol)
+        extra_content = extra_contents.get(url)
         if extra_content:
             content += " " + extra_content
         if content:
@@ -78,10 +201,53 @@ def log_company_info(company_name: str, ticker_symbol: str) -> bool:
     return True
 
 
+def prepare_content_map(
+    content_map: dict,
+    company_name: str,
+    ticker_symbol: str,
+    models_to_test: List[str],
+    sample_size: int,
+    dedup_config: dict,
+    token_budget_config: dict,
+) -> tuple:
+    """Finds duplicate clusters and trims the content to the token budget."""
+    duplicates = {}
+    if dedup_config.get("enabled", False):
+        duplicates = find_duplicates(
+            content_map, dedup_config.get("near_duplicate_threshold", 0.85)
+        )
+        log_duplicate_clusters(
+            duplicates, len(content_map), len(models_to_test) * sample_size
+        )
+
+    if token_budget_config.get("enabled", False):
+        content_map = apply_token_budget(
+            content_map,
+            token_budget_config.get("max_content_tokens", 2048),
+            {model_family(model_name) for model_name in models_to_test},
+            [company_name, ticker_symbol],
+        )
+    return content_map, duplicates
+
+
 def main():
     config = load_config(CONFIG_FILE)
-    ticker_symbol = config.get("ticker_symbol")
-    company_name = get_company_name(ticker_symbol)
+    configure_cache(config.get("cache") or {})
+    # A tickers list switches to universe mode, with results per ticker
+    universe = config.get("tickers") or []
+    tickers = universe or [config.get("ticker_symbol")]
+    offline_fixture = config.get("offline_fixture")
+    fixture = load_json_file(offline_fixture) if offline_fixture else None
+    # Universe fixtures hold one single-ticker fixture per symbol
+    fixtures = (fixture.get("tickers") or {tickers[0]: fixture}) if fixture else {}
+    company_names = {
+        ticker_symbol: (
+            fixtures[ticker_symbol]["company_name"]
+            if fixture
+            else get_company_name(ticker_symbol)
+        )
+        for ticker_symbol in tickers
+    }
     max_news_age = config.get("max_news_age", 1)
     max_news_items = config.get("max_news_items", 5)
     models_to_test = config.get("models_to_test", [])
@@ -90,29 +256,160 @@ def main():
     context_window_size = config.get("context_window_size", 8192)
     num_tokens_to_predict = config.get("num_tokens_to_predict", 1024)
     sentiment_save_folder = config.get("sentiment_save_folder", "sentiments")
+    max_concurrent_requests = config.get("max_concurrent_requests", 1)
+    model_concurrency = config.get("model_concurrency") or {}
+    scheduler_config = config.get("scheduler") or {}
+    resume = config.get("resume", False)
+    prefix_reuse = config.get("prefix_reuse", False)
+    batch_size = config.get("batch_size", 1)
+    stream_early_stop = config.get("stream_early_stop", False)
+    constrained_decoding = config.get("constrained_decoding", False)
+    adaptive_config = config.get("adaptive_sampling") or {}
+    distributed_config = config.get("distributed") or {}
+    dedup_config = config.get("dedup") or {}
+    token_budget_config = config.get("token_budget") or {}
+    fetch_config = config.get("fetch") or {}
+    backends = config.get("backends") or {}
+    default_backend = config.get("default_backend", "ollama")
+    model_backends = config.get("model_backends") or {}
+    article_store = open_article_store(config.get("article_store") or {})
+    results_store_config = config.get("results_store") or {}
+    results_store = open_results_store(results_store_config)
 
-    if not company_name or not ticker_symbol:
-        raise ValueError("Invalid company name or ticker symbol.")
+    for ticker_symbol, company_name in list(company_names.items()):
+        if company_name and ticker_symbol:
+            continue
+        if not universe:
+            raise ValueError("Invalid company name or ticker symbol.")
+        # One bad symbol should not stop a universe run
+        logger.error(f"Skipping ticker {ticker_symbol}: no company name")
+        del company_names[ticker_symbol]
+    tickers = list(company_names)
+    if not tickers:
+        raise ValueError("No valid tickers.")
 
     if len(models_to_test) == 0:
         raise ValueError("No models to test.")
 
-    log_company_info(company_name, ticker_symbol)
+    for ticker_symbol, company_name in company_names.items():
+        log_company_info(company_name, ticker_symbol)
 
-    news_object = get_news(ticker_symbol, max_news_age, max_news_items)
-    content_map = get_content_map(news_object, company_name, ticker_symbol)
+    configure_session(
+        fetch_config.get("max_workers", 8),
+        fetch_config.get("retries", 3),
+        fetch_config.get("backoff_factor", 0.5),
+    )
+    if fixture:
+        logger.info(f"Using offline fixture: {offline_fixture}")
+        news_by_ticker = {
+            ticker_symbol: fixtures[ticker_symbol]["news"] for ticker_symbol in tickers
+        }
+    else:
+        news_by_ticker = {
+            ticker_symbol: get_news(ticker_symbol, max_news_age, max_news_items)
+            for ticker_symbol in tickers
+        }
+    content_maps = {
+        ticker_symbol: fixtures[ticker_symbol]["content_map"]
+        for ticker_symbol in tickers
+        if "content_map" in fixtures.get(ticker_symbol, {})
+    }
+    to_fetch = {
+        ticker_symbol: news_object
+        for ticker_symbol, news_object in news_by_ticker.items()
+        if ticker_symbol not in content_maps
+    }
+    if to_fetch:
+        content_maps.update(
+            get_content_maps(to_fetch, company_names, fetch_config, article_store)
+        )
 
-    context = AnalysisContext(
-        content_map=content_map,
-        company_name=company_name,
-        news_object=news_object,
-        ticker_symbol=ticker_symbol,
+    base_context = AnalysisContext(
+        content_map={},
+        company_name="",
+        news_object=[],
+        ticker_symbol="",
         default_temperature=default_temperature,
         context_window_size=context_window_size,
         num_tokens_to_predict=num_tokens_to_predict,
         sentiment_save_folder=sentiment_save_folder,
+        max_concurrent_requests=max_concurrent_requests,
+        model_concurrency=model_concurrency,
+        ram_budget_gb=scheduler_config.get("ram_budget_gb", 0.0),
+        max_loaded_models=scheduler_config.get("max_loaded_models", 1),
+        keep_alive=scheduler_config.get("keep_alive"),
+        interleave_iterations=scheduler_config.get("interleave_iterations", False),
+        resume=resume,
+        prefix_reuse=prefix_reuse,
+        batch_size=batch_size,
+        stream_early_stop=stream_early_stop,
+        max_content_tokens=(
+            token_budget_config.get("max_content_tokens", 2048)
+            if token_budget_config.get("enabled", False)
+            else 0
+        ),
+        constrained_decoding=constrained_decoding,
+        adaptive_sampling=adaptive_config.get("enabled", False),
+        min_iterations=adaptive_config.get("min_iterations", 3),
+        ci_width=adaptive_config.get("ci_width", 0.1),
+        ci_confidence=adaptive_config.get("confidence", 0.95),
+        hosts=distributed_config.get("hosts") or [],
+        max_attempts=distributed_config.get("max_attempts", 3),
+        max_host_failures=distributed_config.get("max_host_failures", 3),
+        retry_delay=distributed_config.get("retry_delay", 5.0),
+        backends=backends,
+        default_backend=default_backend,
+        model_backends=model_backends,
+        article_store=article_store,
+        results_store=results_store,
+        json_results=results_store_config.get("json_files", True),
     )
-    test_models(models_to_test, sample_size, context)
+    contexts = []
+    for ticker_symbol in tickers:
+        content_map, duplicates = prepare_content_map(
+            content_maps.get(ticker_symbol, {}),
+            company_names[ticker_symbol],
+            ticker_symbol,
+            models_to_test,
+            sample_size,
+            dedup_config,
+            token_budget_config,
+        )
+        contexts.append(
+            replace(
+                base_context,
+                content_map=content_map,
+                company_name=company_names[ticker_symbol],
+                news_object=news_by_ticker[ticker_symbol],
+                ticker_symbol=ticker_symbol,
+                duplicates=duplicates,
+                # Universe results are laid out per ticker
+                sentiment_save_folder=os.path.join(sentiment_save_folder, ticker_symbol)
+                if universe
+                else sentiment_save_folder,
+            )
+        )
+
+    log_cache_stats(["feeds", "pages", "content", "companies"])
+
+    if article_store:
+        missing = sum(
+            count_missing_results(models_to_test, sample_size, context)
+            for context in contexts
+        )
+        if not missing:
+            logger.info("Every article already has its results; nothing to infer.")
+            return
+        logger.info(f"{missing} (model, iteration, article) result(s) to infer")
+
+    if base_context.hosts:
+        for context in contexts:
+            test_models_distributed(models_to_test, sample_size, context)
+    elif universe:
+        test_universe(models_to_test, sample_size, contexts)
+    else:
+        test_models(models_to_test, sample_size, contexts[0])
+    results_store.compact()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+import os
+import shutil
+import threading
+
+import pytest
+import yaml
+
+from utils.fake_ollama import FakeBackendConfig, create_server
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def start_fake_server():
+    """Starts fake Ollama servers on free ports, stopped after the test."""
+    servers = []
+
+    def start(pages=None, **config) -> str:
+        server = create_server("127.0.0.1", 0, FakeBackendConfig(**config), pages)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fake_server(start_fake_server):
+    """A fake Ollama server that never sleeps or fails."""
+    return start_fake_server(time_scale=0, invalid_json_probability=0)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A working directory with the repository's config and prompts."""
+    shutil.copytree(os.path.join(REPO_DIR, "messages"), tmp_path / "messages")
+    shutil.copy(os.path.join(REPO_DIR, "config.yaml"), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def update_config(workdir):
+    """Overrides top-level settings of the working directory's config.yaml."""
+
+    def update(**overrides) -> dict:
+        with open("config.yaml") as file:
+            config = yaml.safe_load(file)
+        config.update(overrides)
+        with open("config.yaml", "w") as file:
+            yaml.safe_dump(config, file, sort_keys=False)
+        return config
+
+    return update
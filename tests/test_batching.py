@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from generate_model_metrics import METRIC_COLUMNS, compute_article_metrics
+from utils.analysis_utils import analyze_content, hash_url
+from utils.backends import GenerationResult, InferenceBackend
+from utils.file_utils import get_file_content
+from utils.results_store import result_to_row, rows_to_frame
+from utils.validation_utils import validate_json_array
+
+ANSWER = {"reasoning": "Earnings beat estimates.", "sentiment": 0.5, "confidence": 0.9}
+INVALID = {"reasoning": "", "sentiment": 2.5, "confidence": 0.9}
+
+
+class ScriptedBackend(InferenceBackend):
+    """Answers every batch with an invalid second element."""
+
+    name = "scripted"
+
+    def generate(self, prompt, prefix_state=None, early_stop=True, json_schema=None):
+        article_count = prompt.count("<article id=")
+        if article_count > 1:
+            answers = [ANSWER] * article_count
+            answers[1] = INVALID
+            counters = {"prompt_eval_count": 300, "eval_count": 30}
+            return GenerationResult(json.dumps(answers), counters)
+        counters = {"prompt_eval_count": 100, "eval_count": 10}
+        return GenerationResult(json.dumps(ANSWER), counters)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        json.dumps([ANSWER, ANSWER]),
+        json.dumps([ANSWER, ANSWER, ANSWER]),
+    ],
+)
+def test_validate_json_array_keeps_expected_length(text):
+    assert validate_json_array(text, 2) == [(True, ANSWER), (True, ANSWER)]
+
+
+def test_validate_json_array_marks_invalid_and_missing_elements():
+    text = json.dumps([ANSWER, INVALID])
+    assert validate_json_array(text, 3) == [(True, ANSWER), (False, {}), (False, {})]
+
+
+@pytest.mark.parametrize(
+    "text", [json.dumps(ANSWER), "Sure! Here you go: [", "", json.dumps("[]")]
+)
+def test_validate_json_array_rejects_non_arrays(text):
+    assert validate_json_array(text, 2) == [(False, {}), (False, {})]
+
+
+def test_batch_fallback_results_are_marked(workdir):
+    urls = [f"https://example.com/news/{k}.html" for k in range(3)]
+    sentiments_map = analyze_content(
+        ScriptedBackend("scripted", 0.2, 4096, 512),
+        get_file_content("sentiment_user_message.txt"),
+        "scripted",
+        0,
+        {url: f"Article {k}" for k, url in enumerate(urls)},
+        "example",
+        [],
+        batch_size=3,
+    )
+    results = [sentiments_map[hash_url(url)] for url in urls]
+    assert all(result["valid"] for result in results)
+    assert [result.get("batch_fallback", False) for result in results] == [
+        False,
+        True,
+        False,
+    ]
+    assert [result.get("batch_size", 1) for result in results] == [3, 1, 3]
+
+    frame = rows_to_frame(
+        [
+            result_to_row(result, model="scripted", key=hash_url(url))
+            for url, result in zip(urls, results)
+        ],
+        METRIC_COLUMNS,
+    )
+    metrics = compute_article_metrics(frame, ["model"]).iloc[0]
+    assert metrics["valid_json_rate"] == 1.0
+    assert metrics["batch_valid_json_rate"] == pytest.approx(2 / 3, abs=0.01)
+    # Batched articles count a third of the batch's counters each; the article
+    # retried alone counts its own call
+    assert metrics["total_tokens"] == 2 * (300 + 30) / 3 + (100 + 10)
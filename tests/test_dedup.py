@@ -0,0 +1,103 @@
+import pytest
+
+from utils.analysis_utils import CALL_FIELDS, fan_out_result
+from utils.dedup import (
+    SHINGLE_SIZE,
+    estimated_jaccard,
+    find_duplicates,
+    minhash_signature,
+    normalize_text,
+)
+
+
+def article(first_word: int, length: int = 200) -> str:
+    return " ".join(f"word{k}" for k in range(first_word, first_word + length))
+
+
+def edited(text: str, position: int) -> str:
+    words = text.split()
+    words[position] = "edited"
+    return " ".join(words)
+
+
+def shingle_jaccard(text_a: str, text_b: str) -> float:
+    def shingles(text):
+        words = normalize_text(text)
+        return {
+            tuple(words[k : k + SHINGLE_SIZE])
+            for k in range(len(words) - SHINGLE_SIZE + 1)
+        }
+
+    a, b = shingles(text_a), shingles(text_b)
+    return len(a & b) / len(a | b)
+
+
+def test_identical_text_after_normalization_is_clustered():
+    content_map = {
+        "a": "Shares ROSE, sharply!",
+        "b": "other story entirely",
+        "c": "shares rose sharply",
+    }
+    assert find_duplicates(content_map, threshold=1.0) == {"a": ["c"]}
+
+
+def test_near_duplicates_are_clustered_with_the_first_url():
+    text = article(0)
+    content_map = {
+        "syndicated": edited(text, 150),
+        "original": text,
+        "unrelated": article(1000),
+        "copy": edited(text, 20),
+    }
+    assert find_duplicates(content_map, threshold=0.85) == {
+        "syndicated": ["original", "copy"]
+    }
+
+
+def test_threshold_one_only_clusters_exact_copies():
+    text = article(0)
+    content_map = {"a": text, "b": edited(text, 100)}
+    assert find_duplicates(content_map, threshold=1.0) == {}
+
+
+def test_overlapping_articles_below_the_threshold_stay_apart():
+    # Half the shingles are shared: a Jaccard similarity of about one third
+    content_map = {"a": article(0), "b": article(100)}
+    assert find_duplicates(content_map, threshold=0.85) == {}
+
+
+@pytest.mark.parametrize("offset", [0, 10, 50, 100])
+def test_minhash_estimates_shingle_jaccard(offset):
+    text_a, text_b = article(0), article(offset)
+    estimate = estimated_jaccard(minhash_signature(text_a), minhash_signature(text_b))
+    assert estimate == pytest.approx(shingle_jaccard(text_a, text_b), abs=0.15)
+
+
+def test_fanned_out_duplicates_carry_no_call_measurements():
+    representative = {
+        "valid": True,
+        "sentiment": 0.3,
+        "confidence": 0.9,
+        "reasoning": "Beat estimates.",
+        "url": "https://example.com/a",
+        "time_taken": 1.5,
+        "host": "http://localhost:11434",
+        "batch_size": 2,
+        "eval_count": 40,
+        "eval_duration": 1_000_000_000,
+        "time_to_first_token": 0.2,
+    }
+    news = [{"link": "https://example.com/b", "published": "Mon, 01 Jan 2024"}]
+    duplicate = fan_out_result(
+        representative, "https://example.com/b", "https://example.com/a", news
+    )
+    assert not set(CALL_FIELDS) & set(duplicate)
+    assert duplicate == {
+        "valid": True,
+        "sentiment": 0.3,
+        "confidence": 0.9,
+        "reasoning": "Beat estimates.",
+        "url": "https://example.com/b",
+        "published": "Mon, 01 Jan 2024",
+        "duplicate_of": "https://example.com/a",
+    }
@@ -0,0 +1,56 @@
+import generate_model_sentiments
+from utils import fake_ollama
+from utils.distributed import WorkQueue, WorkUnit
+from utils.results_store import ResultsStore
+
+MODELS = ["llama3:8b-instruct-q4_K_M", "llama3:8b-instruct-fp16"]
+# Nothing listens on port 1, so every request fails to connect
+DEAD_HOST = "http://127.0.0.1:1"
+
+
+def test_hosts_keep_their_model_and_spread_out_otherwise():
+    queue = WorkQueue([WorkUnit(model, i) for model in ["a", "b"] for i in range(2)])
+    first = queue.take("host-1", None)
+    # host-2 starts on the model host-1 is not running
+    assert queue.take("host-2", None) == WorkUnit("b", 0)
+    queue.finish(first)
+    assert queue.take("host-1", "a") == WorkUnit("a", 1)
+
+
+def test_requeued_units_go_to_other_hosts_first():
+    queue = WorkQueue([WorkUnit("a", 0), WorkUnit("a", 1)])
+    unit = queue.take("host-1", None)
+    queue.requeue(unit, "host-1")
+    assert queue.take("host-1", "a") == WorkUnit("a", 1)
+    assert queue.take("host-2", None) == WorkUnit(
+        "a", 0, attempts=1, failed_hosts=("host-1",)
+    )
+
+
+def test_units_of_a_failing_host_finish_on_the_others(
+    start_fake_server, workdir, update_config, caplog
+):
+    hosts = [
+        start_fake_server(time_scale=0, invalid_json_probability=0) for _ in range(2)
+    ]
+    fake_ollama.main(["--write-fixture", "fixtures/offline.json", "--articles", "3"])
+    config = update_config(
+        models_to_test=MODELS,
+        sample_size=3,
+        offline_fixture="fixtures/offline.json",
+        distributed={
+            "hosts": [DEAD_HOST, *hosts],
+            "max_attempts": 3,
+            "max_host_failures": 1,
+            "retry_delay": 0,
+        },
+    )
+
+    generate_model_sentiments.main()
+
+    results = ResultsStore(config["results_store"]["directory"]).read()
+    assert len(results) == len(MODELS) * 3 * 3
+    assert results["valid"].all()
+    assert set(results["host"]) <= set(hosts)
+    assert f"Host {DEAD_HOST} failed" in caplog.text
+    assert f"Host {DEAD_HOST} keeps failing; retiring it" in caplog.text
@@ -0,0 +1,74 @@
+import json
+
+import pandas as pd
+import pytest
+
+import generate_model_metrics
+import generate_model_sentiments
+from utils import fake_ollama
+from utils.backends import BACKEND_METRIC_KEYS, create_backend
+from utils.results_store import ResultsStore
+
+MODEL = "llama3:8b-instruct-q4_K_M"
+
+
+def completions(request: dict, repeats: int) -> list:
+    backend = fake_ollama.FakeOllama(fake_ollama.FakeBackendConfig(time_scale=0))
+    return [backend.complete(request)[0] for _ in range(repeats)]
+
+
+def test_completions_are_reproducible():
+    request = {"model": MODEL, "prompt": "<article>Shares rallied.</article>"}
+    first_run = completions(request, 5)
+    assert completions(request, 5) == first_run
+    # Repeated iterations of the same article still vary
+    assert len(set(first_run)) > 1
+
+
+def test_generate_reports_counters(fake_server):
+    llm = create_backend({"base_url": fake_server}, MODEL, 0.2, 4096, 512)
+    result = llm.generate("<article>Shares rallied.</article>")
+    assert set(BACKEND_METRIC_KEYS) <= set(result.metrics)
+    assert result.metrics["prompt_eval_count"] == fake_ollama.count_tokens(
+        "<article>Shares rallied.</article>"
+    )
+    assert result.metrics["eval_count"] == fake_ollama.count_tokens(result.text)
+
+
+def test_end_to_end_run(fake_server, workdir, update_config):
+    fake_ollama.main(["--write-fixture", "fixtures/offline.json", "--articles", "4"])
+    config = update_config(
+        models_to_test=[MODEL],
+        sample_size=2,
+        offline_fixture="fixtures/offline.json",
+    )
+    for backend_config in config["backends"].values():
+        backend_config["base_url"] = fake_server
+    update_config(backends=config["backends"])
+
+    generate_model_sentiments.main()
+
+    results = ResultsStore(config["results_store"]["directory"]).read()
+    assert len(results) == 4 * 2
+    assert results["valid"].all()
+    assert set(results["iteration"]) == {0, 1}
+    sentiment_file = workdir / "sentiments" / MODEL.replace(":", "_") / "MSFT_0.json"
+    assert len(json.loads(sentiment_file.read_text())["sentiments"]) == 4
+
+    generate_model_metrics.main(["--force"])
+    metrics = pd.read_csv(workdir / "reports" / "model_metrics.csv")
+    assert len(metrics) == 4
+    assert (metrics["Sample Count"] == 2).all()
+    assert (metrics["Valid JSON Rate"] == 1.0).all()
+    assert (metrics["Total Tokens"] > 0).all()
+
+
+def test_prefix_savings_count_only_the_system_prompt(fake_server):
+    llm = create_backend({"base_url": fake_server}, MODEL, 0.2, 4096, 512)
+    llm.system = "You are a financial analyst. " * 10
+    prefix_state = llm.prime_prefix("Reply with OK. " * 50)
+
+    assert 0 < prefix_state.system_tokens < prefix_state.prefix_tokens
+    assert prefix_state.estimate_saved_seconds() == pytest.approx(
+        prefix_state.system_tokens * prefix_state.seconds_per_token
+    )
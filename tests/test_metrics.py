@@ -0,0 +1,77 @@
+import json
+
+import pandas as pd
+
+import generate_model_metrics
+from utils.results_store import ResultsStore, result_to_row
+
+STORED_MODEL = "llama3:8b-instruct-q4_K_M"
+NEW_MODEL = "mistral:7b-instruct"
+OTHER_MODEL = "phi3:mini"
+
+
+def store_results(directory: str, model: str, keys: list) -> None:
+    ResultsStore(directory).append(
+        [
+            result_to_row(
+                {"valid": True, "sentiment": 0.5, "confidence": 0.8},
+                run_id="run",
+                created=1.0,
+                run_key="run-key",
+                ticker="MSFT",
+                model=model.replace(":", "_"),
+                iteration=iteration,
+                key=key,
+                time_taken=1.0 + iteration,
+            )
+            for key in keys
+            for iteration in range(2)
+        ]
+    )
+
+
+def test_model_without_rows_has_no_metrics(tmp_path):
+    store_results(str(tmp_path), STORED_MODEL, ["a"])
+
+    model_result = generate_model_metrics.load_model_metrics(str(tmp_path), NEW_MODEL)
+    assert model_result["rows"] == 0
+    assert model_result["model_metrics"].empty
+    assert model_result["hosts"].empty
+
+
+def test_report_keeps_config_order_and_skips_models_without_rows(
+    workdir, update_config
+):
+    store_results("results", STORED_MODEL, ["a", "b"])
+    store_results("results", OTHER_MODEL, ["a"])
+    update_config(models_to_test=[OTHER_MODEL, NEW_MODEL, STORED_MODEL])
+
+    generate_model_metrics.main(["--force"])
+
+    metrics = pd.read_csv(workdir / "reports" / "model_metrics.csv")
+    assert list(metrics["Model Name"]) == [
+        OTHER_MODEL.replace(":", "_"),
+        *[STORED_MODEL.replace(":", "_")] * 2,
+    ]
+    assert (metrics["P50 Time (s)"] == 1.5).all()
+
+
+def test_report_imports_json_files_into_empty_store(workdir, update_config):
+    update_config(models_to_test=[STORED_MODEL])
+    model_folder = workdir / "sentiments" / STORED_MODEL.replace(":", "_")
+    model_folder.mkdir(parents=True)
+    for iteration in range(2):
+        sentiments = {
+            key: {"valid": True, "sentiment": 0.5, "time_taken": 1.0}
+            for key in ["a", "b", "c"]
+        }
+        (model_folder / f"MSFT_{iteration}.json").write_text(
+            json.dumps({"sentiments": sentiments})
+        )
+
+    generate_model_metrics.main(["--force"])
+
+    assert len(ResultsStore("results").read()) == 3 * 2
+    metrics = pd.read_csv(workdir / "reports" / "model_metrics.csv")
+    assert list(metrics["Article Key"]) == ["a", "b", "c"]
+    assert (metrics["Sample Count"] == 2).all()
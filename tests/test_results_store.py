@@ -0,0 +1,118 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from utils.results_store import (
+    COLUMNS,
+    EXTRA_COLUMN,
+    ResultsStore,
+    manifest_file,
+    result_to_row,
+    row_to_result,
+    rows_to_frame,
+)
+
+pytest.importorskip("pyarrow")
+
+
+def row(model: str, key: str, created: float, **result) -> dict:
+    return result_to_row(
+        {"valid": True, "sentiment": 0.1, **result},
+        run_id="run",
+        created=created,
+        run_key="run-key",
+        ticker="MSFT",
+        model=model,
+        iteration=0,
+        key=key,
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultsStore(str(tmp_path / "results"))
+
+
+def test_results_round_trip_with_extra_fields():
+    result = {"valid": True, "sentiment": 0.5, "stopped_early": True, "tags": ["a"]}
+    stored = result_to_row(result, model="m")
+    assert json.loads(stored[EXTRA_COLUMN]) == {"stopped_early": True, "tags": ["a"]}
+    assert row_to_result(stored) == result
+
+
+def test_latest_row_per_key_wins(store):
+    store.append([row("m", "a", 1.0, sentiment=0.1), row("m", "b", 1.0)])
+    store.append([row("m", "a", 2.0, sentiment=0.9)])
+    store.compact()
+    # A later run's row for the same key supersedes the compacted one
+    store.append([row("m", "a", 3.0, sentiment=-0.5)])
+
+    latest = store.read(["sentiment"]).set_index("key")["sentiment"]
+    assert latest.to_dict() == {"a": -0.5, "b": 0.1}
+    assert len(store.read(["sentiment"], latest=False)) == 4
+
+
+def test_rows_of_other_tickers_and_iterations_are_kept(store):
+    store.append([row("m", "a", 1.0), {**row("m", "a", 2.0), "ticker": "AAPL"}])
+    store.append([{**row("m", "a", 3.0), "iteration": 1}])
+    assert len(store.read()) == 3
+
+
+def test_compact_merges_segments_and_their_manifests(store):
+    store.append([row("m1", "a", 1.0), row("m2", "a", 1.0)])
+    segment_file = store.segment_file
+    with open(manifest_file(segment_file)) as file:
+        assert json.load(file) == ["m1", "m2"]
+
+    assert store.compact() == 2
+    assert store.segment_files() == []
+    assert not os.path.exists(manifest_file(segment_file))
+    assert sorted(store.read(["model"])["model"]) == ["m1", "m2"]
+    assert store.table_digests().keys() == {"m1", "m2"}
+
+
+def test_model_prefix_reads_only_that_models_rows(store):
+    store.append([row("m1", "a", 1.0), row("m1-batch2", "a", 1.0)])
+    store.append([row("m2", "a", 1.0)])
+    store.compact()
+    store.append([row("m1", "b", 2.0), row("m2", "b", 2.0)])
+    frame = store.read(["model"], model_prefix="m1")
+    assert sorted(frame["model"]) == ["m1", "m1", "m1-batch2"]
+
+
+def test_fingerprints_change_only_for_the_appended_model(store):
+    store.append([row("m1", "a", 1.0), row("m2", "a", 1.0)])
+    store.compact()
+    before = store.fingerprints(["m1", "m2"])
+
+    store.append([row("m2", "b", 2.0)])
+    after = store.fingerprints(["m1", "m2"])
+    assert after["m1"] == before["m1"]
+    assert after["m2"] != before["m2"]
+
+    # Segments written before manifests are scanned instead
+    os.remove(manifest_file(store.segment_file))
+    assert store.fingerprints(["m1", "m2"]) == after
+
+
+def test_tables_without_newer_columns_are_upgraded(store):
+    legacy = row("m", "a", 1.0)
+    legacy[EXTRA_COLUMN] = json.dumps({"batch_size": 4, "batch_fallback": True})
+    frame = rows_to_frame([legacy], list(COLUMNS)).drop(
+        columns=["batch_size", "batch_fallback"]
+    )
+    os.makedirs(store.directory)
+    frame.to_parquet(store.table_file, index=False)
+
+    stored = store.read(["batch_size", "batch_fallback"]).iloc[0]
+    assert pd.isna(stored["batch_size"]) and pd.isna(stored["batch_fallback"])
+
+    store.append([row("m", "b", 2.0)])
+    store.compact()
+    upgraded = store.read([EXTRA_COLUMN, "batch_size", "batch_fallback"])
+    upgraded = upgraded.set_index("key")
+    assert upgraded.loc["a", "batch_size"] == 4
+    assert upgraded.loc["a", "batch_fallback"]
+    assert pd.isna(upgraded.loc["a", EXTRA_COLUMN])
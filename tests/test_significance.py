@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from generate_model_comparison_report import add_significance
+from utils.significance import bootstrap_mean_difference, permutation_pvalues
+
+RESAMPLES = 20000
+
+
+def samples(*values) -> list:
+    return [np.array(value, dtype=float) for value in values]
+
+
+def test_permutation_pvalue_matches_exact_enumeration():
+    # 2 of the 20 ways to split the pooled values differ by at least 3
+    first, second = samples([1, 2, 3]), samples([4, 5, 6])
+    pvalues = permutation_pvalues(first, second, RESAMPLES, np.random.default_rng(0))
+    assert pvalues[0] == pytest.approx(2 / 20, abs=0.01)
+
+
+def test_identical_samples_are_not_significant():
+    pvalues = permutation_pvalues(
+        samples([0.1, 0.2, 0.3]),
+        samples([0.3, 0.1, 0.2]),
+        RESAMPLES,
+        np.random.default_rng(0),
+    )
+    assert pvalues[0] == pytest.approx(1.0)
+
+
+def test_tests_of_different_sizes_are_resampled_independently():
+    first = samples([1, 2, 3], [0.5, 0.4, 0.6, 0.5, 0.45], [1, 2, 3])
+    second = samples([4, 5, 6], [0.5, 0.55, 0.4, 0.6], [1, 2, 3])
+    pvalues = permutation_pvalues(first, second, RESAMPLES, np.random.default_rng(1))
+    alone = permutation_pvalues(
+        first[1:2], second[1:2], RESAMPLES, np.random.default_rng(2)
+    )
+    assert pvalues[0] == pytest.approx(0.1, abs=0.01)
+    assert pvalues[1] == pytest.approx(alone[0], abs=0.02)
+    assert pvalues[2] == pytest.approx(1.0)
+
+
+def test_bootstrap_interval_of_constant_samples_is_the_difference():
+    difference, low, high = bootstrap_mean_difference(
+        samples([0.2, 0.2]), samples([0.5, 0.5, 0.5]), 1000
+    )
+    assert difference[0] == pytest.approx(0.3)
+    assert low[0] == pytest.approx(0.3)
+    assert high[0] == pytest.approx(0.3)
+
+
+def test_bootstrap_interval_matches_the_normal_approximation():
+    rng = np.random.default_rng(0)
+    first, second = rng.normal(0, 1, 400), rng.normal(0.5, 1, 400)
+    difference, low, high = bootstrap_mean_difference(
+        [first], [second], RESAMPLES, 0.95, np.random.default_rng(1)
+    )
+    standard_error = np.sqrt(first.var() / 400 + second.var() / 400)
+    assert difference[0] == pytest.approx(second.mean() - first.mean())
+    assert low[0] == pytest.approx(difference[0] - 1.96 * standard_error, abs=0.02)
+    assert high[0] == pytest.approx(difference[0] + 1.96 * standard_error, abs=0.02)
+
+
+def test_tests_with_an_empty_side_are_nan():
+    first, second = samples([], [1, 2]), samples([1, 2], [])
+    difference, low, high = bootstrap_mean_difference(first, second, 100)
+    assert np.isnan(difference).all() and np.isnan(low).all() and np.isnan(high).all()
+    assert np.isnan(permutation_pvalues(first, second, 100)).all()
+
+
+def test_reported_drift_is_the_tested_difference():
+    comparison_df = pd.DataFrame(
+        {
+            "Article Key": ["k1", "k2"],
+            "Model 1": ["a", "a"],
+            "Model 2": ["b", "b"],
+            "Sentiment Drift": [0.123456, 0.654321],
+        }
+    )
+    raw = pd.DataFrame(
+        {
+            "Model Name": ["a", "a", "b", "b"],
+            "Article Key": ["k1"] * 4,
+            "sentiment": [0.1, 0.2, 0.4, 0.6],
+            "time_taken": [1.0, 2.0, 1.5, 2.5],
+        }
+    )
+    report = add_significance(comparison_df, raw, {"resamples": 100})
+    # k1 is tested on the raw values; k2 has none and keeps the report's value
+    assert report["Sentiment Drift"].tolist() == [0.35, 0.654]
+    assert report["Time Taken Difference"].tolist()[0] == 0.5
+    assert np.isnan(report["Sentiment Drift p-value"][1])
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from utils.backends import create_backend
+from utils.validation_utils import JsonStreamTracker, validate_json
+
+ANSWER = json.dumps(
+    {
+        "reasoning": 'Guidance beat {"estimates"} [sic]',
+        "sentiment": 0.4,
+        "confidence": 0.8,
+    }
+)
+CHATTER = "\n\nI hope this helps! {Let me know} if you need more."
+
+
+def feed_chunks(tracker: JsonStreamTracker, text: str, size: int) -> int:
+    """Feeds text in chunks; returns how many were fed before the stop."""
+    for fed, start in enumerate(range(0, len(text), size), start=1):
+        if tracker.feed(text[start : start + size]):
+            return fed
+    return 0
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_tracker_stops_when_the_answer_closes(size):
+    tracker = JsonStreamTracker()
+    fed = feed_chunks(tracker, "Sure! " + ANSWER + CHATTER, size)
+    assert fed == -(-len("Sure! " + ANSWER) // size)
+    assert tracker.text == "Sure! " + ANSWER
+    assert tracker.complete
+
+
+def test_tracker_follows_arrays():
+    tracker = JsonStreamTracker()
+    assert feed_chunks(tracker, f"[{ANSWER}, {ANSWER}]{CHATTER}", 5)
+    assert json.loads(tracker.text) == [json.loads(ANSWER)] * 2
+
+
+def test_tracker_ignores_escaped_quotes_in_strings():
+    tracker = JsonStreamTracker()
+    assert not tracker.feed('{"reasoning": "a \\"}\\" b"')
+    assert tracker.feed(', "sentiment": 0.1}')
+    assert tracker.text == '{"reasoning": "a \\"}\\" b", "sentiment": 0.1}'
+
+
+def test_tracker_waits_for_an_unfinished_answer():
+    tracker = JsonStreamTracker()
+    assert not feed_chunks(tracker, ANSWER[:-1], 4)
+    assert not tracker.complete
+
+
+def test_backend_stops_streaming_at_the_json_answer(start_fake_server):
+    base_url = start_fake_server(
+        time_scale=0, invalid_json_probability=0, trailing_chatter_probability=1
+    )
+    llm = create_backend(
+        {"base_url": base_url},
+        "llama3:8b-instruct-q4_K_M",
+        0.2,
+        4096,
+        512,
+        stream_early_stop=True,
+    )
+    result = llm.generate("<article>Shares rallied.</article>")
+    assert validate_json(result.text)[0]
+    assert result.metrics["stopped_early"]
+    assert result.metrics["time_to_json"] >= result.metrics["time_to_first_token"]
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from utils import web_scraper
+from utils.cache import configure_cache
+
+PAGES = {
+    f"/news/{k}.html": f"<html><body><p>Example Corp story {k}.</p></body></html>"
+    for k in range(6)
+}
+
+
+@pytest.fixture
+def page_cache(tmp_path):
+    configure_cache({"directory": str(tmp_path / "cache")})
+    yield
+    configure_cache({})
+
+
+def test_pages_come_back_in_link_order(start_fake_server, page_cache):
+    base_url = start_fake_server(pages=PAGES, time_scale=0.01)
+    links = [f"{base_url}{path}" for path in reversed(PAGES)]
+    links.insert(2, f"{base_url}/news/missing.html")
+
+    pages = web_scraper.fetch_pages(links, max_workers=4, per_host_limit=4)
+
+    expected = [PAGES[path] for path in reversed(PAGES)]
+    expected.insert(2, "")
+    assert pages == expected
+
+
+def test_fetched_pages_are_cached(start_fake_server, page_cache, caplog):
+    base_url = start_fake_server(pages=PAGES, time_scale=0)
+    links = [f"{base_url}{path}" for path in PAGES]
+    first = web_scraper.fetch_pages(links)
+    caplog.clear()
+    assert web_scraper.fetch_pages(links) == first
+    assert caplog.text.count("Cache hit") == len(links)
+    assert "Cache miss" not in caplog.text
+
+
+def test_transient_errors_are_retried(start_fake_server, page_cache):
+    base_url = start_fake_server(pages=PAGES, time_scale=0, page_error_probability=0.5)
+    web_scraper.configure_session(pool_size=4, retries=20, backoff_factor=0)
+    try:
+        pages = web_scraper.fetch_pages([f"{base_url}{path}" for path in PAGES])
+    finally:
+        web_scraper.configure_session()
+    assert pages == list(PAGES.values())
+
+
+def test_host_limiter_caps_requests_per_host():
+    limiter = web_scraper.HostLimiter(per_host=2)
+    lock = threading.Lock()
+    in_flight = {"a.example": 0, "b.example": 0}
+    peaks = {"a.example": 0, "b.example": 0}
+    peak_total = [0]
+
+    def request(host: str) -> None:
+        with limiter.limit(f"https://{host}/page"):
+            with lock:
+                in_flight[host] += 1
+                peaks[host] = max(peaks[host], in_flight[host])
+                peak_total[0] = max(peak_total[0], sum(in_flight.values()))
+            time.sleep(0.02)
+            with lock:
+                in_flight[host] -= 1
+
+    threads = [
+        threading.Thread(target=request, args=(host,))
+        for host in ["a.example", "b.example"] * 5
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peaks == {"a.example": 2, "b.example": 2}
+    # Requests to different hosts do not wait for each other
+    assert peak_total[0] == 4
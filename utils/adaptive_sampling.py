@@ -0,0 +1,88 @@
+import math
+import statistics
+import threading
+from typing import Dict, Iterable, List
+
+from scipy import stats
+
+from utils.context import logger
+from utils.validation_utils import parse_json_numeric_value
+
+
+def confidence_interval_width(samples: List[float], confidence: float) -> float:
+    """Width of the Student t confidence interval of the samples' mean."""
+    if len(samples) < 2:
+        return math.inf
+    t_value = stats.t.ppf((1 + confidence) / 2, len(samples) - 1)
+    return 2 * t_value * statistics.stdev(samples) / math.sqrt(len(samples))
+
+
+class SampleTracker:
+    """
+    Collects one model's per-article sentiments across iterations and stops
+    sampling an article once the interval around its mean sentiment is narrow
+    enough. Articles that never return valid JSON run to the last iteration.
+    Thread-safe, so hosts running iterations of the same model can share it.
+    """
+
+    def __init__(
+        self,
+        article_keys: Iterable[str],
+        min_iterations: int,
+        ci_width: float,
+        confidence: float = 0.95,
+    ):
+        self.min_iterations = max(2, min_iterations)
+        self.ci_width = ci_width
+        self.confidence = confidence
+        self.samples: Dict[str, List[float]] = {key: [] for key in article_keys}
+        self.draws: Dict[str, int] = dict.fromkeys(self.samples, 0)
+        self.converged: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def add(self, sentiments_map: Dict[str, Dict]) -> bool:
+        """Adds an iteration's results; returns True when the last article converges."""
+        with self.lock:
+            was_done = len(self.converged) == len(self.samples)
+            for key, sentiment_json in sentiments_map.items():
+                self.add_sample(key, sentiment_json)
+            return not was_done and len(self.converged) == len(self.samples)
+
+    def add_sample(self, key: str, sentiment_json: Dict) -> None:
+        if key not in self.samples or key in self.converged:
+            return
+        self.draws[key] += 1
+        value = (
+            parse_json_numeric_value(sentiment_json, "sentiment")
+            if sentiment_json.get("valid")
+            else None
+        )
+        if value is not None:
+            self.samples[key].append(value)
+        if self.draws[key] >= self.min_iterations:
+            width = confidence_interval_width(self.samples[key], self.confidence)
+            if width <= self.ci_width:
+                self.converged[key] = width
+
+    @property
+    def active_keys(self) -> List[str]:
+        with self.lock:
+            return [key for key in self.samples if key not in self.converged]
+
+    @property
+    def done(self) -> bool:
+        return not self.active_keys
+
+    @property
+    def total_draws(self) -> int:
+        return sum(self.draws.values())
+
+    def log_summary(self, model_name: str, max_iterations: int) -> None:
+        budget = len(self.samples) * max_iterations
+        if not budget:
+            return
+        logger.info(
+            f"Adaptive sampling for {model_name}: {len(self.converged)}/"
+            f"{len(self.samples)} article(s) converged, {self.total_draws}/{budget} "
+            f"samples used ({1 - self.total_draws / budget:.0%} saved)"
+        )
@@ -1,20 +1,43 @@
 import hashlib
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta
-from typing import Any, Dict, List
-
-from langchain_community.llms import Ollama
-
+from statistics import mean
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.adaptive_sampling import SampleTracker
+from utils.backends import (
+    BACKEND_METRIC_KEYS,
+    NANOSECONDS,
+    BackendUnavailableError,
+    InferenceBackend,
+    create_backend,
+)
+from utils.checkpoint import (
+    CheckpointWriter,
+    compute_run_key,
+    get_checkpoint_file,
+    get_sentiment_file,
+    load_completed_results,
+)
 from utils.context import AnalysisContext, logger
 from utils.error_decorator import handle_errors
 from utils.file_utils import (
     get_file_content,
+    model_folder_name,
     save_json_to_file,
 )
+from utils.model_info import model_family
+from utils.prefix_cache import PrefixState, get_primed_prefix, log_prefix_savings
+from utils.scheduler import iteration_order, log_schedule, plan_schedule
+from utils.token_budget import count_tokens, log_prompt_overflow
 from utils.validation_utils import (
     parse_json_numeric_value,
+    sentiment_json_schema,
     validate_json,
+    validate_json_array,
 )
 
 COMMON_SUFFIXES: List[str] = [
@@ -28,7 +51,18 @@ COMMON_SUFFIXES: List[str] = [
     "company",
 ]
 
-DUMMY_PROMPT = "Hello"
+# Measurements of the call that produced a result, which a fanned-out
+# duplicate did not make
+CALL_FIELDS: List[str] = [
+    "time_taken",
+    "host",
+    "batch_size",
+    *BACKEND_METRIC_KEYS,
+    "stopped_early",
+    "streamed_chunks",
+    "time_to_first_token",
+    "time_to_json",
+]
 
 
 def hash_url(text: str) -> str:
@@ -57,29 +91,214 @@ def filter_recent_news(
     ][:max_news_items]
 
 
+@dataclass
+class LoadedModel:
+    model_name: str
+    llm: InferenceBackend
+    analyze_prompt: str
+    load_time: float
+    prefix_state: Optional[PrefixState] = None
+    sample_tracker: Optional[SampleTracker] = None
+    prompt_tokens: Dict[str, int] = field(default_factory=dict)
+
+
 def test_models(
     models_to_test: List[str],
     sample_size: int,
     context: AnalysisContext,
 ) -> None:
-    for model_name in models_to_test:
-        logger.info(f"Testing model: {model_name}")
+    schedule = plan_schedule(
+        models_to_test, context.ram_budget_gb, context.max_loaded_models
+    )
+    log_schedule(schedule)
+
+    for group in schedule:
+        loaded_models = [load_model(name, context) for name in group.models]
+
+        if context.interleave_iterations:
+            for i in range(sample_size):
+                for loaded in iteration_order(loaded_models, i):
+                    run_iteration(loaded, i, context)
+        else:
+            for loaded in loaded_models:
+                logger.info(f"Testing model: {loaded.model_name}")
+                for i in range(sample_size):
+                    run_iteration(loaded, i, context)
+
+        for loaded in loaded_models:
+            if loaded.sample_tracker:
+                loaded.sample_tracker.log_summary(loaded.model_name, sample_size)
+            unload_model(loaded.llm)
+        logger.info("")
 
-        llm = initialize_llm(
-            model_name,
-            context.default_temperature,
-            context.context_window_size,
-            context.num_tokens_to_predict,
+
+def test_universe(
+    models_to_test: List[str],
+    sample_size: int,
+    contexts: List[AnalysisContext],
+) -> None:
+    """
+    Runs every model over each ticker's articles. A model is loaded once for
+    the whole universe rather than once per ticker.
+    """
+    schedule = plan_schedule(
+        models_to_test, contexts[0].ram_budget_gb, contexts[0].max_loaded_models
+    )
+    log_schedule(schedule)
+
+    for group in schedule:
+        loaded_models = [load_model(name, contexts[0]) for name in group.models]
+
+        for loaded in loaded_models:
+            logger.info(f"Testing model: {loaded.model_name}")
+            for context in contexts:
+                logger.info(f"Ticker: {context.ticker_symbol}")
+                bound = bind_context(loaded, context)
+                for i in range(sample_size):
+                    run_iteration(bound, i, context)
+                if bound.sample_tracker:
+                    bound.sample_tracker.log_summary(
+                        f"{loaded.model_name} ({context.ticker_symbol})", sample_size
+                    )
+
+        for loaded in loaded_models:
+            unload_model(loaded.llm)
+        logger.info("")
+
+
+def run_iteration(loaded: LoadedModel, iteration: int, context: AnalysisContext):
+    tracker = loaded.sample_tracker
+    if tracker:
+        if tracker.done:
+            return
+        # Only articles whose mean sentiment has not converged are sampled
+        active_keys = set(tracker.active_keys)
+        context = replace(
+            context,
+            content_map={
+                url: content
+                for url, content in context.content_map.items()
+                if hash_url(url) in active_keys
+            },
+        )
+    sentiments_map = test_model(
+        loaded.model_name,
+        iteration,
+        context,
+        loaded.analyze_prompt,
+        loaded.llm,
+        loaded.prefix_state,
+        loaded.prompt_tokens,
+    )
+    if tracker and tracker.add(sentiments_map):
+        logger.info(
+            f"All articles converged for {loaded.model_name} "
+            f"after {iteration + 1} iteration(s)"
         )
 
-        # Pre-warm the model
-        pre_warm_model(llm)
 
-        analyze_prompt = prepare_analyze_prompt(llm, model_name)
+def load_model(
+    model_name: str,
+    context: AnalysisContext,
+    base_url: Optional[str] = None,
+    sample_tracker: Optional[SampleTracker] = None,
+) -> LoadedModel:
+    host_note = f" on {base_url}" if base_url else ""
+    logger.info(f"Loading model: {model_name}{host_note}")
+
+    backend_config = context.get_backend_config(model_name)
+    if base_url:
+        backend_config = {**backend_config, "base_url": base_url}
+    llm = initialize_llm(
+        model_name,
+        context.default_temperature,
+        context.context_window_size,
+        context.num_tokens_to_predict,
+        context.keep_alive,
+        backend_config,
+        context.stream_early_stop,
+    )
+
+    # Pre-warm the model; the first call includes loading it into memory
+    start_time = time.time()
+    pre_warm_model(llm)
+    load_time = time.time() - start_time
+    logger.info(f"Load overhead for {model_name} ({llm.name}): {load_time:.2f}s")
+
+    analyze_prompt = prepare_analyze_prompt(
+        llm, model_name, prime=not context.prefix_reuse
+    )
+    prefix_state = None
+    if context.prefix_reuse and analyze_prompt:
+        prefix_state = get_primed_prefix(
+            llm, get_file_content("sentiment_user_first_prompt.txt")
+        )
+    loaded = LoadedModel(model_name, llm, analyze_prompt, load_time, prefix_state)
+    return bind_context(loaded, context, sample_tracker)
 
-        for i in range(sample_size):
-            test_model(model_name, i, context, analyze_prompt, llm)
-        logger.info("")
+
+def bind_context(
+    loaded: LoadedModel,
+    context: AnalysisContext,
+    sample_tracker: Optional[SampleTracker] = None,
+) -> LoadedModel:
+    """The loaded model with prompt token counts and sampling state for context."""
+    prompt_tokens = count_prompt_tokens(
+        loaded.model_name,
+        loaded.llm,
+        loaded.analyze_prompt,
+        context,
+        loaded.prefix_state,
+    )
+    log_prompt_overflow(
+        loaded.model_name,
+        prompt_tokens,
+        context.context_window_size,
+        context.num_tokens_to_predict,
+    )
+    if sample_tracker is None:
+        sample_tracker = create_sample_tracker(context)
+    return replace(loaded, prompt_tokens=prompt_tokens, sample_tracker=sample_tracker)
+
+
+def count_prompt_tokens(
+    model_name: str,
+    llm: InferenceBackend,
+    analyze_prompt: str,
+    context: AnalysisContext,
+    prefix_state: Optional[PrefixState] = None,
+) -> Dict[str, int]:
+    """
+    Tokens each article's prompt occupies in the context window, including the
+    system message, or the whole primed prefix when it is reused.
+    """
+    family = model_family(model_name)
+    is_sentiment_model = "sentiment" in model_name
+    if prefix_state:
+        overhead = prefix_state.prefix_tokens
+    else:
+        overhead = count_tokens(llm.system or "", family)
+    return {
+        url: overhead
+        + count_tokens(
+            format_prompt(
+                is_sentiment_model, analyze_prompt, content, context.company_name
+            ),
+            family,
+        )
+        for url, content in context.content_map.items()
+    }
+
+
+def create_sample_tracker(context: AnalysisContext) -> Optional[SampleTracker]:
+    if not context.adaptive_sampling:
+        return None
+    return SampleTracker(
+        [hash_url(url) for url in context.content_map],
+        context.min_iterations,
+        context.ci_width,
+        context.ci_confidence,
+    )
 
 
 def initialize_llm(
@@ -87,19 +306,30 @@ def initialize_llm(
     default_temperature: float,
     context_window_size: int,
     num_tokens_to_predict: int,
-) -> Ollama:
-    llm = Ollama(
-        model=model_name,
-        temperature=default_temperature,
-        num_ctx=context_window_size,
-        num_predict=num_tokens_to_predict,
+    keep_alive: Optional[str] = None,
+    backend_config: Optional[Dict[str, Any]] = None,
+    stream_early_stop: bool = False,
+) -> InferenceBackend:
+    llm = create_backend(
+        backend_config or {},
+        model_name,
+        default_temperature,
+        context_window_size,
+        num_tokens_to_predict,
+        keep_alive,
+        stream_early_stop,
     )
 
     return llm
 
 
-def pre_warm_model(llm: Ollama, dummy_prompt: str = DUMMY_PROMPT) -> None:
-    llm.invoke(dummy_prompt)
+def pre_warm_model(llm: InferenceBackend) -> None:
+    llm.load()
+
+
+@handle_errors()
+def unload_model(llm: InferenceBackend) -> None:
+    llm.unload()
 
 
 def test_model(
@@ -107,33 +337,215 @@ def test_model(
     iteration: int,
     context: AnalysisContext,
     analyze_prompt: str,
-    llm: Ollama = None,
-):
+    llm: InferenceBackend = None,
+    prefix_state: Optional[PrefixState] = None,
+    prompt_tokens: Optional[Dict[str, int]] = None,
+) -> Dict[str, Dict[str, Any]]:
     start_time = time.time()
 
-    sentiments_map = analyze_content(
+    variant = context.get_run_variant(model_name)
+    results_dir = get_results_dir(context.sentiment_save_folder, model_name, variant)
+    sentiment_file = get_sentiment_file(results_dir, context.ticker_symbol, iteration)
+    options = run_options(context, variant, prefix_state is not None)
+    run_key = compute_run_key(model_name, llm.system, analyze_prompt, options)
+
+    model_folder = model_folder_name(model_name, variant)
+    results_store = context.results_store
+    # Invalid results are inferred again rather than kept as done
+    stored = valid_results(
+        results_store.load_completed(
+            context.ticker_symbol, model_folder, iteration, run_key
+        )
+        if results_store and context.resume
+        else {}
+    )
+    completed = {
+        **stored,
+        **valid_results(
+            load_completed_results(sentiment_file, run_key) if context.resume else {}
+        ),
+    }
+    store = context.article_store
+    if store:
+        # Results of articles that have since left the current feed window
+        completed = {
+            **valid_results(
+                store.load_results(
+                    context.ticker_symbol, model_name, iteration, run_key
+                )
+            ),
+            **completed,
+        }
+    # Duplicates share their representative's result instead of being inferred
+    representatives = context.get_representatives()
+    pending_map = {
+        url: content
+        for url, content in context.content_map.items()
+        if hash_url(url) not in completed and url not in representatives
+    }
+    checkpoint_file = get_checkpoint_file(sentiment_file)
+    if context.resume and not pending_map and not os.path.exists(checkpoint_file):
+        logger.info(f"Iteration: {iteration + 1} already complete for {model_name}")
+        return completed
+    if completed:
+        logger.info(
+            f"Iteration: {iteration + 1}, resuming with "
+            f"{len(context.content_map) - len(pending_map)} article(s) done"
+        )
+
+    checkpoint = CheckpointWriter(sentiment_file, run_key) if context.resume else None
+
+    new_sentiments = analyze_content(
         llm,
         analyze_prompt,
         model_name,
         iteration,
-        context.content_map,
+        pending_map,
         context.company_name,
         context.news_object,
+        context.get_concurrency(model_name),
+        checkpoint.append if checkpoint else None,
+        prefix_state,
+        context.batch_size,
+        context.constrained_decoding,
+        prompt_tokens,
     )
 
+    if store:
+        store.save_results(
+            context.ticker_symbol, model_name, iteration, run_key, new_sentiments
+        )
+
+    # Keep the content_map order regardless of which articles were resumed
+    results = {**completed, **new_sentiments}
+    sentiments_map = {}
+    for url in context.content_map:
+        key = hash_url(url)
+        if url in representatives:
+            source = results.get(hash_url(representatives[url]))
+            if source:
+                sentiments_map[key] = fan_out_result(
+                    source, url, representatives[url], context.news_object
+                )
+        elif key in results:
+            sentiments_map[key] = results[key]
+
     average_sentiment = compute_weighted_average_sentiment(sentiments_map)
 
     end_time = time.time()
 
-    save_results(
-        model_name,
-        context.sentiment_save_folder,
-        context.ticker_symbol,
-        iteration,
-        average_sentiment,
-        end_time - start_time,
-        sentiments_map,
+    log_iteration_timing(iteration, end_time - start_time, sentiments_map)
+    log_stream_timing(iteration, sentiments_map)
+    prompt_eval_saved = log_prefix_savings(iteration, prefix_state, len(new_sentiments))
+
+    if results_store:
+        results_store.append_iteration(
+            context.ticker_symbol,
+            model_folder,
+            iteration,
+            run_key,
+            llm.name,
+            end_time - start_time,
+            {
+                key: sentiment_json
+                for key, sentiment_json in sentiments_map.items()
+                if key not in stored
+            },
+        )
+    if context.json_results or not results_store:
+        save_results(
+            model_name,
+            context.sentiment_save_folder,
+            context.ticker_symbol,
+            iteration,
+            average_sentiment,
+            end_time - start_time,
+            sentiments_map,
+            run_key,
+            prompt_eval_saved,
+            variant,
+            llm.name,
+            llm.base_url,
+        )
+
+    if checkpoint:
+        checkpoint.remove()
+
+    return sentiments_map
+
+
+def run_options(
+    context: AnalysisContext, variant: str, prefix_reuse: bool
+) -> Dict[str, Any]:
+    options = {
+        "temperature": context.default_temperature,
+        "num_ctx": context.context_window_size,
+        "num_predict": context.num_tokens_to_predict,
+    }
+    if prefix_reuse:
+        # The priming turn becomes part of every prompt in this mode
+        options["prefix_reuse"] = True
+    if context.stream_early_stop:
+        # Generation stops at the end of the JSON answer
+        options["stream_early_stop"] = True
+    if context.max_content_tokens:
+        # The articles are trimmed before they reach the prompt
+        options["token_budget"] = {
+            "enabled": True,
+            "max_content_tokens": context.max_content_tokens,
+        }
+    if variant:
+        options["variant"] = variant
+    return options
+
+
+def planned_run_key(model_name: str, context: AnalysisContext) -> str:
+    """The run key test_model will use for the model, without loading it."""
+    if "sentiment" in model_name:
+        system_prompt, analyze_prompt = None, ""
+    else:
+        system_prompt = get_file_content("sentiment_system_message.txt")
+        analyze_prompt = get_file_content("sentiment_user_message.txt")
+    options = run_options(
+        context,
+        context.get_run_variant(model_name),
+        context.prefix_reuse and bool(analyze_prompt),
     )
+    return compute_run_key(model_name, system_prompt, analyze_prompt, options)
+
+
+def valid_results(results: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    return {
+        key: sentiment_json
+        for key, sentiment_json in results.items()
+        if sentiment_json.get("valid")
+    }
+
+
+def count_missing_results(
+    models_to_test: List[str], sample_size: int, context: AnalysisContext
+) -> int:
+    """(model, iteration, article) results the article store does not hold yet."""
+    representatives = context.get_representatives()
+    url_hashes = [
+        hash_url(url) for url in context.content_map if url not in representatives
+    ]
+    return sum(
+        context.article_store.missing_results(
+            context.ticker_symbol,
+            url_hashes,
+            model_name,
+            sample_size,
+            planned_run_key(model_name, context),
+        )
+        for model_name in models_to_test
+    )
+
+
+def get_results_dir(
+    sentiment_save_folder: str, model_name: str, variant: str = ""
+) -> str:
+    return os.path.join(sentiment_save_folder, model_folder_name(model_name, variant))
 
 
 def save_results(
@@ -144,50 +556,227 @@ def save_results(
     average_sentiment: float,
     time_taken: float,
     sentiments_map: Dict[str, Any],
+    run_key: str = "",
+    prompt_eval_saved: float = 0.0,
+    variant: str = "",
+    backend_name: str = "",
+    host: str = "",
 ) -> None:
-    results_dir = os.path.join(sentiment_save_folder, model_name.replace(":", "_"))
+    results_dir = get_results_dir(sentiment_save_folder, model_name, variant)
     if not os.path.exists(results_dir):
         os.makedirs(results_dir)
         logger.info(f"Created directory: {results_dir}")
 
-    sentiment_file = os.path.join(results_dir, ticker_symbol + f"_{iteration}.json")
+    sentiment_file = get_sentiment_file(results_dir, ticker_symbol, iteration)
     data = {
         "average_sentiment": average_sentiment,
         "time_taken": round(time_taken, 2),
+        "summed_time_taken": round(sum_time_taken(sentiments_map), 2),
+        "prompt_eval_saved": round(prompt_eval_saved, 2),
+        "run_key": run_key,
+        "backend": backend_name,
+        "host": host,
         "sentiments": sentiments_map,
     }
     save_json_to_file(sentiment_file, data)
 
 
+def fan_out_result(
+    sentiment_json: Dict[str, Any],
+    url: str,
+    representative_url: str,
+    news_object: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    The representative's answer for a duplicate article. Measurements of the
+    call are left out, so timing and token metrics only count real calls.
+    """
+    return {
+        **{
+            field: value
+            for field, value in sentiment_json.items()
+            if field not in CALL_FIELDS
+        },
+        "url": url,
+        "published": find_published_date(news_object, url),
+        "duplicate_of": representative_url,
+    }
+
+
+def inferred_results(
+    sentiments_map: Dict[str, Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Results that cost an inference call; fanned-out duplicates are left out."""
+    return [
+        sentiment_json
+        for sentiment_json in sentiments_map.values()
+        if "duplicate_of" not in sentiment_json
+    ]
+
+
+def sum_time_taken(sentiments_map: Dict[str, Dict[str, Any]]) -> float:
+    return sum(
+        sentiment_json.get("time_taken", 0.0)
+        for sentiment_json in inferred_results(sentiments_map)
+    )
+
+
+def log_iteration_timing(
+    iteration: int, wall_time: float, sentiments_map: Dict[str, Dict[str, Any]]
+) -> None:
+    summed_time = sum_time_taken(sentiments_map)
+    logger.info(
+        f"Iteration: {iteration + 1}, wall time: {wall_time:.2f}s, "
+        f"summed per-call time: {summed_time:.2f}s"
+    )
+    # Time the backend reports for itself; the rest of the per-call time is
+    # spent in the client stack and on the wire. Calls stopped early never
+    # receive the backend's counters and are left out.
+    timed = [
+        sentiment_json
+        for sentiment_json in inferred_results(sentiments_map)
+        if "total_duration" in sentiment_json
+    ]
+    backend_time = (
+        sum(item["total_duration"] / item.get("batch_size", 1) for item in timed)
+        / NANOSECONDS
+    )
+    if backend_time:
+        timed_time = sum(item.get("time_taken", 0.0) for item in timed)
+        logger.info(
+            f"Iteration: {iteration + 1}, backend time: {backend_time:.2f}s, "
+            f"harness overhead: {timed_time - backend_time:.2f}s"
+        )
+
+
+def log_stream_timing(
+    iteration: int, sentiments_map: Dict[str, Dict[str, Any]]
+) -> None:
+    streamed = [
+        sentiment_json
+        for sentiment_json in inferred_results(sentiments_map)
+        if "time_to_first_token" in sentiment_json
+    ]
+    if not streamed:
+        return
+    first_token = mean(item["time_to_first_token"] for item in streamed)
+    to_json = [item["time_to_json"] for item in streamed if "time_to_json" in item]
+    stopped_early = sum(1 for item in streamed if item.get("stopped_early"))
+    logger.info(
+        f"Iteration: {iteration + 1}, mean time to first token: {first_token:.2f}s, "
+        f"to complete JSON: {mean(to_json) if to_json else 0.0:.2f}s, "
+        f"stopped early: {stopped_early}/{len(streamed)}"
+    )
+
+
 def analyze_content(
-    llm: Ollama,
+    llm: InferenceBackend,
     analyze_prompt: str,
     model_name: str,
     iteration: int,
     content_map: Dict[str, str],
     company_name: str,
     news_object: List[Dict[str, Any]],
+    max_concurrent_requests: int = 1,
+    on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    prefix_state: Optional[PrefixState] = None,
+    batch_size: int = 1,
+    constrained: bool = False,
+    prompt_tokens: Optional[Dict[str, int]] = None,
 ) -> Dict[str, Dict[str, Any]]:
-    sentiments_map = {}
     is_sentiment_model = "sentiment" in model_name
+    json_schema = sentiment_json_schema() if constrained else None
+    prompt_tokens = prompt_tokens or {}
 
-    for j, (url, content) in enumerate(content_map.items()):
+    def analyze_item(
+        j: int, url: str, content: str, batch_fallback: bool = False
+    ) -> Dict[str, Any]:
         prompt = format_prompt(
             is_sentiment_model, analyze_prompt, content, company_name
         )
 
         logger.info(f"Iteration: {iteration + 1}, item: {j + 1}/{len(content_map)}")
-        sentiment_json = process_content(llm, prompt, url, news_object)
+        sentiment_json = process_content(
+            llm, prompt, url, news_object, prefix_state, json_schema
+        )
+        if sentiment_json and url in prompt_tokens:
+            sentiment_json["prompt_tokens"] = prompt_tokens[url]
+        if sentiment_json and batch_fallback:
+            # Kept apart from the batch's own results in the valid JSON rates
+            sentiment_json["batch_fallback"] = True
+        if sentiment_json and on_result:
+            on_result(hash_url(url), sentiment_json)
+        return sentiment_json
+
+    def analyze_batch(batch: List[Tuple[int, str, str]]) -> List[Dict[str, Any]]:
+        if len(batch) == 1:
+            return [analyze_item(*batch[0])]
+
+        logger.info(
+            f"Iteration: {iteration + 1}, items: "
+            f"{batch[0][0] + 1}-{batch[-1][0] + 1}/{len(content_map)}"
+        )
+        prompt = format_batch_prompt(
+            batch_prompt, [content for _, _, content in batch], company_name
+        )
+        batch_results = list(
+            process_batch(
+                llm,
+                prompt,
+                [url for _, url, _ in batch],
+                news_object,
+                prefix_state,
+                sentiment_json_schema(len(batch)) if constrained else None,
+            )
+        )
+        batch_results += [{} for _ in range(len(batch) - len(batch_results))]
+
+        results = []
+        for (j, url, content), sentiment_json in zip(batch, batch_results):
+            if sentiment_json.get("valid"):
+                if url in prompt_tokens:
+                    # The article's own prompt, not the whole batch's
+                    sentiment_json["prompt_tokens"] = prompt_tokens[url]
+                if on_result:
+                    on_result(hash_url(url), sentiment_json)
+                results.append(sentiment_json)
+            else:
+                logger.warning(f"Batched result invalid for URL {url}, retrying alone")
+                results.append(analyze_item(j, url, content, batch_fallback=True))
+        return results
+
+    items = [(j, url, content) for j, (url, content) in enumerate(content_map.items())]
+    # Fine-tuned sentiment models only understand a single raw article
+    unit_size = batch_size if batch_size > 1 and not is_sentiment_model else 1
+    batch_prompt = (
+        get_file_content("sentiment_user_batch_message.txt") if unit_size > 1 else ""
+    )
+    batches = [items[k : k + unit_size] for k in range(0, len(items), unit_size)]
+
+    if max_concurrent_requests > 1:
+        # Each call is still timed inside process_content, so time_taken stays
+        # per-article; results are collected in content_map order below.
+        with ThreadPoolExecutor(max_workers=max_concurrent_requests) as executor:
+            futures = [executor.submit(analyze_batch, batch) for batch in batches]
+            results = [result for future in futures for result in future.result()]
+    else:
+        results = [result for batch in batches for result in analyze_batch(batch)]
+
+    sentiments_map = {}
+    for (_, url, _), sentiment_json in zip(items, results):
         if sentiment_json:
             sentiments_map[hash_url(url)] = sentiment_json
     return sentiments_map
 
 
-def prepare_analyze_prompt(llm: Ollama, model_name: str) -> str:
+def prepare_analyze_prompt(
+    llm: InferenceBackend, model_name: str, prime: bool = True
+) -> str:
     match model_name:  # Using match-case
         case model_name if "sentiment" not in model_name:
             llm.system = get_file_content("sentiment_system_message.txt")
-            llm.invoke(get_file_content("sentiment_user_first_prompt.txt"))
+            if prime:
+                llm.generate(get_file_content("sentiment_user_first_prompt.txt"))
             return get_file_content("sentiment_user_message.txt")
         case _:  # Catch-all case (could be default sentiment model)
             return ""
@@ -205,12 +794,30 @@ def format_prompt(
     )
 
 
-@handle_errors(default_return={})
+def format_batch_prompt(
+    batch_prompt: str, contents: List[str], company_name: str
+) -> str:
+    articles = " ".join(
+        f'<article id="{k + 1}">`{content}`</article>'
+        for k, content in enumerate(contents)
+    )
+    return batch_prompt.format(
+        articles=articles, article_count=len(contents), company_name=company_name
+    )
+
+
+@handle_errors(default_return={}, reraise=(BackendUnavailableError,))
 def process_content(
-    llm: Ollama, prompt: str, url: str, news_object: List[Dict[str, Any]]
+    llm: InferenceBackend,
+    prompt: str,
+    url: str,
+    news_object: List[Dict[str, Any]],
+    prefix_state: Optional[PrefixState] = None,
+    json_schema: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     start_time = time.time()
-    output = llm.invoke(prompt)
+    result = llm.generate(prompt, prefix_state, json_schema=json_schema)
+    output, backend_metrics = result.text, result.metrics
     time_taken = time.time() - start_time
 
     valid, sentiment_json = validate_json(output.strip())
@@ -220,6 +827,8 @@ def process_content(
             "url": url,
             "published": find_published_date(news_object, url),
             "time_taken": round(time_taken, 2),
+            "host": llm.base_url,
+            **backend_metrics,
         }
     )
     if not valid:
@@ -227,6 +836,43 @@ def process_content(
     return sentiment_json
 
 
+@handle_errors(default_return=[], reraise=(BackendUnavailableError,))
+def process_batch(
+    llm: InferenceBackend,
+    prompt: str,
+    urls: List[str],
+    news_object: List[Dict[str, Any]],
+    prefix_state: Optional[PrefixState] = None,
+    json_schema: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    start_time = time.time()
+    result = llm.generate(prompt, prefix_state, json_schema=json_schema)
+    output, backend_metrics = result.text, result.metrics
+    time_taken = time.time() - start_time
+
+    results = []
+    validated = validate_json_array(output.strip(), len(urls))
+    for url, (valid, sentiment_json) in zip(urls, validated):
+        if valid:
+            # Backend counters cover the whole batch. Every article keeps the
+            # totals with batch_size, and metrics divide them by it.
+            sentiment_json.update(
+                {
+                    "valid": True,
+                    "url": url,
+                    "published": find_published_date(news_object, url),
+                    "time_taken": round(time_taken / len(urls), 2),
+                    "batch_size": len(urls),
+                    "host": llm.base_url,
+                    **backend_metrics,
+                }
+            )
+        results.append(sentiment_json)
+    if not all(valid for valid, _ in validated):
+        logger.error(f"Invalid JSON elements in batched output: {output}")
+    return results
+
+
 @handle_errors(default_return="")
 def find_published_date(news_object, url):
     return next((news["published"] for news in news_object if news["link"] == url), "")
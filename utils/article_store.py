@@ -0,0 +1,167 @@
+"""
+Persistent record of every article seen per ticker and of the (model,
+iteration) results already produced for it, so scheduled runs only fetch new
+feed items and only infer articles that lack results.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.analysis_utils import hash_url
+from utils.context import logger
+
+ARTICLE_STORE_FILE = "articles.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    url_hash TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    published TEXT,
+    summary TEXT,
+    content TEXT,
+    first_seen REAL NOT NULL,
+    PRIMARY KEY (url_hash, ticker)
+);
+CREATE TABLE IF NOT EXISTS results (
+    url_hash TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    model TEXT NOT NULL,
+    iteration INTEGER NOT NULL,
+    run_key TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (url_hash, ticker, model, iteration, run_key)
+);
+"""
+
+
+class ArticleStore:
+    """SQLite tables of articles and results, shared by the worker threads."""
+
+    def __init__(self, path: str = ARTICLE_STORE_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def known_urls(self, ticker: str, urls: Iterable[str]) -> Dict[str, str]:
+        """
+        Maps the URLs stored for the ticker to their extracted text. Articles
+        whose page could not be fetched are left out, so they are tried again.
+        """
+        with self.lock:
+            rows = self.query(
+                "SELECT url, content FROM articles WHERE ticker = ? "
+                "AND content IS NOT NULL AND url IN",
+                [ticker],
+                list(urls),
+            )
+        return dict(rows)
+
+    def add_articles(
+        self, ticker: str, news_object: List[Dict[str, Any]], contents: Dict[str, str]
+    ) -> None:
+        """Stores new feed items; contents lacks the pages that failed to fetch."""
+        now = time.time()
+        rows = [
+            (
+                hash_url(news["link"]),
+                ticker,
+                news["link"],
+                news.get("title", ""),
+                news.get("published", ""),
+                news.get("summary", ""),
+                contents.get(news["link"]),
+                now,
+            )
+            for news in news_object
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (url_hash, ticker) DO UPDATE SET content = "
+                "excluded.content WHERE articles.content IS NULL",
+                rows,
+            )
+
+    def load_results(
+        self, ticker: str, model_name: str, iteration: int, run_key: str
+    ) -> Dict[str, Any]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT url_hash, result FROM results WHERE ticker = ? AND model = ? "
+                "AND iteration = ? AND run_key = ?",
+                (ticker, model_name, iteration, run_key),
+            ).fetchall()
+        return {url_hash: json.loads(result) for url_hash, result in rows}
+
+    def save_results(
+        self,
+        ticker: str,
+        model_name: str,
+        iteration: int,
+        run_key: str,
+        sentiments_map: Dict[str, Any],
+    ) -> None:
+        now = time.time()
+        rows = [
+            (url_hash, ticker, model_name, iteration, run_key, json.dumps(result), now)
+            for url_hash, result in sentiments_map.items()
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def missing_results(
+        self,
+        ticker: str,
+        url_hashes: Iterable[str],
+        model_name: str,
+        iterations: int,
+        run_key: str,
+    ) -> int:
+        """
+        Number of (article, iteration) results not stored yet. Invalid results
+        count as missing, since they are retried.
+        """
+        url_hashes = list(url_hashes)
+        with self.lock:
+            rows = self.query(
+                "SELECT COUNT(*) FROM results WHERE ticker = ? AND model = ? "
+                "AND iteration < ? AND run_key = ? "
+                "AND json_extract(result, '$.valid') AND url_hash IN",
+                [ticker, model_name, iterations, run_key],
+                url_hashes,
+            )
+        return len(url_hashes) * iterations - sum(count for (count,) in rows)
+
+    def query(self, sql: str, params: List[Any], values: List[Any]) -> List[tuple]:
+        """Runs sql ending in 'IN' against the values, in chunks SQLite accepts."""
+        rows: List[tuple] = []
+        for k in range(0, len(values), 500):
+            chunk = values[k : k + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            rows += self.connection.execute(
+                f"{sql} ({placeholders})", [*params, *chunk]
+            ).fetchall()
+        return rows
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def open_article_store(store_config: Dict[str, Any]) -> Optional[ArticleStore]:
+    if not store_config.get("enabled", False):
+        return None
+    store = ArticleStore(store_config.get("path", ARTICLE_STORE_FILE))
+    logger.info(f"Using the article store in {store.path}")
+    return store
@@ -0,0 +1,507 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Type
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.context import logger
+from utils.model_info import model_family
+from utils.prefix_cache import PrefixState
+from utils.token_budget import count_tokens
+from utils.validation_utils import JsonStreamTracker
+
+NANOSECONDS = 1e9
+MILLISECONDS = 1e6
+REQUEST_TIMEOUT = 600
+DEFAULT_POOL_SIZE = 16
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+# Ollama's own counters (durations in nanoseconds); other backends map theirs
+BACKEND_METRIC_KEYS: List[str] = [
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+]
+
+# Failures of the server itself, as opposed to bad requests or model output
+CONNECTION_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class BackendUnavailableError(Exception):
+    """The inference server could not be reached or dropped the connection."""
+
+
+sessions: Dict[str, requests.Session] = {}
+sessions_lock = threading.Lock()
+
+
+def get_session(base_url: str, pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Returns one keep-alive session per server, shared by every model on it, so
+    connections are reused across calls and threads.
+    """
+    with sessions_lock:
+        session = sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            sessions[base_url] = session
+        return session
+
+
+@dataclass
+class GenerationResult:
+    text: str
+    metrics: Dict[str, Any] = field(default_factory=dict)
+    context: Optional[List[int]] = None
+
+
+def pick_metrics(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: data[key] for key in BACKEND_METRIC_KEYS if data.get(key) is not None}
+
+
+class StreamCollector:
+    """
+    Collects streamed text, timing the first token and the point where the
+    JSON answer is complete (client-side, in seconds).
+    """
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.tracker = JsonStreamTracker()
+        self.first_token_time: Optional[float] = None
+        self.json_time: Optional[float] = None
+        self.chunks = 0
+
+    def feed(self, chunk: str) -> bool:
+        """Returns True once the JSON answer is complete and generation can stop."""
+        if not chunk:
+            return False
+        if self.first_token_time is None:
+            self.first_token_time = time.time()
+        self.chunks += 1
+        if self.tracker.feed(chunk):
+            self.json_time = self.json_time or time.time()
+            return True
+        return False
+
+    @property
+    def text(self) -> str:
+        return self.tracker.text
+
+    def metrics(self, stopped_early: bool) -> Dict[str, Any]:
+        metrics: Dict[str, Any] = {"stopped_early": stopped_early}
+        if self.first_token_time is not None:
+            metrics["time_to_first_token"] = round(
+                self.first_token_time - self.start_time, 3
+            )
+        if self.json_time is not None:
+            metrics["time_to_json"] = round(self.json_time - self.start_time, 3)
+        if stopped_early:
+            # The server's own counters never arrive; chunks are ~1 token each
+            metrics["streamed_chunks"] = self.chunks
+        return metrics
+
+
+class InferenceBackend(ABC):
+    name = "base"
+
+    def __init__(
+        self,
+        model: str,
+        temperature: float,
+        num_ctx: int,
+        num_predict: int,
+        keep_alive: Optional[str] = None,
+        base_url: str = DEFAULT_OLLAMA_URL,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        stream_early_stop: bool = False,
+    ):
+        self.model = model
+        self.temperature = temperature
+        self.num_ctx = num_ctx
+        self.num_predict = num_predict
+        self.keep_alive = keep_alive
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.stream_early_stop = stream_early_stop
+        self.system: Optional[str] = None
+
+    @abstractmethod
+    def generate(
+        self,
+        prompt: str,
+        prefix_state: Optional[PrefixState] = None,
+        early_stop: bool = True,
+        json_schema: Optional[Dict[str, Any]] = None,
+    ) -> GenerationResult:
+        """
+        Runs one completion with the backend's own timing counters. With
+        stream_early_stop set, the output is streamed and generation is
+        cancelled once the JSON answer closes, unless early_stop is False.
+        A json_schema constrains decoding to that schema where the backend
+        supports it.
+        """
+
+    @contextmanager
+    def connection_errors(self) -> Iterator[None]:
+        try:
+            yield
+        except CONNECTION_ERRORS as e:
+            raise BackendUnavailableError(f"{self.base_url} unavailable: {e}") from e
+
+    def load(self) -> GenerationResult:
+        return self.generate("Hello")
+
+    def unload(self) -> None:
+        pass
+
+    def prime_prefix(self, first_prompt: str) -> PrefixState:
+        """
+        Evaluates the system prompt and the priming turn once. Later calls
+        passing the returned state only evaluate their own prompt.
+        """
+        # Run to completion: Ollama only returns the context in its final chunk
+        result = self.generate(first_prompt, early_stop=False)
+        return PrefixState(
+            context=result.context or [],
+            messages=[
+                *([{"role": "system", "content": self.system}] if self.system else []),
+                {"role": "user", "content": first_prompt},
+                {"role": "assistant", "content": result.text},
+            ],
+            prompt_eval_count=result.metrics.get("prompt_eval_count", 0),
+            prompt_eval_duration=result.metrics.get("prompt_eval_duration", 0),
+            system_tokens=count_tokens(self.system or "", model_family(self.model)),
+        )
+
+
+class OllamaBackend(InferenceBackend):
+    """Talks to Ollama's /api/generate directly over a pooled keep-alive session."""
+
+    name = "ollama"
+
+    @property
+    def session(self) -> requests.Session:
+        return get_session(self.base_url, self.pool_size)
+
+    def build_payload(self, prompt: str, **extra: Any) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": self.temperature,
+                "num_ctx": self.num_ctx,
+                "num_predict": self.num_predict,
+            },
+            **extra,
+        }
+
+    def post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with self.connection_errors():
+            response = self.session.post(
+                f"{self.base_url}/api/generate", json=payload, timeout=REQUEST_TIMEOUT
+            )
+            response.raise_for_status()
+            return response.json()
+
+    def stream(self, payload: Dict[str, Any]) -> GenerationResult:
+        collector = StreamCollector()
+        payload["stream"] = True
+        # Leaving the block early closes the connection, which makes Ollama
+        # cancel the generation instead of running on to num_predict
+        with (
+            self.connection_errors(),
+            self.session.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                stream=True,
+                timeout=REQUEST_TIMEOUT,
+            ) as response,
+        ):
+            response.raise_for_status()
+            chunks = (json.loads(line) for line in response.iter_lines() if line)
+            for data in chunks:
+                if not data.get("done") and collector.feed(data.get("response", "")):
+                    # A model that stops at the closing bracket sends its final
+                    # counters next, so wait for one more chunk at most
+                    data = next(chunks, {})
+                    if not data.get("done"):
+                        return GenerationResult(collector.text, collector.metrics(True))
+                if data.get("done"):
+                    return GenerationResult(
+                        collector.text,
+                        {**pick_metrics(data), **collector.metrics(False)},
+                        data.get("context"),
+                    )
+        return GenerationResult(collector.text, collector.metrics(False))
+
+    def generate(
+        self,
+        prompt: str,
+        prefix_state: Optional[PrefixState] = None,
+        early_stop: bool = True,
+        json_schema: Optional[Dict[str, Any]] = None,
+    ) -> GenerationResult:
+        if prefix_state and prefix_state.context:
+            # The system prompt is already in the cached context
+            payload = self.build_payload(prompt, context=prefix_state.context)
+        elif self.system:
+            payload = self.build_payload(prompt, system=self.system)
+        else:
+            payload = self.build_payload(prompt)
+        if json_schema:
+            # Ollama turns the schema into a sampling grammar
+            payload["format"] = json_schema
+        if self.stream_early_stop and early_stop:
+            return self.stream(payload)
+        data = self.post(payload)
+        return GenerationResult(
+            data.get("response", ""), pick_metrics(data), data.get("context")
+        )
+
+    def load(self) -> GenerationResult:
+        # An empty prompt loads the model without generating anything
+        data = self.post(self.build_payload(""))
+        return GenerationResult("", pick_metrics(data))
+
+    def unload(self) -> None:
+        payload = self.build_payload("")
+        payload["keep_alive"] = 0
+        self.post(payload)
+
+
+class OpenAICompatibleBackend(InferenceBackend):
+    """
+    Chat completions against an OpenAI-compatible server such as llama.cpp's
+    server or vLLM. Prefix reuse relies on the server's prompt cache, so the
+    shared history is simply resent.
+    """
+
+    name = "openai"
+
+    @property
+    def session(self) -> requests.Session:
+        return get_session(self.base_url, self.pool_size)
+
+    def generate(
+        self,
+        prompt: str,
+        prefix_state: Optional[PrefixState] = None,
+        early_stop: bool = True,
+        json_schema: Optional[Dict[str, Any]] = None,
+    ) -> GenerationResult:
+        if prefix_state and prefix_state.messages:
+            messages = list(prefix_state.messages)
+        elif self.system:
+            messages = [{"role": "system", "content": self.system}]
+        else:
+            messages = []
+        messages.append({"role": "user", "content": prompt})
+
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.num_predict,
+            # llama.cpp server: keep the KV cache for the shared prefix
+            "cache_prompt": True,
+        }
+        if json_schema:
+            # llama.cpp server converts the schema to a GBNF grammar; vLLM
+            # uses its guided decoding backend
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "sentiment_response", "schema": json_schema},
+            }
+        if self.stream_early_stop and early_stop:
+            return self.stream(payload)
+        with self.connection_errors():
+            response = self.session.post(
+                f"{self.base_url}/v1/chat/completions",
+                json=payload,
+                timeout=REQUEST_TIMEOUT,
+            )
+            response.raise_for_status()
+            data = response.json()
+        return GenerationResult(
+            data["choices"][0]["message"]["content"] or "", self.map_metrics(data)
+        )
+
+    def stream(self, payload: Dict[str, Any]) -> GenerationResult:
+        collector = StreamCollector()
+        payload["stream"] = True
+        with (
+            self.connection_errors(),
+            self.session.post(
+                f"{self.base_url}/v1/chat/completions",
+                json=payload,
+                stream=True,
+                timeout=REQUEST_TIMEOUT,
+            ) as response,
+        ):
+            response.raise_for_status()
+            events = self.read_events(response.iter_lines())
+            for data in events:
+                complete = collector.feed(self.event_content(data))
+                if complete and not self.event_finished(data):
+                    # As for Ollama, give the closing event one chunk to arrive
+                    data = next(events, {})
+                    if not self.event_finished(data):
+                        return GenerationResult(collector.text, collector.metrics(True))
+                if self.event_finished(data):
+                    # llama.cpp attaches its timings to the last event
+                    return GenerationResult(
+                        collector.text,
+                        {**self.map_metrics(data), **collector.metrics(False)},
+                    )
+        return GenerationResult(collector.text, collector.metrics(False))
+
+    @staticmethod
+    def event_content(data: Dict[str, Any]) -> str:
+        choice = (data.get("choices") or [{}])[0]
+        return (choice.get("delta") or {}).get("content") or ""
+
+    @staticmethod
+    def event_finished(data: Dict[str, Any]) -> bool:
+        choice = (data.get("choices") or [{}])[0]
+        return bool(choice.get("finish_reason"))
+
+    @staticmethod
+    def read_events(lines: Iterator[bytes]) -> Iterator[Dict[str, Any]]:
+        """Decodes server-sent events up to the closing [DONE] marker."""
+        for line in lines:
+            if not line.startswith(b"data:"):
+                continue
+            event = line[len(b"data:") :].strip()
+            if event == b"[DONE]":
+                return
+            yield json.loads(event)
+
+    @staticmethod
+    def map_metrics(data: Dict[str, Any]) -> Dict[str, Any]:
+        usage = data.get("usage") or {}
+        metrics = {
+            "prompt_eval_count": usage.get("prompt_tokens"),
+            "eval_count": usage.get("completion_tokens"),
+        }
+        timings = data.get("timings")
+        if timings:
+            # llama.cpp reports its own timings in milliseconds
+            metrics.update(
+                {
+                    "prompt_eval_count": timings.get("prompt_n"),
+                    "prompt_eval_duration": int(
+                        timings.get("prompt_ms", 0) * MILLISECONDS
+                    ),
+                    "eval_count": timings.get("predicted_n"),
+                    "eval_duration": int(timings.get("predicted_ms", 0) * MILLISECONDS),
+                }
+            )
+            metrics["total_duration"] = (
+                metrics["prompt_eval_duration"] + metrics["eval_duration"]
+            )
+        return pick_metrics(metrics)
+
+
+class LangChainBackend(InferenceBackend):
+    """The original langchain_community Ollama path, kept for comparison."""
+
+    name = "langchain"
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        from langchain_community.llms import Ollama
+
+        self.llm = Ollama(
+            base_url=self.base_url,
+            model=self.model,
+            temperature=self.temperature,
+            num_ctx=self.num_ctx,
+            num_predict=self.num_predict,
+            keep_alive=self.keep_alive,
+        )
+
+    def generate(
+        self,
+        prompt: str,
+        prefix_state: Optional[PrefixState] = None,
+        early_stop: bool = True,
+        json_schema: Optional[Dict[str, Any]] = None,
+    ) -> GenerationResult:
+        if prefix_state:
+            logger.warning("The langchain backend cannot reuse a prefix context.")
+        self.llm.system = self.system
+        # The wrapper only knows Ollama's plain JSON mode, not schemas
+        self.llm.format = "json" if json_schema else None
+        if self.stream_early_stop and early_stop:
+            return self.stream(prompt)
+        with self.connection_errors():
+            generation = self.llm.generate([prompt]).generations[0][0]
+        return GenerationResult(
+            generation.text, pick_metrics(generation.generation_info or {})
+        )
+
+    def stream(self, prompt: str) -> GenerationResult:
+        collector = StreamCollector()
+        with self.connection_errors():
+            chunks = self.llm.stream(prompt)
+            try:
+                for chunk in chunks:
+                    if collector.feed(chunk):
+                        return GenerationResult(collector.text, collector.metrics(True))
+            finally:
+                # Closing the generator closes LangChain's streaming response
+                chunks.close()
+        return GenerationResult(collector.text, collector.metrics(False))
+
+    def unload(self) -> None:
+        with self.connection_errors():
+            self.llm.invoke("", keep_alive=0)
+
+
+BACKEND_TYPES: Dict[str, Type[InferenceBackend]] = {
+    OllamaBackend.name: OllamaBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+    LangChainBackend.name: LangChainBackend,
+}
+
+
+def create_backend(
+    backend_config: Dict[str, Any],
+    model: str,
+    temperature: float,
+    num_ctx: int,
+    num_predict: int,
+    keep_alive: Optional[str] = None,
+    stream_early_stop: bool = False,
+) -> InferenceBackend:
+    backend_type = backend_config.get("type", OllamaBackend.name)
+    if backend_type not in BACKEND_TYPES:
+        raise ValueError(f"Unknown backend type: {backend_type}")
+    return BACKEND_TYPES[backend_type](
+        model,
+        temperature,
+        num_ctx,
+        num_predict,
+        keep_alive,
+        backend_config.get("base_url", DEFAULT_OLLAMA_URL),
+        backend_config.get("pool_size", DEFAULT_POOL_SIZE),
+        stream_early_stop,
+    )
@@ -0,0 +1,192 @@
+"""
+One on-disk cache with a namespace per kind of data, each with its own TTL and
+size limit (least recently stored entries are evicted first).
+
+    python -m utils.cache stats
+    python -m utils.cache list pages
+    python -m utils.cache prune [--namespace pages]
+    python -m utils.cache clear --namespace content
+"""
+
+import argparse
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+import diskcache as dc
+
+from utils.context import logger
+from utils.file_utils import load_config
+
+CONFIG_FILE = "config.yaml"
+CACHE_DIR = "cache"
+MEGABYTE = 1024 * 1024
+DAY = 24 * 60 * 60
+MISSING = object()
+
+
+@dataclass(frozen=True)
+class NamespaceSettings:
+    ttl: Optional[float]  # seconds; None keeps entries until evicted
+    size_limit_mb: float
+
+
+DEFAULT_NAMESPACES: Dict[str, NamespaceSettings] = {
+    "feeds": NamespaceSettings(5 * 60, 64),  # raw news feeds per ticker
+    "pages": NamespaceSettings(DAY, 1024),  # raw article HTML
+    "content": NamespaceSettings(7 * DAY, 256),  # text extracted per ticker
+    "companies": NamespaceSettings(30 * DAY, 16),  # company names
+    "outputs": NamespaceSettings(None, 256),  # primed model prefixes
+    "metrics": NamespaceSettings(None, 256),  # per-model report aggregates
+}
+
+
+class CacheNamespace:
+    """A size-bounded diskcache with a default TTL and persistent hit counts."""
+
+    def __init__(self, name: str, directory: str, settings: NamespaceSettings):
+        self.name = name
+        self.ttl = settings.ttl
+        self.size_limit = int(settings.size_limit_mb * MEGABYTE)
+        self.cache = dc.Cache(os.path.join(directory, name), size_limit=self.size_limit)
+        self.cache.stats(enable=True)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self.cache.get(key, default)
+
+    def set(self, key: Any, value: Any, expire: Optional[float] = None) -> None:
+        self.cache.set(key, value, expire=expire if expire is not None else self.ttl)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.cache
+
+    def keys(self) -> Iterator[Any]:
+        return self.cache.iterkeys()
+
+    def expire_time(self, key: Any) -> Optional[float]:
+        _, expire_time = self.cache.get(key, MISSING, expire_time=True)
+        return expire_time
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = self.cache.stats()
+        lookups = hits + misses
+        return {
+            "namespace": self.name,
+            "entries": len(self.cache),
+            "bytes": self.cache.volume(),
+            "size_limit": self.size_limit,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def prune(self) -> int:
+        """Removes expired entries, then evicts down to the size limit."""
+        return self.cache.expire() + self.cache.cull()
+
+    def clear(self) -> int:
+        self.cache.stats(reset=True)
+        return self.cache.clear()
+
+
+class CacheStore:
+    """Opens namespaces on first use, so scripts only touch what they need."""
+
+    def __init__(self):
+        self.directory = CACHE_DIR
+        self.settings = dict(DEFAULT_NAMESPACES)
+        self.namespaces: Dict[str, CacheNamespace] = {}
+        self.lock = threading.Lock()
+
+    def configure(self, cache_config: Dict[str, Any]) -> None:
+        with self.lock:
+            self.directory = cache_config.get("directory", CACHE_DIR)
+            for name, overrides in (cache_config.get("namespaces") or {}).items():
+                default = self.settings.get(name, NamespaceSettings(None, 64))
+                self.settings[name] = NamespaceSettings(
+                    overrides.get("ttl", default.ttl),
+                    overrides.get("size_limit_mb", default.size_limit_mb),
+                )
+            self.namespaces.clear()
+
+    def namespace(self, name: str) -> CacheNamespace:
+        with self.lock:
+            if name not in self.namespaces:
+                if name not in self.settings:
+                    raise ValueError(f"Unknown cache namespace: {name}")
+                self.namespaces[name] = CacheNamespace(
+                    name, self.directory, self.settings[name]
+                )
+            return self.namespaces[name]
+
+
+store = CacheStore()
+
+
+def configure_cache(cache_config: Dict[str, Any]) -> None:
+    store.configure(cache_config)
+
+
+def get_cache(name: str) -> CacheNamespace:
+    return store.namespace(name)
+
+
+def log_cache_stats(names: Optional[List[str]] = None) -> None:
+    for name in names or list(store.settings):
+        stats = get_cache(name).stats()
+        megabytes = stats["bytes"] / MEGABYTE
+        logger.info(
+            f"{name:<10} {stats['entries']:>7} entries "
+            f"{megabytes:>9.2f} / {stats['size_limit'] / MEGABYTE:.0f} MB"
+            f"  hits {stats['hits']:>7}  misses {stats['misses']:>7}  "
+            f"hit rate {stats['hit_rate']:.0%}"
+        )
+
+
+def log_cache_keys(name: str) -> None:
+    namespace = get_cache(name)
+    now = time.time()
+    for key in namespace.keys():
+        expire_time = namespace.expire_time(key)
+        expires = (
+            f"expires in {(expire_time - now) / 3600:.1f}h"
+            if expire_time
+            else "no expiry"
+        )
+        logger.info(f"{name}: {key} ({expires})")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect and prune the cache.")
+    parser.add_argument("command", choices=["stats", "list", "prune", "clear"])
+    parser.add_argument("name", nargs="?", help="Namespace for 'list'")
+    parser.add_argument("--namespace", action="append", help="Limit to namespaces")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    configure_cache(load_config(CONFIG_FILE).get("cache") or {})
+    names = args.namespace or list(store.settings)
+
+    if args.command == "stats":
+        log_cache_stats(names)
+    elif args.command == "list":
+        for name in [args.name] if args.name else names:
+            log_cache_keys(name)
+    elif args.command == "prune":
+        for name in names:
+            logger.info(f"{name}: pruned {get_cache(name).prune()} entries")
+        log_cache_stats(names)
+    elif args.command == "clear":
+        if not args.namespace:
+            raise SystemExit("clear needs --namespace, to avoid wiping everything")
+        for name in names:
+            logger.info(f"{name}: cleared {get_cache(name).clear()} entries")
+
+
+if __name__ == "__main__":
+    main()
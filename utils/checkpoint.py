@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from utils.context import logger
+
+CHECKPOINT_SUFFIX = ".checkpoint.jsonl"
+
+
+def compute_run_key(
+    model_name: str,
+    system_prompt: Optional[str],
+    analyze_prompt: str,
+    options: Dict[str, Any],
+) -> str:
+    """
+    Identifies results that can be reused: same model, same prompts and same
+    sampling options.
+    """
+    prompt_hash = hashlib.sha256(
+        ((system_prompt or "") + "\0" + analyze_prompt).encode()
+    ).hexdigest()
+    key_data = json.dumps(
+        {"model": model_name, "prompt_hash": prompt_hash, "options": options},
+        sort_keys=True,
+    )
+    return hashlib.sha256(key_data.encode()).hexdigest()[0:16]
+
+
+def get_sentiment_file(results_dir: str, ticker_symbol: str, iteration: int) -> str:
+    return os.path.join(results_dir, ticker_symbol + f"_{iteration}.json")
+
+
+def get_checkpoint_file(sentiment_file: str) -> str:
+    # Deliberately not ending in .json so metric loaders never pick it up
+    return os.path.splitext(sentiment_file)[0] + CHECKPOINT_SUFFIX
+
+
+def load_completed_results(sentiment_file: str, run_key: str) -> Dict[str, Any]:
+    """
+    Returns the per-article results already produced for this run key, from the
+    finished iteration file and from the article-level checkpoint.
+    """
+    completed: Dict[str, Any] = {}
+
+    if os.path.exists(sentiment_file):
+        try:
+            with open(sentiment_file, "r") as file:
+                data = json.load(file)
+            if data.get("run_key") == run_key:
+                completed.update(data.get("sentiments", {}))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable results file {sentiment_file}: {e}")
+
+    checkpoint_file = get_checkpoint_file(sentiment_file)
+    if os.path.exists(checkpoint_file):
+        with open(checkpoint_file, "r") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short by a crash
+                    continue
+                if record.get("run_key") == run_key:
+                    completed[record["key"]] = record["result"]
+
+    return completed
+
+
+class CheckpointWriter:
+    """Appends one line per finished article so an interrupted iteration resumes."""
+
+    def __init__(self, sentiment_file: str, run_key: str):
+        self.checkpoint_file = get_checkpoint_file(sentiment_file)
+        self.run_key = run_key
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.checkpoint_file) or ".", exist_ok=True)
+
+    def append(self, key: str, result: Dict[str, Any]) -> None:
+        line = json.dumps({"run_key": self.run_key, "key": key, "result": result})
+        with self.lock:
+            with open(self.checkpoint_file, "a") as file:
+                file.write(line + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    def remove(self) -> None:
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
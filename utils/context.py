@@ -1,6 +1,10 @@
 import logging
-from dataclasses import dataclass
-from typing import Any, Dict, List
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from utils.article_store import ArticleStore
+    from utils.results_store import ResultsStore
 
 
 def configure_logging():
@@ -27,3 +31,61 @@ class AnalysisContext:
     context_window_size: int
     num_tokens_to_predict: int
     sentiment_save_folder: str
+    max_concurrent_requests: int = 1
+    model_concurrency: Dict[str, int] = field(default_factory=dict)
+    ram_budget_gb: float = 0.0
+    max_loaded_models: int = 1
+    keep_alive: Optional[str] = None
+    interleave_iterations: bool = False
+    resume: bool = False
+    prefix_reuse: bool = False
+    batch_size: int = 1
+    stream_early_stop: bool = False
+    # Token budget applied to the article content, or 0 without one
+    max_content_tokens: int = 0
+    constrained_decoding: bool = False
+    adaptive_sampling: bool = False
+    min_iterations: int = 3
+    ci_width: float = 0.1
+    ci_confidence: float = 0.95
+    hosts: List[str] = field(default_factory=list)
+    max_attempts: int = 3
+    max_host_failures: int = 3
+    retry_delay: float = 5.0
+    duplicates: Dict[str, List[str]] = field(default_factory=dict)
+    backends: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    default_backend: str = "ollama"
+    model_backends: Dict[str, str] = field(default_factory=dict)
+    article_store: Optional["ArticleStore"] = None
+    results_store: Optional["ResultsStore"] = None
+    json_results: bool = True
+
+    def get_concurrency(self, model_name: str) -> int:
+        limit = self.model_concurrency.get(model_name, self.max_concurrent_requests)
+        return max(1, limit)
+
+    def get_backend_config(self, model_name: str) -> Dict[str, Any]:
+        backend_name = self.model_backends.get(model_name, self.default_backend)
+        if backend_name not in self.backends:
+            # Allow naming a backend type directly, e.g. 'langchain'
+            return {"type": backend_name}
+        return self.backends[backend_name]
+
+    def get_representatives(self) -> Dict[str, str]:
+        """Maps every duplicate URL to the URL whose result it shares."""
+        return {
+            url: representative
+            for representative, urls in self.duplicates.items()
+            for url in urls
+        }
+
+    def get_run_variant(self, model_name: str) -> str:
+        """Suffix for result folders of runs that differ from the plain mode."""
+        variant = ""
+        if self.batch_size > 1 and "sentiment" not in model_name:
+            variant += f"-batch{self.batch_size}"
+        if self.constrained_decoding:
+            variant += "-constrained"
+        if self.stream_early_stop:
+            variant += "-stream"
+        return variant
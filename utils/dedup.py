@@ -0,0 +1,132 @@
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+from utils.context import logger
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+MERSENNE_PRIME = (1 << 31) - 1
+WORD_PATTERN = re.compile(r"\w+")
+
+# Fixed permutations so signatures and clusters are reproducible between runs
+PERMUTATION_A, PERMUTATION_B = np.random.default_rng(0).integers(
+    1, MERSENNE_PRIME, size=(2, NUM_PERMUTATIONS), dtype=np.int64
+)
+
+
+def normalize_text(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(normalize_text(text)).encode()).hexdigest()
+
+
+def shingle_hashes(words: List[str]) -> np.ndarray:
+    """Hashes of the word shingles, below the Mersenne prime used for MinHash."""
+    shingles = {
+        " ".join(words[k : k + SHINGLE_SIZE])
+        for k in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    }
+    return np.array(
+        [
+            int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+            % MERSENNE_PRIME
+            for s in shingles
+        ],
+        dtype=np.int64,
+    )
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    hashes = shingle_hashes(normalize_text(text))
+    # (a * x + b) mod p for every permutation and shingle; fits in int64
+    permuted = (
+        PERMUTATION_A[:, None] * hashes[None, :] + PERMUTATION_B[:, None]
+    ) % MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+def estimated_jaccard(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+    return float(np.mean(signature_a == signature_b))
+
+
+def find_duplicates(
+    content_map: Dict[str, str], threshold: float = 0.85
+) -> Dict[str, List[str]]:
+    """
+    Groups URLs whose text is identical after normalization, or whose MinHash
+    estimate of shingle Jaccard similarity reaches the threshold. Returns the
+    first URL of every cluster mapped to the URLs that duplicate it.
+    """
+    urls = list(content_map)
+    parent = list(range(len(urls)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    def union(a: int, b: int) -> None:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            # Keep the earliest URL as the cluster's representative
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    by_hash: Dict[str, int] = {}
+    for index, url in enumerate(urls):
+        digest = content_hash(content_map[url])
+        if digest in by_hash:
+            union(by_hash[digest], index)
+        else:
+            by_hash[digest] = index
+
+    if threshold < 1.0:
+        # Locality-sensitive hashing: only texts sharing a band are compared
+        signatures = {
+            index: minhash_signature(content_map[urls[index]])
+            for index in by_hash.values()
+        }
+        rows = NUM_PERMUTATIONS // LSH_BANDS
+        buckets: Dict[tuple, List[int]] = defaultdict(list)
+        for index, signature in signatures.items():
+            for band in range(LSH_BANDS):
+                band_key = tuple(signature[band * rows : (band + 1) * rows])
+                buckets[(band, band_key)].append(index)
+        for candidates in buckets.values():
+            for k, a in enumerate(candidates):
+                for b in candidates[k + 1 :]:
+                    if find(a) != find(b) and (
+                        estimated_jaccard(signatures[a], signatures[b]) >= threshold
+                    ):
+                        union(a, b)
+
+    clusters: Dict[str, List[str]] = defaultdict(list)
+    for index, url in enumerate(urls):
+        root = find(index)
+        if root != index:
+            clusters[urls[root]].append(url)
+    return dict(clusters)
+
+
+def log_duplicate_clusters(
+    duplicates: Dict[str, List[str]], article_count: int, runs: int
+) -> None:
+    duplicate_count = sum(len(urls) for urls in duplicates.values())
+    logger.info(
+        f"Found {len(duplicates)} duplicate cluster(s) covering "
+        f"{duplicate_count + len(duplicates)} of {article_count} article(s)"
+    )
+    for representative, urls in duplicates.items():
+        logger.info(f"  {representative} <- " + ", ".join(urls))
+    if duplicate_count:
+        logger.info(
+            f"Deduplication avoids {duplicate_count * runs} inference call(s) "
+            f"({duplicate_count} per model iteration)"
+        )
@@ -0,0 +1,235 @@
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+from utils.adaptive_sampling import SampleTracker
+from utils.analysis_utils import (
+    LoadedModel,
+    create_sample_tracker,
+    load_model,
+    run_iteration,
+    unload_model,
+)
+from utils.backends import BackendUnavailableError
+from utils.context import AnalysisContext, logger
+from utils.scheduler import log_schedule, plan_schedule
+
+
+@dataclass(frozen=True)
+class WorkUnit:
+    model_name: str
+    iteration: int
+    attempts: int = 0
+    failed_hosts: Tuple[str, ...] = ()
+
+
+@dataclass
+class HostStats:
+    units: int = 0
+    loads: int = 0
+    failures: int = 0
+    busy_time: float = 0.0
+
+
+class WorkQueue:
+    """
+    (model, iteration) units in schedule order. A host keeps taking units of
+    the model it has loaded, otherwise it starts on a model no other host is
+    running, so models are only loaded on several hosts once the queue runs
+    short of other work. Units that failed on a host go to other hosts first.
+    """
+
+    def __init__(self, units: List[WorkUnit]):
+        self.units = list(units)
+        self.in_flight = 0
+        self.running: Dict[str, str] = {}  # host -> model
+        self.condition = threading.Condition()
+
+    def take(self, host: str, loaded_model: Optional[str]) -> Optional[WorkUnit]:
+        with self.condition:
+            # A unit in flight may still come back if its host fails
+            while not self.units and self.in_flight:
+                self.condition.wait()
+            if not self.units:
+                return None
+            unit = self.units.pop(self.pick_index(host, loaded_model))
+            self.running[host] = unit.model_name
+            self.in_flight += 1
+            return unit
+
+    def pick_index(self, host: str, loaded_model: Optional[str]) -> int:
+        busy_models = {model for other, model in self.running.items() if other != host}
+        for preferred in (
+            lambda unit: unit.model_name == loaded_model,
+            lambda unit: unit.model_name not in busy_models,
+            lambda unit: True,
+        ):
+            for index, unit in enumerate(self.units):
+                if host not in unit.failed_hosts and preferred(unit):
+                    return index
+        return 0
+
+    def finish(self, unit: WorkUnit) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def requeue(self, unit: WorkUnit, host: str) -> None:
+        with self.condition:
+            self.units.insert(
+                0,
+                replace(
+                    unit,
+                    attempts=unit.attempts + 1,
+                    failed_hosts=unit.failed_hosts + (host,),
+                ),
+            )
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def release(self, host: str) -> None:
+        with self.condition:
+            self.running.pop(host, None)
+
+
+@dataclass
+class Coordinator:
+    """Shards (model, iteration) work units across inference hosts."""
+
+    context: AnalysisContext
+    queue: WorkQueue
+    max_attempts: int = 3
+    max_host_failures: int = 3
+    retry_delay: float = 5.0
+    trackers: Dict[str, Optional[SampleTracker]] = field(default_factory=dict)
+    stats: Dict[str, HostStats] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def get_tracker(self, model_name: str) -> Optional[SampleTracker]:
+        # Shared by every host running the model, so stopping stays per model
+        with self.lock:
+            if model_name not in self.trackers:
+                self.trackers[model_name] = create_sample_tracker(self.context)
+            return self.trackers[model_name]
+
+    def run_worker(self, host: str) -> None:
+        stats = self.stats.setdefault(host, HostStats())
+        loaded: Optional[LoadedModel] = None
+        consecutive_failures = 0
+
+        while unit := self.queue.take(host, loaded.model_name if loaded else None):
+            start_time = time.time()
+            tracker = self.get_tracker(unit.model_name)
+            if tracker and tracker.done:
+                # Converged on another host; no need to load the model here
+                self.queue.finish(unit)
+                continue
+            try:
+                if not loaded or loaded.model_name != unit.model_name:
+                    if loaded:
+                        unload_model(loaded.llm)
+                    loaded = load_model(unit.model_name, self.context, host, tracker)
+                    stats.loads += 1
+                run_iteration(loaded, unit.iteration, self.context)
+            except BackendUnavailableError as e:
+                stats.failures += 1
+                consecutive_failures += 1
+                loaded = None
+                self.handle_failure(host, unit, e)
+                if consecutive_failures >= self.max_host_failures:
+                    logger.error(f"Host {host} keeps failing; retiring it")
+                    break
+                time.sleep(self.retry_delay)
+                continue
+            except Exception as e:
+                # Never leave a unit in flight, or the other hosts would wait
+                # for it forever
+                logger.error(
+                    f"Error on {host} for {unit.model_name} iteration "
+                    f"{unit.iteration + 1}: {e}"
+                )
+                self.queue.finish(unit)
+                continue
+
+            consecutive_failures = 0
+            stats.units += 1
+            stats.busy_time += time.time() - start_time
+            self.queue.finish(unit)
+
+        if loaded:
+            unload_model(loaded.llm)
+        self.queue.release(host)
+
+    def handle_failure(
+        self, host: str, unit: WorkUnit, error: BackendUnavailableError
+    ) -> None:
+        self.queue.release(host)
+        if unit.attempts + 1 >= self.max_attempts:
+            logger.error(
+                f"Giving up on {unit.model_name} iteration {unit.iteration + 1} "
+                f"after {unit.attempts + 1} attempt(s): {error}"
+            )
+            self.queue.finish(unit)
+        else:
+            logger.warning(
+                f"Host {host} failed on {unit.model_name} iteration "
+                f"{unit.iteration + 1}, re-queueing: {error}"
+            )
+            self.queue.requeue(unit, host)
+
+    def log_summary(self, wall_time: float) -> None:
+        for host, stats in sorted(self.stats.items()):
+            logger.info(
+                f"Host {host}: {stats.units} unit(s), {stats.loads} load(s), "
+                f"{stats.failures} failure(s), busy {stats.busy_time:.2f}s"
+            )
+        units = sum(stats.units for stats in self.stats.values())
+        logger.info(
+            f"Distributed run: {units} unit(s) on {len(self.stats)} host(s) "
+            f"in {wall_time:.2f}s"
+        )
+
+
+def test_models_distributed(
+    models_to_test: List[str],
+    sample_size: int,
+    context: AnalysisContext,
+) -> None:
+    schedule = plan_schedule(
+        models_to_test, context.ram_budget_gb, context.max_loaded_models
+    )
+    log_schedule(schedule)
+    units = [
+        WorkUnit(model_name, iteration)
+        for group in schedule
+        for model_name in group.models
+        for iteration in range(sample_size)
+    ]
+    coordinator = Coordinator(
+        context,
+        WorkQueue(units),
+        context.max_attempts,
+        context.max_host_failures,
+        context.retry_delay,
+    )
+
+    logger.info(f"Sharding {len(units)} unit(s) across {len(context.hosts)} host(s)")
+    start_time = time.time()
+    workers = [
+        threading.Thread(target=coordinator.run_worker, args=(host,), name=host)
+        for host in context.hosts
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    if coordinator.queue.units:
+        logger.error(
+            f"{len(coordinator.queue.units)} unit(s) left unfinished: no host left"
+        )
+    for model_name, tracker in coordinator.trackers.items():
+        if tracker:
+            tracker.log_summary(model_name, sample_size)
+    coordinator.log_summary(time.time() - start_time)
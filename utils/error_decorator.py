@@ -1,17 +1,27 @@
 from functools import wraps
-from typing import Any, Callable, Optional, TypeVar, cast
+from typing import Any, Callable, Optional, Tuple, Type, TypeVar, cast
 
 from utils.context import logger
 
 F = TypeVar("F", bound=Callable[..., Any])
 
 
-def handle_errors(default_return: Optional[Any] = None) -> Callable[[F], F]:
+def handle_errors(
+    default_return: Optional[Any] = None,
+    reraise: Tuple[Type[Exception], ...] = (),
+) -> Callable[[F], F]:
+    """
+    Logs and swallows errors, returning default_return instead. Exceptions in
+    reraise are passed on to the caller.
+    """
+
     def decorator(func: F) -> F:
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
             try:
                 return func(*args, **kwargs)
+            except reraise:
+                raise
             except Exception as e:
                 logger.error(f"Error in {func.__name__}: {e}")
                 return default_return
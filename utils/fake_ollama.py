@@ -0,0 +1,683 @@
+"""
+A deterministic stand-in for an Ollama server, for benchmarking the harness
+offline. It speaks the parts of the Ollama HTTP API the pipeline uses and
+simulates load time, prompt/generation speed, latency jitter and invalid JSON.
+
+    python -m utils.fake_ollama --port 11435 --seed 0
+    python -m utils.fake_ollama --write-fixture fixtures/offline_news.json
+
+With --serve-pages it also serves the fixture's articles as HTML pages, for
+fixtures written with --page-base-url pointing at it, so fetching can be
+benchmarked too.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from utils.backends import NANOSECONDS
+from utils.context import logger
+
+CHARS_PER_TOKEN = 4
+PARAGRAPH_WORDS = 40
+DEFAULT_KEEP_ALIVE = 300.0
+ARTICLE_PATTERN = re.compile(r"<article[^>]*>`?(.*?)`?</article>", re.DOTALL)
+DURATION_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([smh]?)$")
+DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+INVALID_OUTPUTS = [
+    "Sure! Here is the sentiment analysis you asked for.",
+    '{"reasoning": "The article is mostly neutral", "sentiment": ',
+    '{"reasoning": "", "sentiment": 2.5, "confidence": 0.9}',
+]
+TRAILING_CHATTER = (
+    "\n\nI hope this analysis helps! Let me know if you would like me to expand "
+    "on any part of the reasoning or look at other articles about the company. "
+) * 8
+
+
+@dataclass
+class FakeBackendConfig:
+    seed: int = 0
+    load_time: float = 2.0
+    prompt_tokens_per_second: float = 800.0
+    generation_tokens_per_second: float = 40.0
+    latency_ms: float = 20.0
+    latency_sigma: float = 0.25
+    invalid_json_probability: float = 0.05
+    # Chance that the model keeps talking after the JSON answer
+    trailing_chatter_probability: float = 0.0
+    # Extra time per generated token when decoding follows a schema/grammar
+    constrained_overhead: float = 0.1
+    # Article pages (--serve-pages): response time and chance of a 503
+    page_latency_ms: float = 200.0
+    page_error_probability: float = 0.0
+    # Multiplies every simulated delay and reported duration, so the reported
+    # counters always match the wall time; 0 reports unscaled durations
+    # without sleeping at all
+    time_scale: float = 1.0
+
+    @property
+    def duration_scale(self) -> float:
+        return self.time_scale if self.time_scale > 0 else 1.0
+
+
+def parse_keep_alive(keep_alive: Any) -> float:
+    """Returns the keep-alive in seconds; negative values mean forever."""
+    if keep_alive is None:
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(keep_alive, (int, float)):
+        return float(keep_alive)
+    match = DURATION_PATTERN.match(str(keep_alive).strip())
+    if not match:
+        return DEFAULT_KEEP_ALIVE
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def count_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+
+def stable_hash(*parts: Any) -> int:
+    digest = hashlib.sha256(":".join(str(part) for part in parts).encode())
+    return int(digest.hexdigest()[0:16], 16)
+
+
+class FakeOllama:
+    """Simulated model state shared by all request handler threads."""
+
+    def __init__(
+        self, config: FakeBackendConfig, pages: Optional[Dict[str, str]] = None
+    ):
+        self.config = config
+        self.pages = pages or {}  # path -> HTML
+        self.lock = threading.Lock()
+        self.resident: Dict[str, float] = {}  # model -> expiry (monotonic)
+        self.call_counts: Dict[Tuple[str, int], int] = {}
+
+    def ensure_loaded(self, model: str, keep_alive: Any) -> float:
+        """Returns the simulated load time and updates the model's residency."""
+        keep_alive_seconds = parse_keep_alive(keep_alive)
+        now = time.monotonic()
+        with self.lock:
+            expiry = self.resident.get(model)
+            loaded = expiry is not None and (expiry < 0 or expiry > now)
+            if keep_alive_seconds == 0:
+                self.resident.pop(model, None)
+            else:
+                self.resident[model] = (
+                    -1.0 if keep_alive_seconds < 0 else now + keep_alive_seconds
+                )
+        return 0.0 if loaded else self.config.load_time * self.config.duration_scale
+
+    def loaded_models(self) -> List[str]:
+        now = time.monotonic()
+        with self.lock:
+            return [
+                model
+                for model, expiry in self.resident.items()
+                if expiry < 0 or expiry > now
+            ]
+
+    def next_rng(self, model: str, prompt: str) -> random.Random:
+        # Seeded per (model, prompt, repeat) so reruns are reproducible while
+        # repeated iterations of the same article still vary
+        prompt_hash = stable_hash(prompt)
+        with self.lock:
+            count = self.call_counts.get((model, prompt_hash), 0)
+            self.call_counts[(model, prompt_hash)] = count + 1
+        return random.Random(stable_hash(self.config.seed, model, prompt_hash, count))
+
+    def sentiment_object(
+        self, model: str, article: str, temperature: float, rng: random.Random
+    ) -> Dict[str, Any]:
+        base_rng = random.Random(stable_hash(self.config.seed, model, article))
+        base = base_rng.uniform(-0.8, 0.8)
+        sentiment = max(-1.0, min(1.0, base + rng.gauss(0, 0.5 * temperature)))
+        return {
+            "reasoning": f"Simulated analysis by {model} of a "
+            f"{'positive' if sentiment > 0 else 'negative'} article.",
+            "sentiment": round(sentiment, 2),
+            "confidence": round(rng.uniform(0.5, 1.0), 2),
+        }
+
+    def complete(self, request: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Builds the response text and the Ollama-style timing counters."""
+        model = request.get("model", "")
+        prompt = request.get("prompt", "")
+        options = request.get("options") or {}
+        temperature = float(options.get("temperature", 0.8) or 0.0)
+        rng = self.next_rng(model, prompt)
+
+        # Seed on the article text itself so single and batched prompts about
+        # the same article agree, as a real model roughly would
+        articles = ARTICLE_PATTERN.findall(prompt) or [prompt]
+        # A schema or JSON mode always yields well-formed JSON that ends at
+        # the closing bracket
+        constrained = bool(request.get("format"))
+        if rng.random() < self.config.invalid_json_probability and not constrained:
+            text = rng.choice(INVALID_OUTPUTS)
+        elif len(articles) > 1:
+            text = json.dumps(
+                [
+                    self.sentiment_object(model, article, temperature, rng)
+                    for article in articles
+                ]
+            )
+        else:
+            text = json.dumps(
+                self.sentiment_object(model, articles[0], temperature, rng)
+            )
+        if (
+            not constrained
+            and self.config.trailing_chatter_probability > 0
+            and rng.random() < self.config.trailing_chatter_probability
+        ):
+            text += TRAILING_CHATTER
+
+        # Only the new prompt is evaluated when a previous context is reused
+        if request.get("context"):
+            prompt_text = prompt
+        else:
+            prompt_text = (request.get("system") or "") + prompt
+        prompt_eval_count = count_tokens(prompt_text)
+        eval_count = count_tokens(text)
+        generation_tps = self.config.generation_tokens_per_second
+        if constrained:
+            generation_tps /= 1 + self.config.constrained_overhead
+        jitter = rng.lognormvariate(0, self.config.latency_sigma)
+        jitter *= self.config.duration_scale
+        counters = {
+            "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_duration": int(
+                prompt_eval_count
+                / self.config.prompt_tokens_per_second
+                * jitter
+                * NANOSECONDS
+            ),
+            "eval_count": eval_count,
+            "eval_duration": int(eval_count / generation_tps * jitter * NANOSECONDS),
+        }
+        return text, counters
+
+    def sleep(self, seconds: float) -> None:
+        if self.config.time_scale > 0 and seconds > 0:
+            time.sleep(seconds)
+
+    @property
+    def latency(self) -> float:
+        return self.config.latency_ms / 1000 * self.config.duration_scale
+
+
+def build_context(request: Dict[str, Any], text: str) -> List[int]:
+    previous = request.get("context") or []
+    new_text = (request.get("system") or "") + request.get("prompt", "") + text
+    return list(previous) + [
+        stable_hash(new_text[k : k + CHARS_PER_TOKEN]) % 32000
+        for k in range(0, len(new_text), CHARS_PER_TOKEN)
+    ]
+
+
+def split_tokens(text: str) -> List[str]:
+    return [text[k : k + CHARS_PER_TOKEN] for k in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/0.1"
+    backend: FakeOllama = None
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("fake_ollama: " + format % args)
+
+    def read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, data: Any, status: int = 200) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/api/ps":
+            models = self.backend.loaded_models()
+            self.send_json({"models": [{"name": model} for model in models]})
+        elif self.path == "/api/tags":
+            models = self.backend.loaded_models()
+            self.send_json({"models": [{"name": model} for model in models]})
+        elif self.path in self.backend.pages:
+            self.handle_page(self.backend.pages[self.path])
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        if self.path == "/api/generate":
+            self.handle_generate(self.read_json())
+        elif self.path == "/v1/chat/completions":
+            self.handle_chat_completion(self.read_json())
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def handle_page(self, html: str) -> None:
+        config = self.backend.config
+        rng = self.backend.next_rng("page", self.path)
+        self.backend.sleep(
+            config.page_latency_ms / 1000 * config.duration_scale * rng.uniform(0.5, 2)
+        )
+        if rng.random() < config.page_error_probability:
+            self.send_json({"error": "service unavailable"}, 503)
+            return
+        body = html.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_generate(self, request: Dict[str, Any]) -> None:
+        start_time = time.monotonic()
+        model = request.get("model", "")
+        load_time = self.backend.ensure_loaded(model, request.get("keep_alive"))
+        self.backend.sleep(load_time)
+        base = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+        if not request.get("prompt"):
+            # Load or unload only, like Ollama
+            self.send_json({**base, "response": "", "done": True})
+            return
+
+        text, counters = self.backend.complete(request)
+        self.backend.sleep(
+            self.backend.latency + counters["prompt_eval_duration"] / NANOSECONDS
+        )
+        final = {
+            **base,
+            "response": "",
+            "done": True,
+            "context": build_context(request, text),
+            "load_duration": int(load_time * NANOSECONDS),
+            **counters,
+        }
+
+        if request.get("stream", True):
+            self.stream_generate(base, text, counters, final, start_time)
+        else:
+            self.backend.sleep(counters["eval_duration"] / NANOSECONDS)
+            final["response"] = text
+            final["total_duration"] = self.total_duration(start_time, final)
+            self.send_json(final)
+
+    def handle_chat_completion(self, request: Dict[str, Any]) -> None:
+        """OpenAI-compatible chat completions with llama.cpp-style timings."""
+        model = request.get("model", "")
+        messages = request.get("messages") or []
+        load_time = self.backend.ensure_loaded(model, None)
+        self.backend.sleep(load_time)
+        system = "".join(m["content"] for m in messages if m["role"] == "system")
+        prompt = messages[-1]["content"] if messages else ""
+        text, counters = self.backend.complete(
+            {
+                "model": model,
+                "prompt": prompt,
+                "system": system,
+                # Earlier turns are served from the prompt cache
+                "context": messages[:-1] if len(messages) > 2 else None,
+                "options": {"temperature": request.get("temperature", 0.8)},
+                "format": request.get("response_format"),
+            }
+        )
+        timings = {
+            "prompt_n": counters["prompt_eval_count"],
+            "prompt_ms": counters["prompt_eval_duration"] / 1e6,
+            "predicted_n": counters["eval_count"],
+            "predicted_ms": counters["eval_duration"] / 1e6,
+        }
+        self.backend.sleep(
+            self.backend.latency + counters["prompt_eval_duration"] / NANOSECONDS
+        )
+        if request.get("stream"):
+            self.stream_chat_completion(model, text, counters, timings)
+            return
+        self.backend.sleep(counters["eval_duration"] / NANOSECONDS)
+        self.send_json(
+            {
+                "object": "chat.completion",
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": counters["prompt_eval_count"],
+                    "completion_tokens": counters["eval_count"],
+                },
+                "timings": timings,
+            }
+        )
+
+    def stream_chat_completion(
+        self,
+        model: str,
+        text: str,
+        counters: Dict[str, Any],
+        timings: Dict[str, Any],
+    ) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        chunks = split_tokens(text)
+        per_token = counters["eval_duration"] / NANOSECONDS / max(1, len(chunks))
+        base = {"object": "chat.completion.chunk", "model": model}
+        events = [
+            {**base, "choices": [{"index": 0, "delta": {"content": chunk}}]}
+            for chunk in chunks
+        ]
+        events.append(
+            {
+                **base,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "timings": timings,
+            }
+        )
+        try:
+            for event in events:
+                self.backend.sleep(per_token)
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def total_duration(self, start_time: float, final: Dict[str, Any]) -> int:
+        if self.backend.config.time_scale > 0:
+            return int((time.monotonic() - start_time) * NANOSECONDS)
+        return (
+            final["load_duration"]
+            + final["prompt_eval_duration"]
+            + final["eval_duration"]
+        )
+
+    def stream_generate(
+        self,
+        base: Dict[str, Any],
+        text: str,
+        counters: Dict[str, Any],
+        final: Dict[str, Any],
+        start_time: float,
+    ) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        chunks = split_tokens(text)
+        per_token = counters["eval_duration"] / NANOSECONDS / max(1, len(chunks))
+        try:
+            for chunk in chunks:
+                self.backend.sleep(per_token)
+                line = {**base, "response": chunk, "done": False}
+                self.wfile.write((json.dumps(line) + "\n").encode())
+                self.wfile.flush()
+            final["total_duration"] = self.total_duration(start_time, final)
+            self.wfile.write((json.dumps(final) + "\n").encode())
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. after an early stop
+            pass
+
+
+def build_fixture(
+    article_count: int,
+    seed: int = 0,
+    ticker_symbol: str = "MSFT",
+    duplicates: int = 0,
+    base_url: str = "https://example.com",
+) -> Dict[str, Any]:
+    """
+    Offline news for generate_model_sentiments.py (see offline_fixture). The
+    last `duplicates` articles are syndicated copies of earlier ones, every
+    other one with a slightly different footer.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    news, content_map = [], {}
+    for index in range(article_count):
+        url = f"{base_url}/news/{ticker_symbol.lower()}-{index}.html"
+        published = now - timedelta(minutes=rng.randint(1, 600))
+        words = rng.choices(
+            ["revenue", "growth", "cloud", "guidance", "lawsuit", "margin", "ai"],
+            k=rng.randint(40, 400),
+        )
+        news.append(
+            {
+                "link": url,
+                "summary": f"Simulated article {index} about {ticker_symbol}.",
+                "published": published.strftime("%a, %d %b %Y %H:%M:%S +0000"),
+                "published_parsed": list(published.timetuple())[:9],
+            }
+        )
+        copy_index = index - (article_count - duplicates)
+        if copy_index >= 0 and index > copy_index:
+            content = content_map[news[copy_index]["link"]]
+            if copy_index % 2:
+                content += " Syndicated by a partner site."
+            content_map[url] = content
+        else:
+            # Paragraphs joined like web_scraper does, mentioning the ticker
+            # a varying number of times so relevance ranking has work to do
+            content_map[url] = "… ".join(
+                f"{ticker_symbol} " * (1 + k % 3)
+                + " ".join(words[start : start + PARAGRAPH_WORDS])
+                for k, start in enumerate(range(0, len(words), PARAGRAPH_WORDS))
+            )
+    return {
+        "company_name": "simulated company",
+        "ticker_symbol": ticker_symbol,
+        "news": news,
+        "content_map": content_map,
+    }
+
+
+def build_universe_fixture(
+    tickers: List[str],
+    article_count: int,
+    seed: int = 0,
+    duplicates: int = 0,
+    shared: int = 0,
+    base_url: str = "https://example.com",
+) -> Dict[str, Any]:
+    """
+    A fixture per ticker (see build_fixture) for the tickers config. The first
+    `shared` articles of the first ticker also appear in every other ticker's
+    feed, with a paragraph mentioning that ticker, like market wrap-ups do.
+    """
+    fixtures = {
+        ticker_symbol: build_fixture(
+            article_count, seed + k, ticker_symbol, duplicates, base_url
+        )
+        for k, ticker_symbol in enumerate(tickers)
+    }
+    lead = fixtures[tickers[0]]
+    for news in lead["news"][:shared]:
+        url = news["link"]
+        for ticker_symbol in tickers[1:]:
+            lead["content_map"][url] += f"… {ticker_symbol} also moved on the news."
+        for ticker_symbol in tickers[1:]:
+            fixtures[ticker_symbol]["news"].append(dict(news))
+            fixtures[ticker_symbol]["content_map"][url] = lead["content_map"][url]
+    return {"tickers": fixtures}
+
+
+def fixture_from_args(args: argparse.Namespace, base_url: str) -> Dict[str, Any]:
+    if args.tickers:
+        return build_universe_fixture(
+            args.tickers.split(","),
+            args.articles,
+            args.seed,
+            args.duplicates,
+            args.shared,
+            base_url,
+        )
+    return build_fixture(
+        args.articles, args.seed, duplicates=args.duplicates, base_url=base_url
+    )
+
+
+def render_pages(fixture: Dict[str, Any]) -> Dict[str, str]:
+    """HTML for every fixture article, keyed by URL path, with some page chrome."""
+    content_map = {}
+    for ticker_fixture in fixture.get("tickers", {"": fixture}).values():
+        content_map.update(ticker_fixture["content_map"])
+    pages = {}
+    for url, content in content_map.items():
+        paragraphs = "".join(
+            f"<p>{escape(paragraph)}</p>" for paragraph in content.split("… ")
+        )
+        pages[urlsplit(url).path] = (
+            "<html><body><nav><p>Markets Home Video</p></nav>"
+            f"<article><h1>{escape(url)}</h1>{paragraphs}</article>"
+            "<footer><p>Advertisement</p></footer></body></html>"
+        )
+    return pages
+
+
+def create_server(
+    host: str,
+    port: int,
+    config: FakeBackendConfig,
+    pages: Optional[Dict[str, str]] = None,
+) -> ThreadingHTTPServer:
+    handler = type(
+        "BoundFakeOllamaHandler",
+        (FakeOllamaHandler,),
+        {"backend": FakeOllama(config, pages)},
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    defaults = FakeBackendConfig()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--load-time", type=float, default=defaults.load_time)
+    parser.add_argument(
+        "--prompt-tps", type=float, default=defaults.prompt_tokens_per_second
+    )
+    parser.add_argument(
+        "--generation-tps", type=float, default=defaults.generation_tokens_per_second
+    )
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument(
+        "--invalid-json", type=float, default=defaults.invalid_json_probability
+    )
+    parser.add_argument(
+        "--trailing-chatter",
+        type=float,
+        default=defaults.trailing_chatter_probability,
+    )
+    parser.add_argument(
+        "--constrained-overhead",
+        type=float,
+        default=defaults.constrained_overhead,
+    )
+    parser.add_argument("--time-scale", type=float, default=defaults.time_scale)
+    parser.add_argument("--write-fixture", help="Write offline news to this file")
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--duplicates", type=int, default=0)
+    parser.add_argument(
+        "--tickers", help="Comma-separated symbols for a universe fixture"
+    )
+    parser.add_argument(
+        "--shared",
+        type=int,
+        default=0,
+        help="Articles of the first ticker also listed in the other feeds",
+    )
+    parser.add_argument(
+        "--page-base-url",
+        help="Write a fixture whose articles are fetched from this server",
+    )
+    parser.add_argument(
+        "--serve-pages",
+        action="store_true",
+        help="Serve the pages of the fixture built with the same arguments",
+    )
+    parser.add_argument(
+        "--page-latency-ms", type=float, default=defaults.page_latency_ms
+    )
+    parser.add_argument(
+        "--page-errors", type=float, default=defaults.page_error_probability
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.write_fixture:
+        os.makedirs(os.path.dirname(args.write_fixture) or ".", exist_ok=True)
+        fixture = fixture_from_args(args, args.page_base_url or "https://example.com")
+        if args.page_base_url:
+            # Content comes from the pages served with --serve-pages
+            for ticker_fixture in fixture.get("tickers", {"": fixture}).values():
+                del ticker_fixture["content_map"]
+        with open(args.write_fixture, "w") as file:
+            json.dump(fixture, file, indent=2)
+        logger.info(f"Wrote offline fixture: {args.write_fixture}")
+        return
+
+    config = FakeBackendConfig(
+        seed=args.seed,
+        load_time=args.load_time,
+        prompt_tokens_per_second=args.prompt_tps,
+        generation_tokens_per_second=args.generation_tps,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        invalid_json_probability=args.invalid_json,
+        trailing_chatter_probability=args.trailing_chatter,
+        constrained_overhead=args.constrained_overhead,
+        page_latency_ms=args.page_latency_ms,
+        page_error_probability=args.page_errors,
+        time_scale=args.time_scale,
+    )
+    pages = None
+    if args.serve_pages:
+        pages = render_pages(fixture_from_args(args, "https://example.com"))
+    server = create_server(args.host, args.port, config, pages)
+    logger.info(f"Fake Ollama listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import json
 import os
+import re
 from functools import lru_cache
 from typing import Any, Dict
 
@@ -12,8 +13,13 @@ MESSAGES_DIR = "messages"
 FILE_READ_MODE = "r"
 FILE_WRITE_MODE = "w"
 
+# Run variants are saved next to the plain model folder, e.g. "<model>-batch4"
+# or "<model>-batch4-constrained-stream"
+RUN_VARIANT_PATTERN = re.compile(r"(-batch\d+)?(-constrained)?(-stream)?")
 
-@lru_cache(maxsize=None)
+
+# Bounded like the cache namespaces; only a handful of prompt files are read
+@lru_cache(maxsize=32)
 def read_file_content(file_path: str) -> str:
     with open(file_path, "r") as file:
         return file.read()
@@ -24,9 +30,31 @@ def get_file_content(file_name: str) -> str:
 
 
 def save_json_to_file(file_path: str, data: Dict[str, Any]) -> None:
-    with open(file_path, FILE_WRITE_MODE) as file:
+    # Write to a temporary file first so readers never see a half-written file
+    temp_path = file_path + ".tmp"
+    with open(temp_path, FILE_WRITE_MODE) as file:
         json.dump(data, file, indent=2)
-        logger.info(f"Saved JSON to file: {file_path}")
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, file_path)
+    logger.info(f"Saved JSON to file: {file_path}")
+
+
+def model_folder_name(model_name: str, variant: str = "") -> str:
+    return model_name.replace(":", "_") + variant
+
+
+def is_model_folder(folder_name: str, model_name: str) -> bool:
+    """Whether folder_name holds the model's results, or those of a run variant."""
+    base_name = model_folder_name(model_name)
+    return folder_name.startswith(base_name) and bool(
+        RUN_VARIANT_PATTERN.fullmatch(folder_name[len(base_name) :])
+    )
+
+
+def load_json_file(file_path: str) -> Any:
+    with open(file_path, FILE_READ_MODE) as file:
+        return json.load(file)
 
 
 def load_config(file_path: str) -> Dict[str, Any]:
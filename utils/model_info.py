@@ -0,0 +1,62 @@
+import re
+from typing import Dict, Optional
+
+# Approximate effective bits per weight for the GGUF quantizations we test.
+BITS_PER_WEIGHT: Dict[str, float] = {
+    "q4": 4.85,
+    "q5": 5.69,
+    "q8": 8.5,
+    "f16": 16.0,
+}
+
+# Used when the parameter count is not part of the model name.
+DEFAULT_PARAMETERS_B: Dict[str, float] = {
+    "phi3": 3.8,
+    "llama3": 8.0,
+    "mistral": 7.2,
+}
+
+RUNTIME_OVERHEAD_GB = 1.0
+
+PARAMETERS_PATTERN = re.compile(r"(?:^|[-_:])(\d+(?:\.\d+)?)b(?=$|[-_.])")
+QUANTIZATION_PATTERN = re.compile(r"[-_.](q\d[\w]*|fp16|f16)$")
+
+
+def model_family(model_name: str) -> str:
+    """
+    Returns the base model family, e.g. 'llama3' for both 'llama3:8b-instruct-fp16'
+    and 'llama3-8b-sentiment-may-22-2024-2epoches-unsloth.F16'.
+    """
+    name = model_name.lower()
+    if ":" in name:
+        return name.split(":")[0]
+    return name.split("-")[0]
+
+
+def quantization(model_name: str) -> str:
+    match = QUANTIZATION_PATTERN.search(model_name.lower())
+    if not match:
+        return "f16"
+    quant = match.group(1)
+    return "f16" if quant == "fp16" else quant
+
+
+def bits_per_weight(model_name: str) -> float:
+    quant = quantization(model_name)
+    return BITS_PER_WEIGHT.get(quant if quant == "f16" else quant[:2], 16.0)
+
+
+def parameter_count_b(model_name: str) -> Optional[float]:
+    match = PARAMETERS_PATTERN.search(model_name.lower())
+    if match:
+        return float(match.group(1))
+    family = model_family(model_name)
+    for known_family, parameters in DEFAULT_PARAMETERS_B.items():
+        if known_family in family:
+            return parameters
+    return None
+
+
+def estimate_model_ram_gb(model_name: str) -> float:
+    parameters = parameter_count_b(model_name) or DEFAULT_PARAMETERS_B["llama3"]
+    return round(parameters * bits_per_weight(model_name) / 8 + RUNTIME_OVERHEAD_GB, 2)
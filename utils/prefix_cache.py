@@ -0,0 +1,92 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from utils.cache import get_cache
+from utils.context import logger
+
+if TYPE_CHECKING:
+    from utils.backends import InferenceBackend
+
+
+@dataclass
+class PrefixState:
+    """
+    The evaluated system prompt and priming turn, shared by every article: a
+    token context for Ollama, or the chat history for servers with a prompt cache.
+    """
+
+    context: List[int] = field(default_factory=list)
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    prompt_eval_count: int = 0
+    prompt_eval_duration: int = 0
+    # The part of the prefix a stateless call evaluates again every time
+    system_tokens: int = 0
+
+    @property
+    def seconds_per_token(self) -> float:
+        # utils.backends imports this module, so it cannot be imported above
+        from utils.backends import NANOSECONDS
+
+        if not self.prompt_eval_count:
+            return 0.0
+        return self.prompt_eval_duration / NANOSECONDS / self.prompt_eval_count
+
+    @property
+    def prefix_tokens(self) -> int:
+        return len(self.context) or self.prompt_eval_count
+
+    def estimate_saved_seconds(self) -> float:
+        """
+        Prompt-eval time a stateless call would spend re-reading the system
+        prompt. The priming turn and its reply are not part of such a call.
+        """
+        return self.system_tokens * self.seconds_per_token
+
+
+def get_primed_prefix(llm: "InferenceBackend", first_prompt: str) -> PrefixState:
+    """
+    Primes the shared prefix, or reuses the state an earlier run primed with the
+    same server, model, system prompt and options.
+    """
+    outputs = get_cache("outputs")
+    cache_key = (
+        "prefix",
+        llm.name,
+        llm.base_url,
+        llm.model,
+        llm.system,
+        first_prompt,
+        llm.temperature,
+        llm.num_ctx,
+    )
+    prefix_state = outputs.get(cache_key)
+    if prefix_state is not None:
+        logger.info(f"Reusing the cached {prefix_state.prefix_tokens}-token prefix")
+        return prefix_state
+    prefix_state = llm.prime_prefix(first_prompt)
+    outputs.set(cache_key, prefix_state)
+    log_primed_prefix(prefix_state)
+    return prefix_state
+
+
+def log_primed_prefix(prefix_state: PrefixState) -> None:
+    from utils.backends import NANOSECONDS
+
+    logger.info(
+        f"Primed shared prefix of {prefix_state.prefix_tokens} tokens "
+        f"in {prefix_state.prompt_eval_duration / NANOSECONDS:.2f}s of prompt eval"
+    )
+
+
+def log_prefix_savings(
+    iteration: int, prefix_state: Optional[PrefixState], calls: int
+) -> float:
+    if not prefix_state or not calls:
+        return 0.0
+    saved = prefix_state.estimate_saved_seconds() * calls
+    logger.info(
+        f"Iteration: {iteration + 1}, reused a {prefix_state.prefix_tokens}-token "
+        f"prefix across {calls} call(s), ~{saved:.2f}s of prompt eval saved on "
+        f"the {prefix_state.system_tokens}-token system prompt"
+    )
+    return saved
@@ -0,0 +1,603 @@
+"""
+Append-only results store with one row per (run, model, iteration, article).
+Runs append to JSONL segments; compaction merges them into a Parquet table
+(needs the optional pyarrow package) whose numeric columns can be read without
+the reasoning text.
+
+    python -m utils.results_store migrate [--folder sentiments]
+    python -m utils.results_store compact
+    python -m utils.results_store stats
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from utils.context import logger
+from utils.file_utils import is_model_folder, load_config, load_json_file
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional; without it results stay in JSONL segments
+    pyarrow = None
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library's decoder is slower
+    orjson = None
+
+CONFIG_FILE = "config.yaml"
+RESULTS_STORE_DIR = "results"
+SEGMENTS_DIR = "segments"
+TABLE_FILE = "results.parquet"
+# Sidecar of each segment listing the model folders it has rows for
+MANIFEST_SUFFIX = ".models"
+MIGRATED_RUN = "migrated"
+ROW_GROUP_SIZE = 4096
+# Parquet metadata key of the per-model digests recorded at compaction
+MODEL_DIGESTS_KEY = b"model_digests"
+ITERATION_FILE_PATTERN = re.compile(r"(.+)_(\d+)\.json")
+
+# Identify a run's rows; a later run's row for the same key supersedes it
+ROW_KEY = ["ticker", "model", "iteration", "key"]
+META_COLUMNS = {
+    "run_id": "string",
+    "created": "Float64",
+    "run_key": "string",
+    "ticker": "string",
+    "model": "string",
+    "iteration": "Int64",
+    "key": "string",
+    "backend": "string",
+    "iteration_time": "Float64",
+}
+RESULT_COLUMNS = {
+    "valid": "boolean",
+    "sentiment": "Float64",
+    "confidence": "Float64",
+    "time_taken": "Float64",
+    "load_duration": "Int64",
+    "prompt_eval_count": "Int64",
+    "prompt_eval_duration": "Int64",
+    "eval_count": "Int64",
+    "eval_duration": "Int64",
+    "total_duration": "Int64",
+    "prompt_tokens": "Int64",
+    "time_to_first_token": "Float64",
+    "time_to_json": "Float64",
+    "batch_size": "Int64",
+    "batch_fallback": "boolean",
+    "host": "string",
+    "url": "string",
+    "published": "string",
+    "duplicate_of": "string",
+    "reasoning": "string",
+}
+# Remaining result fields, and values of the wrong type, as a JSON object
+EXTRA_COLUMN = "extra"
+COLUMNS = {**META_COLUMNS, **RESULT_COLUMNS, EXTRA_COLUMN: "string"}
+TEXT_COLUMNS = ["url", "published", "duplicate_of", "reasoning", EXTRA_COLUMN]
+NUMERIC_COLUMNS = [column for column in COLUMNS if column not in TEXT_COLUMNS]
+
+
+def dumps_row(row: Dict[str, Any]) -> bytes:
+    if orjson is None:
+        return json.dumps(row).encode()
+    return orjson.dumps(row)
+
+
+def loads_row(line: bytes) -> Dict[str, Any]:
+    if orjson is None:
+        return json.loads(line)
+    return orjson.loads(line)
+
+
+def fits_column(value: Any, dtype: str) -> bool:
+    if dtype == "string":
+        return isinstance(value, str)
+    if dtype == "boolean":
+        return isinstance(value, bool)
+    if dtype == "Int64":
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def result_to_row(sentiment_json: Dict[str, Any], **meta: Any) -> Dict[str, Any]:
+    row: Dict[str, Any] = dict(meta)
+    extra = {}
+    for field, value in sentiment_json.items():
+        dtype = RESULT_COLUMNS.get(field)
+        if dtype and (value is None or fits_column(value, dtype)):
+            row[field] = value
+        else:
+            extra[field] = value
+    row[EXTRA_COLUMN] = json.dumps(extra) if extra else None
+    return row
+
+
+def row_to_result(row: Dict[str, Any]) -> Dict[str, Any]:
+    """The result as the model produced it, without the store's own columns."""
+    result = {}
+    for field, dtype in RESULT_COLUMNS.items():
+        value = row.get(field)
+        if value is None or pd.isna(value):
+            continue
+        if dtype == "Int64":
+            value = int(value)
+        elif dtype == "Float64":
+            value = float(value)
+        elif dtype == "boolean":
+            value = bool(value)
+        result[field] = value
+    extra = row.get(EXTRA_COLUMN)
+    if isinstance(extra, str):
+        result.update(json.loads(extra))
+    return result
+
+
+def rows_to_frame(rows: List[Dict[str, Any]], columns: List[str]) -> pd.DataFrame:
+    frame = pd.DataFrame(rows, columns=columns)
+    return frame.astype({column: COLUMNS[column] for column in columns})
+
+
+def promote_extra(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Moves result fields out of the extra JSON into their own columns, for rows
+    stored before those fields had a column.
+    """
+    pattern = "|".join(f'"{field}"' for field in RESULT_COLUMNS)
+    candidates = frame[EXTRA_COLUMN].dropna()
+    candidates = candidates[candidates.str.contains(pattern)]
+    for index, extra in candidates.items():
+        fields = json.loads(extra)
+        for field in [field for field in fields if field in RESULT_COLUMNS]:
+            if fits_column(fields[field], RESULT_COLUMNS[field]) and pd.isna(
+                frame.at[index, field]
+            ):
+                frame.at[index, field] = fields.pop(field)
+        frame.at[index, EXTRA_COLUMN] = json.dumps(fields) if fields else None
+    return frame
+
+
+def model_digests(frame: pd.DataFrame) -> Dict[str, str]:
+    """
+    Row count and created times per model folder. The store only ever adds
+    rows, so a model's digest changes whenever results are stored for it.
+    """
+    created = frame.groupby("model")["created"].agg(["size", "max", "sum"])
+    return {
+        model: f"{count}:{latest!r}:{total!r}"
+        for model, count, latest, total in zip(
+            created.index, created["size"], created["max"], created["sum"]
+        )
+    }
+
+
+def manifest_file(segment_file: str) -> str:
+    return segment_file + MANIFEST_SUFFIX
+
+
+def write_manifest(segment_file: str, models: Iterable[str]) -> None:
+    temp_file = manifest_file(segment_file) + ".tmp"
+    with open(temp_file, "w") as file:
+        json.dump(sorted(models), file)
+    os.replace(temp_file, manifest_file(segment_file))
+
+
+def pid_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ResultsStore:
+    """A directory of JSONL segments and the compacted Parquet table."""
+
+    def __init__(self, directory: str = RESULTS_STORE_DIR):
+        self.directory = directory
+        self.segments_dir = os.path.join(directory, SEGMENTS_DIR)
+        self.table_file = os.path.join(directory, TABLE_FILE)
+        self.segment_file: Optional[str] = None
+        self.segment_models: set = set()
+        self.run_id = time.strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+        self.lock = threading.Lock()
+        self.completed: Optional[Dict[tuple, Dict[str, Dict[str, Any]]]] = None
+
+    def append(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        with self.lock:
+            if self.segment_file is None:
+                os.makedirs(self.segments_dir, exist_ok=True)
+                self.segment_file = os.path.join(
+                    self.segments_dir, f"{self.run_id}-{time.time_ns()}.jsonl"
+                )
+                self.segment_models = set()
+            new_models = {row["model"] for row in rows} - self.segment_models
+            if new_models:
+                # Listed before their rows are written, so it never misses one
+                self.segment_models |= new_models
+                write_manifest(self.segment_file, self.segment_models)
+            with open(self.segment_file, "ab") as file:
+                file.write(b"".join(dumps_row(row) + b"\n" for row in rows))
+                file.flush()
+                os.fsync(file.fileno())
+            if self.completed is not None:
+                self.index_rows(rows)
+
+    def append_iteration(
+        self,
+        ticker: str,
+        model: str,
+        iteration: int,
+        run_key: str,
+        backend: str,
+        iteration_time: float,
+        sentiments_map: Dict[str, Dict[str, Any]],
+    ) -> None:
+        created = time.time()
+        self.append(
+            [
+                result_to_row(
+                    sentiment_json,
+                    run_id=self.run_id,
+                    created=created,
+                    run_key=run_key,
+                    ticker=ticker,
+                    model=model,
+                    iteration=iteration,
+                    key=key,
+                    backend=backend,
+                    iteration_time=round(iteration_time, 2),
+                )
+                for key, sentiment_json in sentiments_map.items()
+            ]
+        )
+
+    def segment_files(self) -> List[str]:
+        if not os.path.isdir(self.segments_dir):
+            return []
+        return [
+            os.path.join(self.segments_dir, name)
+            for name in sorted(os.listdir(self.segments_dir))
+            if name.endswith(".jsonl")
+        ]
+
+    def is_empty(self) -> bool:
+        return not self.segment_files() and not os.path.exists(self.table_file)
+
+    def iter_segment_rows(
+        self,
+        segment_files: Iterable[str],
+        columns: Optional[List[str]] = None,
+        model_prefix: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streams segment rows, keeping only the given columns. With model_prefix,
+        lines that cannot belong to such a model are skipped without decoding.
+        """
+        needle = f'"{model_prefix}'.encode() if model_prefix else None
+        for segment_file in segment_files:
+            with open(segment_file, "rb") as file:
+                for line in file:
+                    if needle and needle not in line:
+                        continue
+                    try:
+                        row = loads_row(line)
+                    except ValueError:
+                        # The last line may be cut short by a crash
+                        continue
+                    if model_prefix and not row["model"].startswith(model_prefix):
+                        continue
+                    if columns:
+                        row = {column: row.get(column) for column in columns}
+                    yield row
+
+    def models_in_segment(self, segment_file: str) -> set:
+        """The segment's model folders, from its manifest when it has one."""
+        try:
+            with open(manifest_file(segment_file)) as file:
+                return set(json.load(file))
+        except FileNotFoundError:
+            # Segments written before manifests were kept
+            return {
+                row["model"]
+                for row in self.iter_segment_rows([segment_file], ["model"])
+            }
+
+    def read(
+        self,
+        columns: Optional[List[str]] = None,
+        latest: bool = True,
+        model_prefix: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Reads the given columns of every stored row, or of the models whose
+        folder name starts with model_prefix. Only the Parquet table can skip
+        the other columns' bytes; segments are decoded line by line until they
+        are compacted. With latest, a run's rows supersede earlier rows for the
+        same key.
+        """
+        columns = list(
+            dict.fromkeys([*ROW_KEY, "created", *(columns or list(COLUMNS))])
+        )
+        frames = []
+        if os.path.exists(self.table_file):
+            if pyarrow is None:
+                logger.warning(f"Skipping {self.table_file}: pyarrow is not installed")
+            else:
+                # Compaction sorts by model, so a prefix range skips row groups
+                filters = None
+                if model_prefix:
+                    filters = [
+                        ("model", ">=", model_prefix),
+                        ("model", "<", model_prefix + "\uffff"),
+                    ]
+                # Tables compacted before a column was added read it as missing
+                stored = set(pyarrow.parquet.read_schema(self.table_file).names)
+                table = pd.read_parquet(
+                    self.table_file,
+                    columns=[column for column in columns if column in stored],
+                    filters=filters,
+                )
+                frames.append(
+                    table.reindex(columns=columns).astype(
+                        {column: COLUMNS[column] for column in columns}
+                    )
+                )
+        segment_rows = list(
+            self.iter_segment_rows(self.segment_files(), columns, model_prefix)
+        )
+        if segment_rows or not frames:
+            frames.append(rows_to_frame(segment_rows, columns))
+        frame = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        if latest:
+            frame = frame.sort_values("created", kind="stable").drop_duplicates(
+                ROW_KEY, keep="last"
+            )
+        return frame.reset_index(drop=True)
+
+    def table_digests(self) -> Dict[str, str]:
+        """model_digests of the Parquet table, read from its metadata."""
+        if pyarrow is None or not os.path.exists(self.table_file):
+            return {}
+        metadata = pyarrow.parquet.read_schema(self.table_file).metadata or {}
+        if MODEL_DIGESTS_KEY in metadata:
+            return json.loads(metadata[MODEL_DIGESTS_KEY])
+        # Tables compacted before the digests were recorded
+        return model_digests(
+            pd.read_parquet(self.table_file, columns=["model", "created"])
+        )
+
+    def fingerprints(self, model_prefixes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        For each model folder prefix, the table digests of its folders and the
+        name, size and mtime of the segments with rows for them. A fingerprint
+        changes whenever rows are stored for such a model. Only file metadata
+        and the segments' manifests are read.
+        """
+        digests = self.table_digests()
+        fingerprints = {
+            prefix: {
+                "table": {
+                    folder: digest
+                    for folder, digest in sorted(digests.items())
+                    if folder.startswith(prefix)
+                },
+                "segments": [],
+            }
+            for prefix in model_prefixes
+        }
+        for segment_file in self.segment_files():
+            stat = os.stat(segment_file)
+            models = self.models_in_segment(segment_file)
+            for prefix in model_prefixes:
+                if any(model.startswith(prefix) for model in models):
+                    fingerprints[prefix]["segments"].append(
+                        [os.path.basename(segment_file), stat.st_size, stat.st_mtime_ns]
+                    )
+        return fingerprints
+
+    def index_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            index_key = (
+                row["ticker"],
+                row["model"],
+                int(row["iteration"]),
+                row["run_key"],
+            )
+            self.completed.setdefault(index_key, {})[row["key"]] = row_to_result(row)
+
+    def load_completed(
+        self, ticker: str, model: str, iteration: int, run_key: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """Results stored for the same run key, indexed once per process."""
+        with self.lock:
+            if self.completed is None:
+                self.completed = {}
+                frame = self.read(latest=False).sort_values("created", kind="stable")
+                self.index_rows(frame.to_dict("records"))
+            return dict(self.completed.get((ticker, model, iteration, run_key), {}))
+
+    def segment_in_use(self, segment_file: str) -> bool:
+        """Segments of other processes still running may still be appended to."""
+        pid = int(os.path.basename(segment_file).split("-")[1])
+        return pid != os.getpid() and pid_running(pid)
+
+    def compact(self) -> int:
+        """Merges the finished segments into the Parquet table."""
+        if pyarrow is None:
+            logger.info("pyarrow is not installed; results stay in JSONL segments")
+            return 0
+        with self.lock:
+            segments = [
+                segment_file
+                for segment_file in self.segment_files()
+                if not self.segment_in_use(segment_file)
+            ]
+            if not segments:
+                return 0
+            new_rows = rows_to_frame(
+                list(self.iter_segment_rows(segments)), list(COLUMNS)
+            )
+            frames = [new_rows]
+            if os.path.exists(self.table_file):
+                frames.insert(0, pd.read_parquet(self.table_file))
+            table = (
+                pd.concat(frames, ignore_index=True)
+                .reindex(columns=list(COLUMNS))
+                .astype(COLUMNS)
+            )
+            table = promote_extra(table).sort_values(
+                ["model", "ticker", "iteration", "created"], kind="stable"
+            )
+            arrow_table = pyarrow.Table.from_pandas(table, preserve_index=False)
+            arrow_table = arrow_table.replace_schema_metadata(
+                {
+                    **arrow_table.schema.metadata,
+                    MODEL_DIGESTS_KEY: json.dumps(model_digests(table)).encode(),
+                }
+            )
+            temp_file = self.table_file + ".tmp"
+            pyarrow.parquet.write_table(
+                arrow_table,
+                temp_file,
+                compression="zstd",
+                row_group_size=ROW_GROUP_SIZE,
+            )
+            os.replace(temp_file, self.table_file)
+            for segment_file in segments:
+                os.remove(segment_file)
+                if os.path.exists(manifest_file(segment_file)):
+                    os.remove(manifest_file(segment_file))
+            if self.segment_file in segments:
+                self.segment_file = None
+        logger.info(
+            f"Compacted {len(segments)} segment(s) with {len(new_rows)} row(s) "
+            f"into {self.table_file} ({len(table)} rows)"
+        )
+        return len(new_rows)
+
+
+def open_results_store(store_config: Dict[str, Any]) -> ResultsStore:
+    return ResultsStore(store_config.get("directory", RESULTS_STORE_DIR))
+
+
+def select_models(frame: pd.DataFrame, models_to_test: List[str]) -> pd.DataFrame:
+    """Rows of the given models, including their run variants."""
+    folders = [
+        folder
+        for folder in frame["model"].dropna().unique()
+        if any(is_model_folder(folder, model_name) for model_name in models_to_test)
+    ]
+    return frame[frame["model"].isin(folders)]
+
+
+def find_iteration_files(sentiment_save_folder: str) -> Iterable[tuple]:
+    """
+    Yields (path, model folder, ticker, iteration) for the per-iteration JSON
+    files, including universe mode's folder per ticker.
+    """
+    for folder_name in sorted(os.listdir(sentiment_save_folder)):
+        folder = os.path.join(sentiment_save_folder, folder_name)
+        if not os.path.isdir(folder):
+            continue
+        file_names = sorted(os.listdir(folder))
+        if any(os.path.isdir(os.path.join(folder, name)) for name in file_names):
+            # A ticker's folder of model folders
+            yield from find_iteration_files(folder)
+            continue
+        for file_name in file_names:
+            match = ITERATION_FILE_PATTERN.fullmatch(file_name)
+            if match:
+                path = os.path.join(folder, file_name)
+                yield path, folder_name, match.group(1), int(match.group(2))
+
+
+def migrate(sentiment_save_folder: str, store: ResultsStore) -> int:
+    """Imports the per-iteration JSON files; files imported before are skipped."""
+    imported = store.read(["run_id"], latest=False)
+    imported = set(
+        zip(
+            *(
+                imported.loc[imported["run_id"] == MIGRATED_RUN, column]
+                for column in [*ROW_KEY, "created"]
+            )
+        )
+    )
+    row_count = 0
+    for path, model, ticker, iteration in find_iteration_files(sentiment_save_folder):
+        data = load_json_file(path)
+        created = os.path.getmtime(path)
+        rows = [
+            result_to_row(
+                sentiment_json,
+                run_id=MIGRATED_RUN,
+                created=created,
+                run_key=data.get("run_key", ""),
+                ticker=ticker,
+                model=model,
+                iteration=iteration,
+                key=key,
+                backend=data.get("backend", ""),
+                iteration_time=data.get("time_taken"),
+            )
+            for key, sentiment_json in data.get("sentiments", {}).items()
+            if (ticker, model, iteration, key, created) not in imported
+        ]
+        store.append(rows)
+        row_count += len(rows)
+    logger.info(f"Imported {row_count} row(s) from {sentiment_save_folder}")
+    return row_count
+
+
+def log_store_stats(store: ResultsStore) -> None:
+    frame = store.read(["model", "run_id"], latest=False)
+    segments = store.segment_files()
+    table_size = (
+        os.path.getsize(store.table_file) if os.path.exists(store.table_file) else 0
+    )
+    logger.info(
+        f"{store.directory}: {len(frame)} row(s) from {frame['run_id'].nunique()} "
+        f"run(s), table {table_size / 1024:.0f} KiB, {len(segments)} segment(s)"
+    )
+    for model, count in frame["model"].value_counts().sort_index().items():
+        logger.info(f"  {model}: {count}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Manage the results store.")
+    parser.add_argument("command", choices=["migrate", "compact", "stats"])
+    parser.add_argument(
+        "--folder", help="Per-iteration JSON tree to migrate (sentiment_save_folder)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    config = load_config(CONFIG_FILE)
+    store = open_results_store(config.get("results_store") or {})
+
+    if args.command == "migrate":
+        folder = args.folder or config.get("sentiment_save_folder", "sentiments")
+        migrate(folder, store)
+        store.compact()
+    elif args.command == "compact":
+        store.compact()
+    log_store_stats(store)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from dataclasses import dataclass, field
+from typing import List, TypeVar
+
+from utils.context import logger
+from utils.model_info import (
+    bits_per_weight,
+    estimate_model_ram_gb,
+    model_family,
+    parameter_count_b,
+)
+
+T = TypeVar("T")
+
+
+@dataclass
+class ResidencyGroup:
+    """Models that are loaded together and stay resident while they are tested."""
+
+    models: List[str] = field(default_factory=list)
+    estimated_ram_gb: float = 0.0
+
+
+def schedule_sort_key(model_name: str):
+    # Keep a family together and walk it from the smallest to the largest
+    # quantization so consecutive loads share as much page cache as possible.
+    return (
+        model_family(model_name),
+        parameter_count_b(model_name) or 0.0,
+        bits_per_weight(model_name),
+    )
+
+
+def plan_schedule(
+    models_to_test: List[str], ram_budget_gb: float, max_loaded_models: int
+) -> List[ResidencyGroup]:
+    """
+    Orders models by family and size, then packs each family into residency groups
+    that fit into the RAM budget. A budget of 0 only limits the number of loaded
+    models.
+    """
+    groups: List[ResidencyGroup] = []
+    current = ResidencyGroup()
+
+    for model_name in sorted(models_to_test, key=schedule_sort_key):
+        ram_gb = estimate_model_ram_gb(model_name)
+        over_budget = (
+            ram_budget_gb > 0 and current.estimated_ram_gb + ram_gb > ram_budget_gb
+        )
+        new_family = current.models and model_family(
+            current.models[-1]
+        ) != model_family(model_name)
+        if current.models and (
+            new_family
+            or over_budget
+            or len(current.models) >= max(1, max_loaded_models)
+        ):
+            groups.append(current)
+            current = ResidencyGroup()
+
+        if ram_budget_gb > 0 and ram_gb > ram_budget_gb:
+            logger.warning(
+                f"Model {model_name} (~{ram_gb} GB) exceeds the RAM budget "
+                f"of {ram_budget_gb} GB; it will be loaded on its own."
+            )
+        current.models.append(model_name)
+        current.estimated_ram_gb = round(current.estimated_ram_gb + ram_gb, 2)
+
+    if current.models:
+        groups.append(current)
+    return groups
+
+
+def log_schedule(schedule: List[ResidencyGroup]) -> None:
+    logger.info(f"Scheduled {len(schedule)} residency group(s):")
+    for index, group in enumerate(schedule):
+        logger.info(
+            f"  Group {index + 1} (~{group.estimated_ram_gb} GB): "
+            + ", ".join(group.models)
+        )
+
+
+def iteration_order(models: List[T], iteration: int) -> List[T]:
+    """Rotates the resident models every iteration so none is always run first."""
+    if not models:
+        return []
+    offset = iteration % len(models)
+    return models[offset:] + models[:offset]
@@ -0,0 +1,131 @@
+"""
+Bootstrap confidence intervals and permutation tests for the difference in
+means between two models' samples, for many (pair, article) tests at once.
+Samples are padded into one array per test so that every resample of every
+test is drawn and reduced in a few NumPy operations.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Upper bound on tests x resamples x samples per chunk, to cap memory use
+MAX_CHUNK_ELEMENTS = 4_000_000
+
+
+def pad_samples(samples: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Ragged samples as a zero-padded (tests, max samples) array and counts."""
+    counts = np.array([len(sample) for sample in samples], dtype=int)
+    padded = np.zeros((len(samples), max(1, counts.max(initial=0))))
+    for row, sample in enumerate(samples):
+        padded[row, : len(sample)] = sample
+    return padded, counts
+
+
+def chunks(test_count: int, resamples: int, width: int) -> List[slice]:
+    size = max(1, MAX_CHUNK_ELEMENTS // (resamples * width))
+    return [slice(k, k + size) for k in range(0, test_count, size)]
+
+
+def resampled_means(
+    padded: np.ndarray, counts: np.ndarray, resamples: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    (tests, resamples) means of samples drawn with replacement. Tests with the
+    same sample count are drawn together, so no draw is spent on padding.
+    """
+    means = np.full((len(padded), resamples), np.nan)
+    for count in np.unique(counts[counts > 0]):
+        rows = np.flatnonzero(counts == count)
+        draws = rng.integers(0, count, (len(rows), resamples, count), dtype=np.int32)
+        offsets = np.arange(len(rows)) * count
+        samples = padded[rows, :count].ravel()
+        means[rows] = samples[draws + offsets[:, None, None]].mean(axis=2)
+    return means
+
+
+def mean_difference(
+    first: List[np.ndarray], second: List[np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Observed difference in means (second - first) of each test, with both
+    sides padded. Tests with an empty side are NaN.
+    """
+    first_padded, first_counts = pad_samples(first)
+    second_padded, second_counts = pad_samples(second)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        difference = (
+            second_padded.sum(axis=1) / second_counts
+            - first_padded.sum(axis=1) / first_counts
+        )
+    return difference, first_padded, first_counts, second_padded, second_counts
+
+
+def bootstrap_mean_difference(
+    first: List[np.ndarray],
+    second: List[np.ndarray],
+    resamples: int = 5000,
+    confidence: float = 0.95,
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Difference in means (second - first) of each test and its percentile
+    bootstrap confidence interval, resampling each side independently.
+    """
+    rng = rng or np.random.default_rng()
+    difference, first_padded, first_counts, second_padded, second_counts = (
+        mean_difference(first, second)
+    )
+    bounds = np.full((2, len(first)), np.nan)
+    alpha = 1 - confidence
+    width = max(first_padded.shape[1], second_padded.shape[1])
+    for chunk in chunks(len(first), resamples, width):
+        differences = resampled_means(
+            second_padded[chunk], second_counts[chunk], resamples, rng
+        ) - resampled_means(first_padded[chunk], first_counts[chunk], resamples, rng)
+        bounds[:, chunk] = np.quantile(differences, [alpha / 2, 1 - alpha / 2], axis=1)
+    bounds[:, np.isnan(difference)] = np.nan
+    return difference, bounds[0], bounds[1]
+
+
+def permutation_pvalues(
+    first: List[np.ndarray],
+    second: List[np.ndarray],
+    resamples: int = 5000,
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    """
+    Two-sided permutation test p-values for a difference in means: how often
+    randomly relabelled samples differ at least as much as the observed ones.
+    """
+    rng = rng or np.random.default_rng()
+    observed = mean_difference(first, second)[0]
+    pooled, totals = pad_samples(
+        [np.concatenate([a, b]) for a, b in zip(first, second)]
+    )
+    first_counts = np.array([len(sample) for sample in first], dtype=int)
+    pvalues = np.full(len(first), np.nan)
+    buckets = {(count, total) for count, total in zip(first_counts, totals)}
+    # Tests with the same sample counts are relabelled together, without padding
+    for count, total in sorted(buckets):
+        if count == 0 or count == total:
+            continue
+        rows = np.flatnonzero((first_counts == count) & (totals == total))
+        for chunk in chunks(len(rows), resamples, total):
+            chunk_rows = rows[chunk]
+            values = pooled[chunk_rows, :total]
+            # The first count positions of a random ordering are a random subset
+            order = np.argsort(rng.random((len(chunk_rows), resamples, total)), axis=2)
+            offsets = np.arange(len(chunk_rows)) * total
+            first_sums = values.ravel()[
+                order[:, :, :count] + offsets[:, None, None]
+            ].sum(axis=2)
+            second_sums = values.sum(axis=1)[:, None] - first_sums
+            differences = second_sums / (total - count) - first_sums / count
+            # The tolerance keeps ties, such as the identity relabelling, extreme
+            extreme = (
+                np.abs(differences) >= np.abs(observed[chunk_rows])[:, None] - 1e-12
+            )
+            pvalues[chunk_rows] = (extreme.sum(axis=1) + 1) / (resamples + 1)
+    pvalues[np.isnan(observed)] = np.nan
+    return pvalues
@@ -0,0 +1,160 @@
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from utils.context import logger
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:  # Optional; token counts fall back to an estimate
+    Tokenizer = None
+
+TOKENIZER_DIR = "tokenizer_cache"
+CHARS_PER_TOKEN = 4
+PARAGRAPH_SEPARATOR = "… "
+
+# Hugging Face repositories with a tokenizer.json for each model family we test.
+# Fine-tuned and quantized variants share their base model's tokenizer.
+TOKENIZER_REPOS: Dict[str, str] = {
+    "llama3": "NousResearch/Meta-Llama-3-8B-Instruct",
+    "mistral": "unsloth/mistral-7b-instruct-v0.3",
+    "phi3": "microsoft/Phi-3-mini-4k-instruct",
+}
+
+
+def tokenizer_repo(family: str) -> Optional[str]:
+    for known_family, repo in TOKENIZER_REPOS.items():
+        if known_family in family:
+            return repo
+    return None
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(family: str) -> Optional["Tokenizer"]:
+    """
+    Loads the family's tokenizer from TOKENIZER_DIR, downloading it on first use.
+    Returns None when the tokenizers package or the tokenizer is unavailable.
+    """
+    repo = tokenizer_repo(family)
+    if Tokenizer is None or repo is None:
+        logger.info(f"No tokenizer for {family}; estimating tokens from characters")
+        return None
+    path = os.path.join(TOKENIZER_DIR, repo.replace("/", "--") + ".json")
+    try:
+        if os.path.exists(path):
+            return Tokenizer.from_file(path)
+        tokenizer = Tokenizer.from_pretrained(repo)
+        os.makedirs(TOKENIZER_DIR, exist_ok=True)
+        tokenizer.save(path)
+        logger.info(f"Cached the {family} tokenizer from {repo} in {path}")
+        return tokenizer
+    except Exception as e:
+        logger.warning(f"Could not load the {family} tokenizer ({e}); estimating")
+        return None
+
+
+def count_tokens(text: str, family: str) -> int:
+    tokenizer = get_tokenizer(family)
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def cut_to_tokens(text: str, budget: int, family: str) -> str:
+    """Cuts text after its first budget tokens."""
+    tokenizer = get_tokenizer(family)
+    if tokenizer is None:
+        return text[: budget * CHARS_PER_TOKEN]
+    offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+    if len(offsets) <= budget:
+        return text
+    return text[: offsets[budget - 1][1]] if budget else ""
+
+
+def relevance(paragraph: str, keywords: List[str]) -> int:
+    lower_text = paragraph.lower()
+    return sum(lower_text.count(keyword) for keyword in keywords)
+
+
+def trim_content(
+    content: str, budget: int, families: Iterable[str], keywords: List[str]
+) -> str:
+    """
+    Keeps the paragraphs that fit in the token budget of every family: the lead
+    (the RSS summary and the first paragraph) first, then the paragraphs that
+    mention the company most often. Kept paragraphs stay in article order.
+    """
+    families = list(families)
+
+    def tokens(text: str) -> int:
+        return max(count_tokens(text, family) for family in families)
+
+    if tokens(content) <= budget:
+        return content
+
+    paragraphs = content.split(PARAGRAPH_SEPARATOR)
+    separator_tokens = tokens(PARAGRAPH_SEPARATOR)
+    ranked = [0] + sorted(
+        range(1, len(paragraphs)),
+        key=lambda k: (-relevance(paragraphs[k], keywords), k),
+    )
+    kept: List[int] = []
+    used = 0
+    for k in ranked:
+        cost = tokens(paragraphs[k]) + (separator_tokens if kept else 0)
+        if used + cost <= budget:
+            kept.append(k)
+            used += cost
+    if not kept:
+        # Even the lead is over budget; keep as much of it as fits
+        lead = paragraphs[0]
+        for family in families:
+            lead = cut_to_tokens(lead, budget, family)
+        return lead
+    return PARAGRAPH_SEPARATOR.join(paragraphs[k] for k in sorted(kept))
+
+
+def apply_token_budget(
+    content_map: Dict[str, str],
+    budget: int,
+    families: Iterable[str],
+    keywords: List[str],
+) -> Dict[str, str]:
+    families = sorted(set(families))
+    keywords = [keyword.lower() for keyword in keywords if keyword]
+    trimmed_map = {
+        url: trim_content(content, budget, families, keywords)
+        for url, content in content_map.items()
+    }
+    trimmed = [url for url in content_map if trimmed_map[url] != content_map[url]]
+    logger.info(
+        f"Token budget of {budget} for {', '.join(families)}: "
+        f"trimmed {len(trimmed)} of {len(content_map)} article(s)"
+    )
+    for url in trimmed:
+        logger.info(
+            f"  {url}: {len(content_map[url])} -> {len(trimmed_map[url])} characters"
+        )
+    return trimmed_map
+
+
+def log_prompt_overflow(
+    model_name: str,
+    prompt_tokens: Dict[str, int],
+    context_window_size: int,
+    num_tokens_to_predict: int,
+) -> None:
+    """Warns about prompts that leave no room for the answer in the context."""
+    if not prompt_tokens:
+        return
+    limit = context_window_size - num_tokens_to_predict
+    overflowing = {url: n for url, n in prompt_tokens.items() if n > limit}
+    logger.info(
+        f"Prompt tokens for {model_name}: max {max(prompt_tokens.values())}, "
+        f"total {sum(prompt_tokens.values())} across {len(prompt_tokens)} article(s)"
+    )
+    for url, n in overflowing.items():
+        logger.warning(
+            f"Prompt for {url} has {n} tokens, over the {limit} left by "
+            f"num_ctx {context_window_size} after num_predict {num_tokens_to_predict}"
+        )
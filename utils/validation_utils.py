@@ -1,6 +1,6 @@
 import json
 import re
-from typing import Dict, Tuple, Union
+from typing import Any, Dict, List, Tuple, Union
 
 from pydantic import BaseModel, Field, ValidationError
 
@@ -25,6 +25,22 @@ class SentimentResponse(BaseModel):
     )
 
 
+def sentiment_json_schema(expected_length: int = 1) -> Dict[str, Any]:
+    """
+    JSON schema of SentimentResponse for constrained decoding. Batched prompts
+    expect an array with exactly one object per article.
+    """
+    schema = SentimentResponse.model_json_schema()
+    if expected_length == 1:
+        return schema
+    return {
+        "type": "array",
+        "items": schema,
+        "minItems": expected_length,
+        "maxItems": expected_length,
+    }
+
+
 def validate_json(json_str: str) -> Tuple[bool, Dict]:
     try:
         SentimentResponse.model_validate_json(json_str, strict=True)
@@ -37,6 +53,75 @@ def validate_json(json_str: str) -> Tuple[bool, Dict]:
         return False, {}
 
 
+def validate_json_array(json_str: str, expected_length: int) -> List[Tuple[bool, Dict]]:
+    """
+    Validates a batched response: a JSON array with one SentimentResponse per
+    article. Missing or invalid elements come back as (False, {}).
+    """
+    try:
+        items = json.loads(json_str)
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        return [(False, {}) for _ in range(expected_length)]
+
+    results = []
+    for item in items[:expected_length]:
+        try:
+            SentimentResponse.model_validate(item, strict=True)
+            results.append((True, dict(item)))
+        except ValidationError:
+            results.append((False, {}))
+    results += [(False, {}) for _ in range(expected_length - len(results))]
+    return results
+
+
+class JsonStreamTracker:
+    """
+    Follows streamed output until the first top-level JSON object or array
+    closes, ignoring brackets inside strings.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> bool:
+        """Adds a chunk; returns True once the JSON value is complete."""
+        if self.complete:
+            return True
+        for index, char in enumerate(chunk):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = self.started
+            elif char in "{[":
+                self.depth += 1
+                self.started = True
+            elif char in "}]" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    # Anything after the closing bracket is trailing chatter
+                    self.parts.append(chunk[: index + 1])
+                    self.complete = True
+                    return True
+        self.parts.append(chunk)
+        return False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
 def search_numeric_value(json_str: str) -> Union[float, None]:
     match = re.search(r"[-+]?[0-1]\.\d+", json_str)
     return float(match.group()) if match else None
@@ -1,62 +1,173 @@
-from typing import Optional
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlsplit
 
+import lxml.etree
+import lxml.html
 import requests
-import requests_cache
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from utils.cache import get_cache
 from utils.context import logger
 from utils.error_decorator import handle_errors
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
 }
+FETCH_TIMEOUT = 10
+# Transient statuses worth another attempt; 429 and 503 honour Retry-After
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RELEVANT_TAGS = ["p", "h2"]
+SOUP_SKIPPED_TAGS = ["script", "style", "template", "rt", "rp"]
 
 
-session = requests_cache.CachedSession("news_cache", expire_after=86400)
+session = requests.Session()
 session.headers.update(HEADERS)
 
 
+def configure_session(
+    pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5
+) -> None:
+    """
+    Sizes the connection pool for concurrent fetches and retries connection
+    errors and transient statuses with exponential backoff. Pages are cached in
+    the 'pages' cache namespace, not by the session.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=["GET"],
+        ),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+
+class HostLimiter:
+    """Caps the number of requests in flight to any one host."""
+
+    def __init__(self, per_host: int):
+        self.lock = threading.Lock()
+        self.semaphores: Dict[str, threading.Semaphore] = defaultdict(
+            lambda: threading.Semaphore(max(1, per_host))
+        )
+
+    @contextmanager
+    def limit(self, link: str) -> Iterator[None]:
+        with self.lock:
+            semaphore = self.semaphores[urlsplit(link).netloc]
+        with semaphore:
+            yield
+
+
 @handle_errors(default_return=None)
-def fetch_response(link: str) -> Optional[requests.Response]:
-    response = session.get(link)
-    if getattr(response, "from_cache", False):
-        logger.info(f"Cache hit for URL: {link}")
-    else:
-        logger.info(f"Cache miss for URL: {link}")
+def fetch_response(
+    link: str, timeout: float = FETCH_TIMEOUT
+) -> Optional[requests.Response]:
+    response = session.get(link, timeout=timeout)
     response.raise_for_status()
     return response
 
 
-@handle_errors(default_return="")
-def extract_relevant_content(
-    soup: BeautifulSoup, company_name: str, ticker_symbol: str
+def join_relevant_texts(
+    texts: Iterable[str], company_name: str, ticker_symbol: str
 ) -> str:
     content = []
-    for tag in soup.find_all(["p", "h2"]):
-        lower_text = tag.text.lower()
-        if company_name in lower_text or ticker_symbol in lower_text:
-            text = tag.text.strip().replace("\n", " ")
-            content.append(text)
+    ticker = ticker_symbol.lower()
+    for text in texts:
+        lower_text = text.lower()
+        if company_name in lower_text or ticker in lower_text:
+            content.append(text.strip().replace("\n", " "))
     return "… ".join(content) if content else ""
 
 
+def soup_texts(html: str) -> Iterable[str]:
+    soup = BeautifulSoup(html, "html.parser")
+    return (tag.text for tag in soup.find_all(RELEVANT_TAGS))
+
+
+def strainer_texts(html: str) -> Iterable[str]:
+    # Same parser, but only p/h2 elements and their contents are built
+    soup = BeautifulSoup(html, "html.parser", parse_only=SoupStrainer(RELEVANT_TAGS))
+    return (tag.text for tag in soup.find_all(RELEVANT_TAGS))
+
+
+def lxml_texts(html: str) -> Iterable[str]:
+    if not html.strip():
+        return []
+    # Bytes with an explicit encoding, so XML declarations are not rejected
+    document = lxml.html.document_fromstring(
+        html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8")
+    )
+    # BeautifulSoup's .text leaves these elements' strings out as well
+    lxml.etree.strip_elements(document, *SOUP_SKIPPED_TAGS, with_tail=False)
+    return (element.text_content() for element in document.iter(*RELEVANT_TAGS))
+
+
+# Selectable with fetch.extractor; benchmark_extractors.py compares them
+EXTRACTORS: Dict[str, Callable[[str], Iterable[str]]] = {
+    "html.parser": soup_texts,
+    "strainer": strainer_texts,
+    "lxml": lxml_texts,
+}
+
+
 @handle_errors(default_return="")
-def get_content(link: str, company_name: str, ticker_symbol: str) -> str:
-    response = fetch_response(link)
+def extract_content(
+    html: str, company_name: str, ticker_symbol: str, extractor: str = "html.parser"
+) -> str:
+    return join_relevant_texts(EXTRACTORS[extractor](html), company_name, ticker_symbol)
+
+
+def fetch_page(
+    link: str,
+    timeout: float = FETCH_TIMEOUT,
+    limiter: Optional[HostLimiter] = None,
+) -> str:
+    pages = get_cache("pages")
+    html = pages.get(link)
+    if html is not None:
+        logger.info(f"Cache hit for URL: {link}")
+        return html
+    logger.info(f"Cache miss for URL: {link}")
+    # Only requests that reach the network count against the host's limit
+    with limiter.limit(link) if limiter else nullcontext():
+        response = fetch_response(link, timeout)
     if not response:
         return ""
-    soup = BeautifulSoup(response.text, "html.parser")
-    return extract_relevant_content(soup, company_name, ticker_symbol)
+    pages.set(link, response.text)
+    return response.text
 
 
-# Add a function to inspect the cache
-def inspect_cache():
-    logger.info("Inspecting cache contents...")
-    for response in session.cache.filter():
-        logger.info(
-            f"Cached URL: {response.url}, from_cache: {response.from_cache}, created_at: {response.created_at}, expires: {response.expires}"
-        )
-
+def fetch_pages(
+    links: List[str],
+    max_workers: int = 8,
+    per_host_limit: int = 2,
+    timeout: float = FETCH_TIMEOUT,
+) -> List[str]:
+    """
+    Fetches the pages concurrently; their HTML is returned in link order, empty
+    for pages that could not be fetched.
+    """
+    limiter = HostLimiter(per_host_limit)
 
-# Call inspect_cache to log cache contents
-# inspect_cache()
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        pages = list(
+            executor.map(lambda link: fetch_page(link, timeout, limiter), links)
+        )
+    logger.info(
+        f"Fetched {len(links)} page(s) in {time.time() - start_time:.2f}s "
+        f"with {max_workers} worker(s), at most {per_host_limit} per host"
+    )
+    return pages